@@ -0,0 +1,133 @@
+"""Acquisition hot paths: text parsing, the reader loop, binary frames and fan-out to consumers."""
+import logging
+from queue import Queue
+
+import numpy as np
+
+from hw_testing.binary_protocol import FrameDecoder
+from hw_testing.broadcast import Broadcast
+from hw_testing.magnetometer_reader import MagnetometerReader, parse_data, parse_lines
+from hw_testing.ring_buffer import RingBuffer
+from hw_testing.virtual_magnetometer import VirtualMagnetometer
+
+# Lines per timed block; benchmarks below report the time per block
+N_LINES = 1000
+
+
+def sketch_output(n=N_LINES, protocol="text"):
+    """n samples of the sketch's output, as bytes."""
+    sim = VirtualMagnetometer(protocol=protocol, seed=0)
+    try:
+        chunks, _ = sim.encode(np.arange(n))
+    finally:
+        sim.stop()
+    return b"".join(chunks)
+
+
+class TimeParseData(object):
+    """parse_data on one line of the text protocol."""
+
+    def setup(self):
+        self.line = sketch_output(1).decode().strip()
+
+    def time_parse_data(self):
+        parse_data(self.line)
+
+
+class TimeParseLines(object):
+    """parse_lines on N_LINES lines at once, clean and with 1% corrupted lines."""
+
+    params = [0.0, 0.01]
+    param_names = ['corrupt_fraction']
+
+    def setup(self, corrupt_fraction):
+        self.lines = sketch_output().decode().split('\n')[:-1]
+        rng = np.random.default_rng(0)
+        for i in rng.choice(len(self.lines), int(corrupt_fraction * len(self.lines)), replace=False):
+            self.lines[i] = self.lines[i][:7] + '\x00' + self.lines[i][8:]
+
+    def time_parse_lines(self, corrupt_fraction):
+        parse_lines(self.lines)
+
+
+class TimeReaderText(object):
+    """MagnetometerReader text path on N_LINES lines (divide by N_LINES for per line).
+
+    lines_per_read=1000 is the backlog after a one second USB stall at 1 kHz.
+    """
+
+    params = [[1, 64, 1000]]
+    param_names = ['lines_per_read']
+
+    def setup(self, lines_per_read):
+        logger = logging.getLogger('benchmarks')
+        logger.setLevel(logging.WARNING)
+        # A real reader on a virtual port, the device thread is never started
+        self.sim = VirtualMagnetometer()
+        # Publishing to a bus with a plot and a log subscriber, as main_dispatcher does
+        self.bus = Broadcast(capacity=1 << 16)
+        self.subscriptions = [self.bus.subscribe("drop_oldest"), self.bus.subscribe("drop_oldest")]
+        self.reader = MagnetometerReader(self.sim.port, 115200, logger, bus=self.bus)
+        lines = sketch_output().splitlines(keepends=True)
+        self.reads = [b"".join(lines[i:i + lines_per_read]) for i in range(0, len(lines), lines_per_read)]
+
+    def teardown(self, lines_per_read):
+        # Also called after a failed setup, the reader may not exist
+        if hasattr(self, 'reader'):
+            self.reader.ser.close()
+        self.sim.stop()
+
+    def time_process_text(self, lines_per_read):
+        for data in self.reads:
+            self.reader._process_text(data)
+
+
+class TimeFrameDecoder(object):
+    """Binary protocol decoding of N_LINES frames in one read."""
+
+    def setup(self):
+        self.data = sketch_output(protocol="binary")
+
+    def time_feed(self):
+        FrameDecoder().feed(self.data)
+
+
+class TimeFanOut(object):
+    """N_LINES samples, published in reads of 20, to n_consumers consumers that each drain them."""
+
+    params = [['queue', 'broadcast'], [1, 2, 4]]
+    param_names = ['transport', 'n_consumers']
+
+    def setup(self, transport, n_consumers):
+        samples = np.random.default_rng(0).normal(size=(N_LINES, 6))
+        self.reads = [samples[i:i + 20] for i in range(0, N_LINES, 20)]
+        self.bus = Broadcast(capacity=1 << 16)
+        self.subscriptions = [self.bus.subscribe("block") for _ in range(n_consumers)]
+
+    def time_publish_and_drain(self, transport, n_consumers):
+        if transport == 'queue':
+            # One queue and one put per sample per consumer, like the reader before the bus
+            queues = [Queue() for _ in range(n_consumers)]
+            for samples in self.reads:
+                for sample in map(tuple, samples.tolist()):
+                    for queue in queues:
+                        queue.put(sample)
+            for queue in queues:
+                np.asarray([queue.get_nowait() for _ in range(queue.qsize())])
+        else:
+            for samples in self.reads:
+                self.bus.publish(samples)
+            for subscription in self.subscriptions:
+                while len(subscription.read()):
+                    pass
+
+
+class TimeRingBuffer(object):
+    """Appending decoded samples to the plotting history."""
+
+    def setup(self):
+        self.buffer = RingBuffer(100_000)
+        self.samples = np.random.default_rng(0).normal(size=(N_LINES, 6))
+
+    def time_extend(self):
+        self.buffer.extend(self.samples)
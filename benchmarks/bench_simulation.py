@@ -0,0 +1,94 @@
+"""Simulation hot paths: building the hemisphere, field evaluation, sweeps and toy models."""
+import numpy as np
+import magpylib as magpy
+
+from magnet_designer import SimpleCoil
+from magnet_sweep import create_hemisphere_magnetic_system, evaluate_current_sweep, make_magnet_params, make_view_grids
+from coil_param_optimizer import compute_pull_strength
+from sandbox.simple import BatchedMagneticGridSimulator, MagneticGridSimulator
+
+# The sweep's base system, see magnet_sweep.sweep_space
+SYSTEM_PARAMS = {'r_m': 0.1, 'n_phi_rad': 4, 'n_theta_rad': 8}
+DESIGN = {'coil_diameter': 0.05, 'n_turns': 250}
+# Simulator steps per timed call of TimeGridSimulatorStep, all from the same initial state
+GRID_STEPS = 10
+
+
+class TimeHemisphere(object):
+    """create_hemisphere_magnetic_system against the number of coils."""
+
+    params = [[2, 4, 8], [4, 8, 16]]
+    param_names = ['n_phi_rad', 'n_theta_rad']
+
+    def setup(self, n_phi_rad, n_theta_rad):
+        _, self.magnet_params = make_magnet_params(SimpleCoil, current=0.5, **DESIGN)
+        self.system_params = dict(SYSTEM_PARAMS, n_phi_rad=n_phi_rad, n_theta_rad=n_theta_rad)
+
+    def time_create(self, n_phi_rad, n_theta_rad):
+        create_hemisphere_magnetic_system(SimpleCoil, self.magnet_params, self.system_params)
+
+
+class TimeGetB(object):
+    """magpy.getB of the full hemisphere on the top and side view grids, as compute_energy_and_force does."""
+
+    params = [['top', 'side'], [30, 60, 120]]
+    param_names = ['view', 'n_grid']
+
+    def setup(self, view, n_grid):
+        _, magnet_params = make_magnet_params(SimpleCoil, current=0.5, **DESIGN)
+        self.collection, _ = create_hemisphere_magnetic_system(SimpleCoil, magnet_params, SYSTEM_PARAMS)
+        self.grid = make_view_grids(SYSTEM_PARAMS['r_m'] * 1.25, n_grid, n_grid)[f'grid_{view}']
+
+    def time_getb(self, view, n_grid):
+        magpy.getB(self.collection, self.grid)
+
+
+class TimeSweepConfiguration(object):
+    """One geometry of sweep_magnet_designs at its three currents, without plots or cache."""
+
+    def time_evaluate_current_sweep(self):
+        evaluate_current_sweep(SimpleCoil, DESIGN, [0.3, 0.5, 0.7], SYSTEM_PARAMS, save_plots=False)
+
+
+class TimePullStrength(object):
+    """compute_pull_strength for one design and for an optimizer population."""
+
+    def setup(self):
+        rng = np.random.default_rng(0)
+        self.population = (rng.uniform(0.1, 2.0, 1000), rng.uniform(10, 500, 1000), rng.uniform(0.01, 0.1, 1000))
+
+    def time_single(self):
+        compute_pull_strength(0.5, 250, 0.05)
+
+    def time_population_1000(self):
+        compute_pull_strength(*self.population)
+
+
+class TimeGridSimulatorStep(object):
+    """
+    GRID_STEPS steps of the sandbox grid simulator against the electromagnet grid size.
+
+    step() moves the magnets, so every call starts again from the state saved in setup;
+    otherwise later repeats would time a drifted (possibly diverged) simulation.
+    """
+
+    params = [3, 10, 30]
+    param_names = ['grid_size']
+
+    def setup(self, grid_size):
+        self.sim = MagneticGridSimulator((grid_size, grid_size))
+        self.sim.electromagnet_states[::2, ::2] = 1
+        self.batch = BatchedMagneticGridSimulator(1000, (grid_size, grid_size))
+        self.batch.electromagnet_states[:, ::2, ::2] = 1
+        self.initial = (self.sim.pm_position.copy(), self.sim.pm_velocity.copy())
+        self.batch_initial = (self.batch.pm_positions.copy(), self.batch.pm_velocities.copy())
+
+    def time_steps(self, grid_size):
+        self.sim.pm_position[:], self.sim.pm_velocity[:] = self.initial
+        for _ in range(GRID_STEPS):
+            self.sim.step()
+
+    def time_batched_steps_1000_magnets(self, grid_size):
+        self.batch.pm_positions[:], self.batch.pm_velocities[:] = self.batch_initial
+        for _ in range(GRID_STEPS):
+            self.batch.step()
@@ -0,0 +1,283 @@
+"""
+Run the benchmark suite and compare runs.
+
+Benchmarks follow the asv conventions, so the suite can move to asv unchanged:
+modules named bench_*.py in this directory contain classes whose time_* methods
+are timed. A class may define
+
+    params       list of parameter values, or a list of lists for several parameters
+    param_names  names of the parameters
+    setup(*p)    called before timing each parameter combination (not timed)
+    teardown(*p) called afterwards, also when setup or the benchmark raised
+
+Every benchmark is called `number` times per repeat, with number chosen so a repeat
+takes at least min_repeat_s, and the per-call time of each repeat is recorded. A
+benchmark that raises is recorded with its error and the run carries on.
+
+Usage (from the repository root):
+
+    python -m benchmarks.run                         # Everything, saved to benchmarks/results/
+    python -m benchmarks.run -b GetB -b parse        # Only matching benchmarks
+    python -m benchmarks.run --compare benchmarks/results/<old>.json   # Exit code 1 on regressions
+"""
+import os
+import re
+import sys
+import json
+import time
+import platform
+import importlib
+import itertools
+import traceback
+import contextlib
+import subprocess
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARK_DIR)
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+
+# Bump when the result file layout changes
+RESULTS_VERSION = 1
+
+
+def discover(patterns=()):
+    """
+    Find the benchmarks in bench_*.py.
+
+    Args:
+        patterns: Regular expressions, a benchmark is kept if any matches its name
+
+    Returns:
+        List of (name, class, method name) with names like bench_simulation.TimeGetB.time_getb
+    """
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    found = []
+    for filename in sorted(os.listdir(BENCHMARK_DIR)):
+        if not (filename.startswith('bench_') and filename.endswith('.py')):
+            continue
+        module_name = filename[:-3]
+        module = importlib.import_module(f'benchmarks.{module_name}')
+        for class_name, cls in sorted(vars(module).items()):
+            if not (isinstance(cls, type) and class_name.startswith('Time') and cls.__module__ == module.__name__):
+                continue
+            for method in sorted(name for name in dir(cls) if name.startswith('time_')):
+                name = f'{module_name}.{class_name}.{method}'
+                if not patterns or any(re.search(pattern, name) for pattern in patterns):
+                    found.append((name, cls, method))
+    return found
+
+
+def param_combinations(cls):
+    """All parameter tuples of a benchmark class (one empty tuple if it has no params)."""
+    params = getattr(cls, 'params', None)
+    if params is None:
+        return [()]
+    # A flat list is a single parameter
+    if not params or not isinstance(params[0], (list, tuple)):
+        params = [params]
+    return list(itertools.product(*params))
+
+
+def param_label(cls, combination):
+    names = getattr(cls, 'param_names', None) or [f'p{i}' for i in range(len(combination))]
+    return ', '.join(f'{name}={value}' for name, value in zip(names, combination))
+
+
+def time_call(func, repeat=5, min_repeat_s=0.05, max_number=100_000):
+    """
+    Per-call times of func.
+
+    Returns:
+        times: (repeat,) seconds per call, one entry per repeat
+        number: Calls per repeat
+    """
+    # Calibrate like timeit.autorange: grow number until one repeat is long enough
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_repeat_s or number >= max_number:
+            break
+        number = min(max_number, max(number * 2, int(number * min_repeat_s / max(elapsed, 1e-9)) + 1))
+
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - t0) / number)
+    return np.array(times), number
+
+
+def run_benchmarks(benchmarks, repeat=5, min_repeat_s=0.05, verbose=True):
+    """
+    Time every benchmark and parameter combination.
+
+    Returns:
+        Dictionary {benchmark name: {param label: stats}}, with stats holding the
+        min/median/max seconds per call, the repeat count and calls per repeat, or
+        only 'error' with the traceback if the benchmark failed
+    """
+    results = {}
+    for name, cls, method in benchmarks:
+        results[name] = {}
+        for combination in param_combinations(cls):
+            label = param_label(cls, combination)
+            error = None
+            # Benchmarked code prints progress (sweeps, solvers), keep the report readable
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                try:
+                    instance = cls()
+                    try:
+                        if hasattr(instance, 'setup'):
+                            instance.setup(*combination)
+                        func = getattr(instance, method)
+                        times, number = time_call(lambda: func(*combination), repeat, min_repeat_s)
+                    finally:
+                        # Release ports and files even if the benchmark failed
+                        if hasattr(instance, 'teardown'):
+                            instance.teardown(*combination)
+                except Exception:
+                    error = traceback.format_exc()
+            if error is not None:
+                results[name][label] = {'error': error}
+                if verbose:
+                    print(f"{name}{f' [{label}]' if label else ''}: FAILED\n{error}", flush=True)
+                continue
+            results[name][label] = {
+                'min': float(times.min()),
+                'median': float(np.median(times)),
+                'max': float(times.max()),
+                'repeat': repeat,
+                'number': number,
+            }
+            if verbose:
+                print(f"{name}{f' [{label}]' if label else ''}: {format_time(np.median(times))} "
+                      f"(min {format_time(times.min())}, {repeat} x {number})", flush=True)
+    return results
+
+
+def format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds / 1e-9:.3g} ns"
+
+
+def machine_info():
+    """Where and on what a run happened, stored with the results."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import magpylib
+    return {
+        'commit': commit,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': platform.node(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'magpylib': magpylib.__version__,
+    }
+
+
+def compare(baseline, current, threshold=0.2, statistic='min'):
+    """
+    Compare two result dictionaries.
+
+    Args:
+        baseline, current: Loaded result files
+        threshold: Relative slowdown reported as a regression (0.2 = 20% slower)
+        statistic: 'min' (least noisy) or 'median'
+
+    Returns:
+        List of (name, label, baseline time, current time, ratio), and the subset that regressed
+    """
+    rows, regressions = [], []
+    for name, by_label in current['results'].items():
+        for label, stats in by_label.items():
+            old = baseline['results'].get(name, {}).get(label)
+            # Failed benchmarks have no times to compare
+            if old is None or 'error' in old or 'error' in stats:
+                continue
+            ratio = stats[statistic] / old[statistic]
+            row = (name, label, old[statistic], stats[statistic], ratio)
+            rows.append(row)
+            if ratio > 1 + threshold:
+                regressions.append(row)
+    return rows, regressions
+
+
+def print_comparison(rows, threshold):
+    for name, label, old, new, ratio in rows:
+        flag = 'REGRESSION' if ratio > 1 + threshold else ('faster' if ratio < 1 / (1 + threshold) else '')
+        name = f"{name} [{label}]" if label else name
+        print(f"{ratio:6.2f}x  {format_time(old):>10} -> {format_time(new):>10}  {name} {flag}")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the benchmark suite")
+    parser.add_argument('-b', '--bench', action='append', default=[],
+                        help="Regex selecting benchmarks by name, may be repeated")
+    parser.add_argument('--repeat', type=int, default=5, help="Repeats per benchmark")
+    parser.add_argument('--min-time', type=float, default=0.05, help="Minimum seconds per repeat")
+    parser.add_argument('--quick', action='store_true', help="One short repeat per benchmark (smoke test)")
+    parser.add_argument('-o', '--output', default=None, help="Result file, defaults to results/<commit>.json")
+    parser.add_argument('--compare', default=None, help="Baseline result file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Slowdown reported as a regression")
+    parser.add_argument('--list', action='store_true', help="List the benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    benchmarks = discover(args.bench)
+    if args.list:
+        for name, cls, _ in benchmarks:
+            for combination in param_combinations(cls):
+                label = param_label(cls, combination)
+                print(f"{name}{f' [{label}]' if label else ''}")
+        return 0
+
+    repeat, min_time = (1, 0.0) if args.quick else (args.repeat, args.min_time)
+    run = {
+        'version': RESULTS_VERSION,
+        'info': machine_info(),
+        'results': run_benchmarks(benchmarks, repeat, min_time),
+    }
+    failed = [name for name, by_label in run['results'].items()
+              if any('error' in stats for stats in by_label.values())]
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{run['info']['commit'] or 'unknown'}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, 'w') as f:
+        json.dump(run, f, indent=2)
+    print(f"Saved results to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(baseline, run, args.threshold)
+        print(f"\n===== Compared with {baseline['info'].get('commit')} ({args.compare}) =====")
+        print_comparison(rows, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmarks are more than {args.threshold:.0%} slower")
+            return 1
+    if failed:
+        print(f"{len(failed)} benchmarks failed: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 import numpy as np
 import numpy.typing as npt
+from scipy.special import ellipk, ellipe
 
 def calculate_magnetic_field(radii:npt.ArrayLike, current, z, mu_0=4 * np.pi * 1e-7):
     """
@@ -26,7 +27,7 @@ def calculate_magnetic_field(radii:npt.ArrayLike, current, z, mu_0=4 * np.pi * 1
     
     return B_total
 
-def calculate_field_vs_distance(radii, current, z_points):
+def calculate_field_vs_distance(radii, current, z_points, mu_0=4 * np.pi * 1e-7):
     """
     Calculate magnetic field strength at multiple points along the axis.
     
@@ -34,11 +35,112 @@ def calculate_field_vs_distance(radii, current, z_points):
     radii (array-like): List or array of radii for each turn in meters
     current (float): Current flowing through the coil in Amperes
     z_points (array-like): Points along z-axis where to calculate field
+    mu_0 (float): Permeability of free space in T⋅m/A (default: 4π × 10⁻⁷)
     
     Returns:
     array: Magnetic field strength at each z point
     """
-    return np.array([calculate_magnetic_field(radii, current, z) for z in z_points])
+    # Broadcast turns against z points: shape (n_points, n_turns)
+    radii = np.asarray(radii, dtype=float)[None, :]
+    z = np.asarray(z_points, dtype=float)[:, None]
+    B_contributions = (mu_0 * current * radii**2) / (2 * (radii**2 + z**2)**(3/2))
+    return np.sum(B_contributions, axis=1)
+
+def calculate_loop_field_cylindrical(radii, current, rho, z, mu_0=4 * np.pi * 1e-7):
+    """
+    Calculate the off-axis field of concentric circular turns in cylindrical coordinates.
+    
+    Uses the closed form with complete elliptic integrals K(m), E(m), broadcast over
+    all turns and points. The turns lie in the z=0 plane centered on the z-axis.
+    
+    Parameters:
+    radii (array-like): Radii of each turn in meters
+    current (float): Current flowing through the coil in Amperes
+    rho (array-like): Radial distance of each point from the coil axis in meters
+    z (array-like): Axial distance of each point from the coil plane in meters
+    mu_0 (float): Permeability of free space in T⋅m/A (default: 4π × 10⁻⁷)
+    
+    Returns:
+    tuple: (B_rho, B_z) in Tesla, each with the broadcast shape of rho and z
+    """
+    rho, z = np.broadcast_arrays(np.asarray(rho, dtype=float), np.asarray(z, dtype=float))
+    # Trailing axis runs over the turns
+    a = np.asarray(radii, dtype=float).reshape((1,) * rho.ndim + (-1,))
+    rho = rho[..., None]
+    z = z[..., None]
+    
+    alpha_sq = (a - rho)**2 + z**2
+    beta_sq = (a + rho)**2 + z**2
+    beta = np.sqrt(beta_sq)
+    m = 1 - alpha_sq / beta_sq  # k^2, parameter convention used by scipy
+    K = ellipk(m)
+    E = ellipe(m)
+    C = mu_0 * current / np.pi
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        B_z = C / (2 * alpha_sq * beta) * ((a**2 - rho**2 - z**2) * E + alpha_sq * K)
+        B_rho = C * z / (2 * alpha_sq * beta * rho) * ((a**2 + rho**2 + z**2) * E - alpha_sq * K)
+    # The radial component vanishes on the axis (0/0 in the closed form)
+    B_rho = np.where(rho < 1e-12, 0.0, B_rho)
+    
+    return np.sum(B_rho, axis=-1), np.sum(B_z, axis=-1)
+
+def calculate_field_off_axis(radii, current, points, mu_0=4 * np.pi * 1e-7):
+    """
+    Calculate the magnetic field vector of a flat multi-turn coil at arbitrary points.
+    
+    The coil lies in the z=0 plane, centered at the origin with its axis along z.
+    
+    Parameters:
+    radii (array-like): List or array of radii for each turn in meters
+    current (float): Current flowing through the coil in Amperes
+    points (array-like): Observer positions of shape (..., 3) in meters
+    mu_0 (float): Permeability of free space in T⋅m/A (default: 4π × 10⁻⁷)
+    
+    Returns:
+    array: Magnetic field vectors in Tesla with the same shape as points
+    """
+    points = np.asarray(points, dtype=float)
+    x, y, z = points[..., 0], points[..., 1], points[..., 2]
+    rho = np.hypot(x, y)
+    B_rho, B_z = calculate_loop_field_cylindrical(radii, current, rho, z, mu_0)
+    
+    # Project the radial component back onto x and y
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos_phi = np.where(rho > 0, x / rho, 0.0)
+        sin_phi = np.where(rho > 0, y / rho, 0.0)
+    return np.stack((B_rho * cos_phi, B_rho * sin_phi, B_z), axis=-1)
+
+def calculate_spiral_coil_basis(radii, points, positions, rotations, mu_0=4 * np.pi * 1e-7, chunk_size=200000):
+    """
+    Calculate the unit-current field of several identical spiral coils placed in space,
+    e.g. the coils of a hemisphere layout.
+    
+    Parameters:
+    radii (array-like): Radii of each turn in meters
+    points (array-like): Observer positions of shape (n_points, 3) in meters
+    positions (array-like): Coil centers of shape (n_coils, 3) in meters
+    rotations (scipy Rotation): Rotations taking +z onto each coil axis
+    mu_0 (float): Permeability of free space in T⋅m/A (default: 4π × 10⁻⁷)
+    chunk_size (int): Max coil-point pairs evaluated at once to bound memory
+    
+    Returns:
+    array: Field at 1 A of shape (n_coils, n_points, 3) in Tesla
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+    R = rotations.as_matrix().reshape(-1, 3, 3)
+    
+    # Points in each coil's local frame: R^T (p - c), shape (n_coils, n_points, 3)
+    local = np.einsum('cji,cnj->cni', R, points[None, :, :] - positions[:, None, :])
+    flat_local = local.reshape(-1, 3)
+    B_local = np.empty_like(flat_local)
+    for start in range(0, len(flat_local), chunk_size):
+        stop = start + chunk_size
+        B_local[start:stop] = calculate_field_off_axis(radii, 1.0, flat_local[start:stop], mu_0)
+    
+    # Rotate the local fields back to the global frame
+    return np.einsum('cij,cnj->cni', R, B_local.reshape(local.shape))
 
 # Example usage:
 if __name__ == "__main__":
@@ -63,6 +165,13 @@ if __name__ == "__main__":
     for i in range(0, len(z_points), 10):
         print(f"z={z_points[i]*100:.1f}cm: {B_points[i]*1000:.2f} mT")
 
+    # Off-axis field across the coil face at z
+    off_axis_points = np.stack((np.linspace(0, 2*outer_radii_m, 5), np.zeros(5), np.full(5, z_m)), axis=1)
+    B_off_axis = calculate_field_off_axis(radii, current, off_axis_points)
+    print("\nOff-axis field at z={:.1f}cm:".format(z_m*100))
+    for point, B_vec in zip(off_axis_points, B_off_axis):
+        print(f"x={point[0]*1000:.1f}mm: Bx={B_vec[0]*1000:.3f} mT, Bz={B_vec[2]*1000:.3f} mT")
+
 
     # T = N/A*m 
     # Need to move 0.5 KG force 
@@ -1,15 +1,37 @@
 import numpy as np
-import magpylib as mag
 from scipy.optimize import differential_evolution
 
 # Constants
 mu0 = 4 * np.pi * 1e-7* (1/500) # permeability of free space in H/m
 
-def compute_pull_strength(current, number_turns, coil_diameter):
+# Vacuum permeability for the loop field itself; mu0 above is only used for the pull force
+MU0_VACUUM = 4 * np.pi * 1e-7
+
+def loop_field_on_axis(current, coil_diameter, z):
     """
-    Compute the pull strength of a coil electromagnet using Magpylib.
+    Closed-form axial flux density of a single circular current loop,
+    
+        B_z = MU0_VACUUM * I * R^2 / (2 * (R^2 + z^2)^(3/2))
     
-    We approximate the coil as a flat coil (all turns co-located) by creating
+    matching magpylib's current.Circle on its axis. All arguments broadcast, so a
+    whole population of designs is one NumPy expression.
+    
+    Parameters:
+        current (float or array): Loop current in amperes.
+        coil_diameter (float or array): Loop diameter in meters.
+        z (float or array): Distance from the loop plane along its axis in meters.
+    
+    Returns:
+        B_z (float or array): Axial flux density in tesla.
+    """
+    radius_sq = (np.asarray(coil_diameter) / 2) ** 2
+    return MU0_VACUUM * current * radius_sq / (2 * (radius_sq + np.square(z)) ** 1.5)
+
+def compute_pull_strength(current, number_turns, coil_diameter, gap=0.001):
+    """
+    Compute the pull strength of a coil electromagnet.
+    
+    We approximate the coil as a flat coil (all turns co-located) by using
     a single loop with an effective current = number_turns * current.
     
     The pull force is estimated by first computing the magnetic flux density B
@@ -20,36 +42,28 @@ def compute_pull_strength(current, number_turns, coil_diameter):
     where A is the area of the coil face.
     
     Parameters:
-        current (float): Current per turn in amperes.
-        number_turns (int): Number of turns in the coil.
-        coil_diameter (float): Diameter of the coil in meters.
+        current (float or array): Current per turn in amperes.
+        number_turns (int or array): Number of turns in the coil.
+        coil_diameter (float or array): Diameter of the coil in meters.
+        gap (float or array): Distance of the target point from the coil face in meters.
     
     Returns:
-        pull_force (float): Estimated pull force in newtons.
+        pull_force (float or array): Estimated pull force in newtons.
     """
     # Effective current for a flat coil (all turns adding constructively)
     effective_current = current * number_turns
-
-    # Create the coil as a current loop
-    # Note: coil_diameter is in meters.
-    coil = mag.current.Loop(current=effective_current, diameter=coil_diameter)
-    
-    # Define a target point along the z-axis at a small gap (e.g., 1 mm away)
-    gap = 0.001  # gap in meters
-    target_point = (0, 0, gap)
     
-    # Compute the magnetic field at the target point
-    B_vector = coil.getB(target_point)
-    B_magnitude = np.linalg.norm(B_vector)
+    # The target point is on the coil axis, where the field is purely axial
+    B_magnitude = np.abs(loop_field_on_axis(effective_current, coil_diameter, gap))
     
     # Assume the contact area is the face of the coil (circle of radius = coil_diameter/2)
-    area = np.pi * (coil_diameter / 2) ** 2
+    area = np.pi * (np.asarray(coil_diameter) / 2) ** 2
     
     # Compute the pull force using F = (B^2 * A) / (2 * mu0)
     pull_force = (B_magnitude ** 2 * area) / (2 * mu0)
     return pull_force
 
-def objective(params):
+def objective(params, gap=0.001, weight_current=1, weight_turns=0.1):
     """
     Objective function that we want to minimize. It combines:
       - Maximizing pull strength (we subtract it, since optimizers minimize by default)
@@ -57,25 +71,25 @@ def objective(params):
       - Minimizing number of turns (to reduce material/complexity)
     
     Parameters:
-        params (list or array): [current, number_turns, coil_diameter]
+        params (array): [current, number_turns, coil_diameter], or shape (3, S) to
+          evaluate S candidates at once (differential_evolution with vectorized=True)
           - current is in amperes (A)
           - number_turns is treated as continuous but will be rounded to the nearest integer
           - coil_diameter is in meters
+        gap (float): Distance of the pulled part from the coil face in meters.
+        weight_current (float): Penalty per ampere.
+        weight_turns (float): Penalty per turn.
           
     Returns:
-        cost (float): The scalar objective value.
+        cost (float or array): The objective value, shape (S,) for a population.
     """
     current = params[0]
     # Ensure number_turns is an integer
-    number_turns = int(round(params[1]))
+    number_turns = np.round(params[1])
     coil_diameter = params[2]
     
-    # Compute pull strength using the Magpylib-based simulation
-    pull_strength = compute_pull_strength(current, number_turns, coil_diameter)
-    
-    # Weight factors for current and number_turns. (Adjust these as needed.)
-    weight_current = 1
-    weight_turns = 0.1
+    # Compute pull strength for every candidate at once
+    pull_strength = compute_pull_strength(current, number_turns, coil_diameter, gap)
     
     # We want to maximize pull_strength, so subtract it.
     # Also add penalties for higher current and more turns.
@@ -92,20 +106,48 @@ bounds = [
     (0.01, 0.025)    # coil_diameter in m
 ]
 
-# Run the differential evolution optimizer
-result = differential_evolution(objective, bounds, strategy='best1bin', maxiter=10000, popsize=15, tol=1e-6)
-
-# Report the optimal design parameters
-optimal_current = result.x[0]
-optimal_turns = int(round(result.x[1]))
-optimal_diameter = result.x[2]
-
-print("Optimization Result:")
-print(f"Optimal Current: {optimal_current:.4f} A")
-print(f"Optimal Number of Turns (rounded): {optimal_turns}")
-print(f"Optimal Coil Diameter: {optimal_diameter:.4f} m")
-print(f"Objective Value: {result.fun:.4f}")
+def optimize_coil(gap=0.001, weight_current=1, weight_turns=0.1, seed=None):
+    """
+    Run the differential evolution optimizer for one gap and set of weights.
+    
+    Each generation is evaluated as one batched objective call.
+    
+    Returns:
+        result (OptimizeResult): scipy result, result.x = [current, number_turns, coil_diameter]
+    """
+    return differential_evolution(
+        objective, bounds, args=(gap, weight_current, weight_turns), strategy='best1bin',
+        maxiter=10000, popsize=15, tol=1e-6, vectorized=True, updating='deferred', seed=seed
+    )
 
-# (Optional) Compute and print the pull strength for the optimal design
-optimal_pull_strength = compute_pull_strength(optimal_current, optimal_turns, optimal_diameter)
-print(f"Estimated Pull Strength: {optimal_pull_strength} N")
+if __name__ == "__main__":
+    from time import perf_counter
+    
+    # Run the differential evolution optimizer
+    t0 = perf_counter()
+    result = optimize_coil()
+    elapsed = perf_counter() - t0
+    
+    # Report the optimal design parameters
+    optimal_current = result.x[0]
+    optimal_turns = int(round(result.x[1]))
+    optimal_diameter = result.x[2]
+    
+    print("Optimization Result:")
+    print(f"Optimal Current: {optimal_current:.4f} A")
+    print(f"Optimal Number of Turns (rounded): {optimal_turns}")
+    print(f"Optimal Coil Diameter: {optimal_diameter:.4f} m")
+    print(f"Objective Value: {result.fun:.4f}")
+    print(f"Optimizer time: {elapsed:.3f} s ({result.nfev} evaluations)")
+    
+    # (Optional) Compute and print the pull strength for the optimal design
+    optimal_pull_strength = compute_pull_strength(optimal_current, optimal_turns, optimal_diameter)
+    print(f"Estimated Pull Strength: {optimal_pull_strength} N")
+    
+    # Cheap enough now to sweep the operating gap
+    print("\nGap sweep:")
+    for gap in (0.0005, 0.001, 0.002, 0.005):
+        result = optimize_coil(gap=gap)
+        pull = compute_pull_strength(result.x[0], round(result.x[1]), result.x[2], gap)
+        print(f"  gap {gap*1e3:.1f} mm: current {result.x[0]:.3f} A, turns {round(result.x[1])}, "
+              f"diameter {result.x[2]:.4f} m, pull {pull:.3f} N")
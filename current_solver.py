@@ -0,0 +1,259 @@
+import numpy as np
+import magpylib as magpy
+
+from field_basis import FieldBasis
+from hemisphere_layout import unique_sites
+from magnet_sweep import create_hemisphere_magnetic_system, make_magnet_params
+
+
+# Drive current limits per coil in amperes (see bounds in coil_param_optimizer)
+MIN_CURRENT_A = 0.0
+MAX_CURRENT_A = 0.5
+
+
+class InfluenceMatrix(object):
+    """
+    Linear map from the coil drive currents of a hemisphere system to B and its
+    gradient at a set of target points.
+
+    Field and gradient are affine in the drive currents I (in amperes per coil):
+
+        B(p) = B_static(p) + sum_k I_k * field[k, p]
+        dB_j/dx_i(p) = static_gradient[p, i, j] + sum_k I_k * gradient[k, p, i, j]
+
+    The gradient is taken by central differences on the unit-current basis, so the
+    whole map costs one magpylib evaluation of 7 points per target.
+
+    The hemisphere layout repeats coil sites (every azimuth step at the pole, mirrored
+    zero offsets). Twin coils would give identical columns and a rank deficient normal
+    matrix, so only one coil (and core) per site is kept.
+
+    Attributes:
+        coil_positions: (n_coils, 3) site of each column
+    """
+
+    def __init__(self, magnet_class, design, system_params, target_points, step_m=1e-4):
+        """
+        Args:
+            magnet_class: Class of magnet to use (SimpleCoil or CoilCylinder)
+            design: Keyword arguments of make_magnet_params other than current
+            system_params: Dictionary with parameters for the hemisphere system
+            target_points: (n_targets, 3) points where B and its gradient are controlled
+            step_m: Finite difference step for the gradient
+        """
+        self.target_points = np.asarray(target_points, dtype=float).reshape(-1, 3)
+        self.step_m = step_m
+
+        # Build the system at 1 A drive so the basis is per amp of drive current
+        _, params = make_magnet_params(magnet_class, current=1.0, **design)
+        collection, sensor_positions = create_hemisphere_magnetic_system(magnet_class, params, system_params)
+        collection = unique_site_sources(collection)
+        self.coil_positions = np.array([source.position for source in collection.sources_all
+                                        if isinstance(source, magpy.current.Circle)]).reshape(-1, 3)
+
+        # Stencil: the target itself, then +/- step along x, y and z
+        offsets = np.vstack((np.zeros(3), np.repeat(np.eye(3), 2, axis=0) * np.tile([1, -1], 3)[:, None] * step_m))
+        stencil = self.target_points[:, None, :] + offsets[None, :, :]
+        basis = FieldBasis(collection, stencil)
+
+        # Coil current per amp of drive current (turns are folded into the loop current)
+        turns_factor = basis.nominal_currents[:, None, None, None]
+        coil_fields = basis.basis.reshape((basis.n_coils,) + stencil.shape) * turns_factor
+        static_fields = basis.static.reshape(stencil.shape)
+
+        self.field = coil_fields[:, :, 0, :]
+        self.gradient = (coil_fields[:, :, 1::2, :] - coil_fields[:, :, 2::2, :]) / (2 * step_m)
+        self.static_field = static_fields[:, 0, :]
+        self.static_gradient = (static_fields[:, 1::2, :] - static_fields[:, 2::2, :]) / (2 * step_m)
+
+    @property
+    def n_coils(self):
+        return self.field.shape[0]
+
+    def field_map(self):
+        """
+        Returns:
+            A: (3 * n_targets, n_coils) matrix mapping drive currents to stacked B vectors
+            offset: (3 * n_targets,) field at zero current
+        """
+        A = self.field.reshape(self.n_coils, -1).T
+        return A, self.static_field.ravel()
+
+    def force_map(self, moments):
+        """
+        Map drive currents to the force on point dipoles at the targets,
+        F_i = sum_j m_j dB_j/dx_i.
+
+        Args:
+            moments: (n_targets, 3) dipole moments in A*m^2
+
+        Returns:
+            A: (3 * n_targets, n_coils) matrix mapping drive currents to stacked forces
+            offset: (3 * n_targets,) force at zero current
+        """
+        moments = np.asarray(moments, dtype=float).reshape(-1, 3)
+        forces = np.einsum('kpij,pj->kpi', self.gradient, moments)
+        offset = np.einsum('pij,pj->pi', self.static_gradient, moments)
+        return forces.reshape(self.n_coils, -1).T, offset.ravel()
+
+
+def unique_site_sources(collection):
+    """
+    Collection with one source of each kind per hemisphere site.
+
+    Args:
+        collection: Collection from create_hemisphere_magnetic_system
+
+    Returns:
+        New magpylib Collection of the kept top level sources (sensors are dropped)
+    """
+    # Top level children, not collection.sources: that leaves out sub-Collections such as
+    # the coil and core of a CoilCylinder
+    sources = [child for child in collection.children if not isinstance(child, magpy.Sensor)]
+    kinds = [type(source).__name__ for source in sources]
+    keep = []
+    # A site can hold a coil and a ferro center at the same position, dedupe each kind separately
+    for kind in dict.fromkeys(kinds):
+        indices = [i for i, source_kind in enumerate(kinds) if source_kind == kind]
+        positions = np.array([sources[i].position for i in indices]).reshape(-1, 3)
+        keep.extend(indices[j] for j in unique_sites(positions))
+    # The kept sources move over from the system's collection
+    return magpy.Collection([sources[i] for i in sorted(keep)], override_parent=True)
+
+
+class CurrentAllocator(object):
+    """
+    Bounded least-squares current allocation for a fixed linear map:
+
+        min_I ||A I + offset - target||^2 + regularization * ||I||^2
+        s.t.  lower <= I <= upper
+
+    Solved with a primal active-set method: coils pinned at a bound are held fixed
+    and the rest come from one small linear solve. Everything that doesn't depend on
+    the target (Gram matrix) is precomputed, and each solve starts from the previous
+    solution's active set, so in a control loop where the target moves a little per
+    tick a solve usually takes one or two iterations.
+    """
+
+    def __init__(self, A, offset=None, lower=MIN_CURRENT_A, upper=MAX_CURRENT_A, regularization=1e-9):
+        """
+        Args:
+            A: (n_outputs, n_coils) influence matrix
+            offset: (n_outputs,) output at zero current
+            lower, upper: Current bounds in amperes (scalars or per coil)
+            regularization: Tikhonov weight relative to the largest eigenvalue of A^T A;
+                keeps the problem well posed when there are more coils than outputs
+        """
+        self.A = np.asarray(A, dtype=float)
+        n_coils = self.A.shape[1]
+        self.offset = np.zeros(self.A.shape[0]) if offset is None else np.asarray(offset, dtype=float)
+        self.lower = np.broadcast_to(np.asarray(lower, dtype=float), (n_coils,)).copy()
+        self.upper = np.broadcast_to(np.asarray(upper, dtype=float), (n_coils,)).copy()
+
+        G = self.A.T @ self.A
+        eig_max = np.linalg.eigvalsh(G)[-1]
+        self.G = G + regularization * eig_max * np.eye(n_coils)
+        self.AT = np.ascontiguousarray(self.A.T)
+        self.currents = None
+        self.iterations = 0
+
+    def solve(self, target, warm_start=True, max_iter=None, tol=1e-9):
+        """
+        Find coil currents that best produce the target output.
+
+        Args:
+            target: (n_outputs,) desired stacked field or force
+            warm_start: Start from the previous solution's active set
+            max_iter: Iteration limit, defaults to 3 * n_coils
+            tol: Relative tolerance on the KKT multipliers
+
+        Returns:
+            (n_coils,) drive currents in amperes
+        """
+        c = self.AT @ (np.ravel(target) - self.offset)
+        G, lower, upper = self.G, self.lower, self.upper
+        n = len(c)
+        max_iter = 3 * n if max_iter is None else max_iter
+        kkt_tol = tol * (np.max(np.abs(c)) + 1e-30)
+
+        if warm_start and self.currents is not None:
+            x = self.currents.copy()
+            at_lower = x <= lower
+            at_upper = x >= upper
+        else:
+            # Cold start: clip the unconstrained solution and pin what got clipped
+            x = np.linalg.solve(G, c)
+            at_lower = x < lower
+            at_upper = x > upper
+            x = np.clip(x, lower, upper)
+
+        for iteration in range(1, max_iter + 1):
+            fixed = at_lower | at_upper
+            free = ~fixed
+            x[at_lower] = lower[at_lower]
+            x[at_upper] = upper[at_upper]
+
+            if free.any():
+                # Optimum over the free coils with the pinned ones held at their bounds
+                rhs = c[free] - G[np.ix_(free, fixed)] @ x[fixed]
+                x_star = np.linalg.solve(G[np.ix_(free, free)], rhs)
+                x_free, lo, hi = x[free], lower[free], upper[free]
+                if np.any(x_star < lo) or np.any(x_star > hi):
+                    # Move towards it until the first coil hits a bound, then pin that coil
+                    d = x_star - x_free
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        ratios = np.where(d < 0, (lo - x_free) / d, np.where(d > 0, (hi - x_free) / d, np.inf))
+                    j = int(np.argmin(ratios))
+                    x[free] = x_free + max(ratios[j], 0.0) * d
+                    index = np.flatnonzero(free)[j]
+                    if d[j] < 0:
+                        at_lower[index] = True
+                    else:
+                        at_upper[index] = True
+                    continue
+                x[free] = x_star
+
+            # Pinned coils must want to go further out of bounds (non-negative multipliers)
+            grad = G @ x - c
+            violation = np.where(at_lower, -grad, 0.0) + np.where(at_upper, grad, 0.0)
+            k = int(np.argmax(violation))
+            if violation[k] <= kkt_tol:
+                break
+            at_lower[k] = at_upper[k] = False
+
+        self.iterations = iteration
+        self.currents = x
+        return x.copy()
+
+    def output(self, currents=None):
+        """Output produced by currents (defaults to the last solution)."""
+        currents = self.currents if currents is None else currents
+        return self.A @ currents + self.offset
+
+
+if __name__ == "__main__":
+    from time import perf_counter
+    from magnet_designer import SimpleCoil
+    
+    system_params = {'r_m': 0.1, 'n_phi_rad': 4, 'n_theta_rad': 8}
+    design = {'coil_diameter': 0.05, 'n_turns': 250}
+    # Control the field a little outside the coil shell, above and to the sides
+    target_points = np.array([[0, 0, 0.11], [0.05, 0, 0.1], [0, 0.05, 0.1]])
+    
+    influence = InfluenceMatrix(SimpleCoil, design, system_params, target_points)
+    allocator = CurrentAllocator(*influence.field_map())
+    
+    # Follow a slowly varying field target, as a control loop would
+    rng = np.random.default_rng(0)
+    B_nominal = allocator.output(rng.uniform(MIN_CURRENT_A, MAX_CURRENT_A, influence.n_coils))
+    latencies = []
+    for tick in range(1000):
+        target = B_nominal * (1 + 0.2 * np.sin(tick * 0.01))
+        t0 = perf_counter()
+        currents = allocator.solve(target)
+        latencies.append(perf_counter() - t0)
+    
+    error = np.linalg.norm(allocator.output() - target) / np.linalg.norm(target)
+    print(f"Coils: {influence.n_coils}, outputs: {len(target)}")
+    print(f"Solve latency: median {np.median(latencies)*1e6:.0f} us, p99 {np.percentile(latencies, 99)*1e6:.0f} us")
+    print(f"Relative field error: {error:.2e}, currents in [{currents.min():.3f}, {currents.max():.3f}] A")
@@ -0,0 +1,208 @@
+"""
+On-disk field atlas: a FieldLUT table stored as memory-mapped .npy files.
+
+An atlas is a directory with
+
+    header.json  grid axes, coil order, magnet class/params and system_params
+    basis.npy    (nx, ny, nz, n_coils, 3) unit-current field of every coil
+    static.npy   (nx, ny, nz, 3) field of the non-current sources
+
+Tables are written slab by slab straight into the memmap, so an atlas can be much
+larger than RAM. Readers open the arrays read-only with np.load(mmap_mode='r');
+the OS pages in only the cells that queries touch and shares those pages between
+processes, so opening an atlas is near instant. header.json is written last, so a
+half written atlas can't be opened by accident.
+"""
+import os
+import json
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from field_basis import FieldBasis
+from field_lut import FieldLUT, hemisphere_grid_axes
+from hemisphere_layout import hemisphere_layout
+from result_cache import to_jsonable
+
+# Bump when the file layout changes
+ATLAS_VERSION = 1
+
+HEADER_FILE = 'header.json'
+BASIS_FILE = 'basis.npy'
+STATIC_FILE = 'static.npy'
+
+
+def write_atlas(path, magnet_class, params, system_params, spacing_m=0.005, margin_m=0.03,
+                dtype=np.float32, chunk_points=20000):
+    """
+    Sample a hemisphere system on a grid and write it as an atlas directory.
+
+    Args:
+        path: Atlas directory, created if missing
+        magnet_class: Class of magnet to use (SimpleCoil or CoilCylinder)
+        params: Dictionary with parameters for the magnet class
+        system_params: Dictionary with parameters for the hemisphere system
+        spacing_m: Grid spacing
+        margin_m: Padding around the bounding box of the coil centers
+        dtype: Storage type of the tables
+        chunk_points: Approximate number of grid points evaluated per magpylib call,
+            bounds the memory used while writing
+
+    Returns:
+        path
+    """
+    # Imported here so reading an atlas doesn't pull in the sweep module
+    from magnet_sweep import create_hemisphere_magnetic_system
+
+    os.makedirs(path, exist_ok=True)
+    header_path = os.path.join(path, HEADER_FILE)
+    if os.path.exists(header_path):
+        os.remove(header_path)
+
+    collection, _ = create_hemisphere_magnetic_system(magnet_class, params, system_params)
+    layout = hemisphere_layout(system_params['r_m'], system_params['n_phi_rad'], system_params['n_theta_rad'])
+    x, y, z = hemisphere_grid_axes(system_params, spacing_m, margin_m)
+    shape = (len(x), len(y), len(z))
+
+    basis_file = open_memmap(os.path.join(path, BASIS_FILE), mode='w+', dtype=dtype,
+                             shape=shape + (layout.n_coils, 3))
+    static_file = open_memmap(os.path.join(path, STATIC_FILE), mode='w+', dtype=dtype, shape=shape + (3,))
+
+    # Write slabs of whole x planes so every chunk is one contiguous block on disk
+    slab = max(1, chunk_points // (shape[1] * shape[2]))
+    nominal_currents = None
+    for i0 in range(0, shape[0], slab):
+        xs = x[i0:i0 + slab]
+        X, Y, Z = np.meshgrid(xs, y, z, indexing='ij')
+        basis = FieldBasis(collection, np.stack((X, Y, Z), axis=-1))
+        if basis.n_coils != layout.n_coils:
+            raise ValueError(f"Expected {layout.n_coils} coils, the collection has {basis.n_coils}")
+        basis_file[i0:i0 + len(xs)] = np.moveaxis(basis.basis.reshape((basis.n_coils,) + X.shape + (3,)), 0, 3)
+        static_file[i0:i0 + len(xs)] = basis.static.reshape(X.shape + (3,))
+        nominal_currents = basis.nominal_currents
+    basis_file.flush()
+    static_file.flush()
+    del basis_file, static_file
+
+    header = {
+        'version': ATLAS_VERSION,
+        'magnet_class': magnet_class.__name__,
+        'params': to_jsonable(params),
+        'system_params': to_jsonable(system_params),
+        'origin': [x[0], y[0], z[0]],
+        'spacing': spacing_m,
+        'shape': list(shape),
+        'dtype': np.dtype(dtype).str,
+        # Coils in basis order, which is the Collection order of create_hemisphere_magnetic_system
+        'coil_positions': layout.coil_positions,
+        'coil_directions': layout.coil_directions,
+        'nominal_currents': nominal_currents,
+    }
+    with open(header_path, 'w') as f:
+        json.dump(to_jsonable(header), f, indent=2)
+    return path
+
+
+class FieldAtlas(object):
+    """
+    Read-only view of an atlas directory.
+
+    Queries go through a FieldLUT whose tables are the memmaps themselves, so only
+    the grid cells around the query points are read from disk. (Queries with more
+    points than grid cells superpose the currents over the whole grid and read all of it.)
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: Atlas directory written by write_atlas
+        """
+        self.path = path
+        with open(os.path.join(path, HEADER_FILE)) as f:
+            self.header = json.load(f)
+        if self.header['version'] != ATLAS_VERSION:
+            raise ValueError(f"Unsupported atlas version {self.header['version']}, expected {ATLAS_VERSION}")
+
+        self.basis = np.load(os.path.join(path, BASIS_FILE), mmap_mode='r')
+        self.static = np.load(os.path.join(path, STATIC_FILE), mmap_mode='r')
+
+        origin = np.asarray(self.header['origin'])
+        spacing = self.header['spacing']
+        x, y, z = (origin[i] + spacing * np.arange(n) for i, n in enumerate(self.header['shape']))
+        self.lut = FieldLUT(x, y, z, self.basis, self.static, self.header['nominal_currents'])
+
+    @property
+    def n_coils(self):
+        return self.lut.n_coils
+
+    @property
+    def system_params(self):
+        return self.header['system_params']
+
+    @property
+    def params(self):
+        return self.header['params']
+
+    @property
+    def coil_positions(self):
+        return np.asarray(self.header['coil_positions'])
+
+    @property
+    def coil_directions(self):
+        return np.asarray(self.header['coil_directions'])
+
+    def field(self, points, currents=None):
+        """B-field at arbitrary points, see FieldLUT.field."""
+        return self.lut.field(points, currents)
+
+    def interpolate_basis(self, points):
+        """Interpolated per coil unit-current field, see FieldLUT.interpolate_basis."""
+        return self.lut.interpolate_basis(points)
+
+    def region(self, lo, hi):
+        """
+        Zero-copy view of the grid nodes inside an axis aligned box.
+
+        Args:
+            lo, hi: (3,) box corners in meters
+
+        Returns:
+            axes: (x, y, z) axes of the sub grid
+            basis: (nx', ny', nz', n_coils, 3) read-only memmap slice
+            static: (nx', ny', nz', 3) read-only memmap slice
+        """
+        slices = []
+        for axis, a, b in zip(self.lut.axes, lo, hi):
+            i0, i1 = np.searchsorted(axis, a, side='left'), np.searchsorted(axis, b, side='right')
+            slices.append(slice(i0, i1))
+        axes = tuple(axis[s] for axis, s in zip(self.lut.axes, slices))
+        return axes, self.basis[tuple(slices)], self.static[tuple(slices)]
+
+
+if __name__ == "__main__":
+    import tempfile
+    from time import time
+    from magnet_designer import SimpleCoil
+    from magnet_sweep import create_hemisphere_magnetic_system, make_magnet_params
+
+    system_params = {'r_m': 0.1, 'n_phi_rad': 4, 'n_theta_rad': 8}
+    _, params = make_magnet_params(SimpleCoil, coil_diameter=0.05, current=0.5, n_turns=250)
+
+    path = os.path.join(tempfile.gettempdir(), 'field_atlas_demo')
+    t0 = time()
+    write_atlas(path, SimpleCoil, params, system_params, spacing_m=0.004)
+    print(f"Wrote atlas in {time()-t0:.3f} s")
+
+    t0 = time()
+    atlas = FieldAtlas(path)
+    print(f"Opened {atlas.lut.shape} grid for {atlas.n_coils} coils "
+          f"({atlas.basis.nbytes / 1e6:.0f} MB on disk) in {(time()-t0)*1e3:.1f} ms")
+
+    rng = np.random.default_rng(0)
+    # Inside the shell, away from the coil windings
+    points = rng.uniform(-0.04, 0.04, size=(1000, 3)) + [0, 0, 0.03]
+    t0 = time()
+    atlas.field(points)
+    print(f"{len(points)} queries in {(time()-t0)*1e3:.1f} ms")
+    collection, _ = create_hemisphere_magnetic_system(SimpleCoil, params, system_params)
+    print("Interpolation error:", atlas.lut.interpolation_error(collection, points))
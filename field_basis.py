@@ -0,0 +1,72 @@
+import numpy as np
+import magpylib as magpy
+
+
+class FieldBasis(object):
+    """
+    Unit-current field basis for a magpylib Collection.
+
+    The field of every current source is linear in its current, so we evaluate each
+    coil once at 1 A on a fixed set of points and superpose afterwards:
+
+        B(points) = B_static + sum_k I_k * B_k(points)
+
+    Non-current sources (e.g. the cylinder cores of CoilCylinder or ferro centers)
+    don't scale with current and are summed into a single static field.
+    """
+
+    def __init__(self, collection, points):
+        """
+        Args:
+            collection: magpylib Collection (or single source) to decompose
+            points: Array of shape (..., 3) with the observer positions in meters
+        """
+        points = np.asarray(points, dtype=float)
+        self.points_shape = points.shape[:-1]
+        flat_points = points.reshape(-1, 3)
+
+        sources = collection.sources_all if isinstance(collection, magpy.Collection) else [collection]
+        coils = [s for s in sources if isinstance(s, magpy.current.Circle)]
+        static_sources = [s for s in sources if not isinstance(s, magpy.current.Circle)]
+
+        # Nominal currents the collection was built with, so the basis can reproduce it
+        self.nominal_currents = np.array([coil.current for coil in coils], dtype=float)
+
+        # Evaluate every coil at unit current in a single vectorized getB call
+        if coils:
+            try:
+                for coil in coils:
+                    coil.current = 1.0
+                basis = magpy.getB(coils, flat_points, sumup=False)
+            finally:
+                for coil, current in zip(coils, self.nominal_currents):
+                    coil.current = current
+            self.basis = np.reshape(basis, (len(coils), len(flat_points), 3))
+        else:
+            self.basis = np.zeros((0, len(flat_points), 3))
+
+        if static_sources:
+            self.static = np.reshape(magpy.getB(static_sources, flat_points, sumup=True), (len(flat_points), 3))
+        else:
+            self.static = np.zeros((len(flat_points), 3))
+
+    @property
+    def n_coils(self):
+        return self.basis.shape[0]
+
+    def field(self, currents=None):
+        """
+        Superpose the basis for a set of coil currents.
+
+        Args:
+            currents: Coil currents of shape (n_coils,), or (n_patterns, n_coils) to evaluate
+                several current patterns at once. Defaults to the nominal currents.
+
+        Returns:
+            B-field in Tesla with shape points_shape + (3,), or (n_patterns,) + points_shape + (3,)
+        """
+        if currents is None:
+            currents = self.nominal_currents
+        currents = np.asarray(currents, dtype=float)
+        B = np.tensordot(currents, self.basis, axes=([-1], [0])) + self.static
+        return B.reshape(currents.shape[:-1] + self.points_shape + (3,))
@@ -0,0 +1,259 @@
+import numpy as np
+import magpylib as magpy
+
+from field_basis import FieldBasis
+from hemisphere_layout import hemisphere_layout
+
+
+def hemisphere_grid_axes(system_params, spacing_m=0.005, margin_m=0.03):
+    """
+    Grid axes covering the coil shell of a hemisphere system plus a margin on every side.
+
+    Args:
+        system_params: Dictionary with parameters for the hemisphere system
+        spacing_m: Grid spacing
+        margin_m: Padding around the bounding box of the coil centers
+
+    Returns:
+        x, y, z: Evenly spaced axes in meters
+    """
+    layout = hemisphere_layout(system_params['r_m'], system_params['n_phi_rad'], system_params['n_theta_rad'])
+    lo = layout.coil_positions.min(axis=0) - margin_m
+    hi = layout.coil_positions.max(axis=0) + margin_m
+    # Round the extent up to whole cells so the spacing is exact
+    n = np.ceil((hi - lo) / spacing_m).astype(int) + 1
+    return tuple(lo[i] + spacing_m * np.arange(n[i]) for i in range(3))
+
+
+class FieldLUT(object):
+    """
+    Per-coil field lookup table on a regular 3D grid.
+
+    Like FieldBasis, every coil is sampled at 1 A so arbitrary current patterns can be
+    superposed, but on a fixed grid instead of fixed points. Queries at arbitrary
+    points are answered by trilinear interpolation, which is linear in the table, so
+    interpolating the basis and then superposing the currents is exact:
+
+        B(p) = static(p) + sum_k I_k * basis_k(p)
+
+    Layout: basis has shape (nx, ny, nz, n_coils, 3) so the 8 corners of a cell are
+    each one contiguous (n_coils, 3) block; static has shape (nx, ny, nz, 3).
+    """
+
+    def __init__(self, x, y, z, basis, static, nominal_currents):
+        """
+        Args:
+            x, y, z: Increasing, evenly spaced grid axes in meters
+            basis: (nx, ny, nz, n_coils, 3) unit-current field of every coil in Tesla
+            static: (nx, ny, nz, 3) field of the non-current sources in Tesla
+            nominal_currents: (n_coils,) currents the collection was built with
+        """
+        self.axes = tuple(np.asarray(axis, dtype=float) for axis in (x, y, z))
+        self.basis = basis
+        self.static = static
+        self.nominal_currents = np.asarray(nominal_currents, dtype=float)
+
+        self.shape = tuple(len(axis) for axis in self.axes)
+        self.origin = np.array([axis[0] for axis in self.axes])
+        self.spacing = np.array([axis[1] - axis[0] for axis in self.axes])
+
+        # Flat views for the corner gathers
+        self._basis_flat = basis.reshape(-1, self.n_coils * 3)
+        self._static_flat = static.reshape(-1, 3)
+        self._strides = np.array([self.shape[1] * self.shape[2], self.shape[2], 1])
+
+    @property
+    def n_coils(self):
+        return self.basis.shape[3]
+
+    @classmethod
+    def from_collection(cls, collection, x, y, z, dtype=np.float32):
+        """
+        Sample a magpylib Collection on the grid spanned by x, y and z.
+
+        Args:
+            collection: magpylib Collection (or single source)
+            x, y, z: Grid axes in meters
+            dtype: Storage type of the table; float32 halves memory with errors far
+                below the interpolation error
+
+        Returns:
+            FieldLUT
+        """
+        X, Y, Z = np.meshgrid(x, y, z, indexing='ij')
+        basis = FieldBasis(collection, np.stack((X, Y, Z), axis=-1))
+        # (n_coils, nx, ny, nz, 3) -> (nx, ny, nz, n_coils, 3)
+        table = np.moveaxis(basis.basis.reshape((basis.n_coils,) + X.shape + (3,)), 0, 3)
+        return cls(
+            x, y, z,
+            np.ascontiguousarray(table, dtype=dtype),
+            basis.static.reshape(X.shape + (3,)).astype(dtype),
+            basis.nominal_currents,
+        )
+
+    @classmethod
+    def from_hemisphere(cls, magnet_class, params, system_params, spacing_m=0.005, margin_m=0.03,
+                        dtype=np.float32):
+        """
+        Build the table for a system made by create_hemisphere_magnetic_system, on a
+        grid covering the coil shell plus a margin on every side.
+
+        Args:
+            magnet_class: Class of magnet to use (SimpleCoil or CoilCylinder)
+            params: Dictionary with parameters for the magnet class
+            system_params: Dictionary with parameters for the hemisphere system
+            spacing_m: Grid spacing
+            margin_m: Padding around the bounding box of the coil centers
+            dtype: Storage type of the table
+
+        Returns:
+            FieldLUT
+        """
+        # Imported here so the table itself doesn't pull in the sweep module
+        from magnet_sweep import create_hemisphere_magnetic_system
+
+        collection, _ = create_hemisphere_magnetic_system(magnet_class, params, system_params)
+        x, y, z = hemisphere_grid_axes(system_params, spacing_m, margin_m)
+        return cls.from_collection(collection, x, y, z, dtype=dtype)
+
+    def _corners(self, points):
+        """
+        Flat indices and trilinear weights of the 8 cell corners around each point.
+
+        Returns:
+            indices: (n, 8) flat grid indices
+            weights: (n, 8) weights, zero for points outside the grid
+            inside: (n,) mask of points inside the grid
+        """
+        u = (points - self.origin) / self.spacing
+        upper = np.array(self.shape) - 1
+        inside = np.all((u >= 0) & (u <= upper), axis=1)
+        # Cell index, clamped so points on the upper faces use the last cell
+        i0 = np.clip(np.floor(u).astype(np.intp), 0, upper - 1)
+        t = np.clip(u - i0, 0.0, 1.0)
+
+        # Corner c has offset bit k along axis k
+        bits = (np.arange(8)[:, None] >> np.arange(3)[::-1]) & 1  # (8, 3), axis order x, y, z
+        indices = (i0 @ self._strides)[:, None] + bits @ self._strides
+        weights = np.prod(np.where(bits[None, :, :], t[:, None, :], 1 - t[:, None, :]), axis=2)
+        weights[~inside] = 0.0
+        return indices, weights, inside
+
+    def interpolate_basis(self, points):
+        """
+        Interpolated unit-current field of every coil.
+
+        Args:
+            points: (..., 3) query points in meters
+
+        Returns:
+            basis: (n_points, n_coils, 3) per coil field in Tesla, NaN outside the grid
+            static: (n_points, 3) field of the non-current sources, NaN outside the grid
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        indices, weights, inside = self._corners(points)
+        basis = np.einsum('nc,ncf->nf', weights, self._basis_flat[indices]).reshape(-1, self.n_coils, 3)
+        static = np.einsum('nc,ncf->nf', weights, self._static_flat[indices])
+        basis[~inside] = np.nan
+        static[~inside] = np.nan
+        return basis, static
+
+    def field(self, points, currents=None):
+        """
+        B-field at arbitrary points for a set of coil currents.
+
+        Args:
+            points: (..., 3) query points in meters
+            currents: Coil currents of shape (n_coils,), defaults to the nominal currents
+
+        Returns:
+            B-field in Tesla with shape (..., 3), NaN for points outside the grid
+        """
+        points = np.asarray(points, dtype=float)
+        currents = self.nominal_currents if currents is None else np.asarray(currents, dtype=float)
+        flat = points.reshape(-1, 3)
+        indices, weights, inside = self._corners(flat)
+        if indices.size > len(self._static_flat):
+            # Many queries: superpose the currents over the whole grid once, then gather
+            grid = np.tensordot(self._basis_flat.reshape(-1, self.n_coils, 3), currents, axes=([1], [0]))
+            corner_fields = (grid + self._static_flat)[indices]
+        else:
+            # Few queries (control loop): superpose only on the 8 corners of each point
+            corners = self._basis_flat[indices].reshape(len(flat), 8, self.n_coils, 3)
+            corner_fields = np.einsum('nckf,k->ncf', corners, currents) + self._static_flat[indices]
+        B = np.einsum('nc,ncf->nf', weights, corner_fields)
+        B[~inside] = np.nan
+        return B.reshape(points.shape)
+
+    def save(self, path):
+        """Save the table to a .npz file."""
+        np.savez(
+            path, x=self.axes[0], y=self.axes[1], z=self.axes[2], basis=self.basis,
+            static=self.static, nominal_currents=self.nominal_currents,
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Load a table written by save."""
+        with np.load(path) as data:
+            return cls(data['x'], data['y'], data['z'], data['basis'], data['static'], data['nominal_currents'])
+
+    def interpolation_error(self, collection, points, currents=None):
+        """
+        Compare table queries against direct magpylib evaluation.
+
+        Args:
+            collection: The Collection the table was built from
+            points: (n, 3) test points inside the grid, ideally off the grid nodes
+            currents: Coil currents, defaults to the nominal currents
+
+        Returns:
+            Dictionary with the max/rms absolute error in Tesla and the median, p95 and
+            max error relative to the field magnitude
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        B_lut = self.field(points, currents)
+        # FieldBasis superposes the same currents exactly, without interpolation
+        B_ref = FieldBasis(collection, points).field(currents)
+
+        error = np.linalg.norm(B_lut - B_ref, axis=1)
+        relative = error / np.maximum(np.linalg.norm(B_ref, axis=1), 1e-30)
+        return {
+            'n_points': len(points),
+            'max_abs_t': float(np.max(error)),
+            'rms_abs_t': float(np.sqrt(np.mean(error**2))),
+            'median_rel': float(np.median(relative)),
+            'p95_rel': float(np.percentile(relative, 95)),
+            'max_rel': float(np.max(relative)),
+        }
+
+
+if __name__ == "__main__":
+    from time import time
+    from magnet_designer import SimpleCoil
+    from magnet_sweep import create_hemisphere_magnetic_system, make_magnet_params
+
+    system_params = {'r_m': 0.1, 'n_phi_rad': 4, 'n_theta_rad': 8}
+    _, params = make_magnet_params(SimpleCoil, coil_diameter=0.05, current=0.5, n_turns=250)
+
+    t0 = time()
+    lut = FieldLUT.from_hemisphere(SimpleCoil, params, system_params)
+    print(f"Built {lut.shape} grid for {lut.n_coils} coils in {time()-t0:.3f} s "
+          f"({lut.basis.nbytes / 1e6:.0f} MB)")
+
+    # Test points inside the shell, where the ball (and its magnets) move
+    rng = np.random.default_rng(0)
+    directions = rng.normal(size=(20000, 3))
+    directions[:, 2] = np.abs(directions[:, 2])
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    points = directions * rng.uniform(0.0, 0.08, size=(len(directions), 1))
+
+    t0 = time()
+    B = lut.field(points)
+    t_lut = time() - t0
+    collection, _ = create_hemisphere_magnetic_system(SimpleCoil, params, system_params)
+    t0 = time()
+    magpy.getB(collection, points)
+    t_magpy = time() - t0
+    print(f"{len(points)} queries: LUT {t_lut*1e3:.1f} ms, magpylib {t_magpy*1e3:.1f} ms")
+    print("Interpolation error:", lut.interpolation_error(collection, points))
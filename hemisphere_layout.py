@@ -0,0 +1,119 @@
+import numpy as np
+from scipy.spatial.transform import Rotation
+
+
+class HemisphereLayout(object):
+    """
+    Coil and sensor placement on the hemisphere as plain NumPy arrays.
+
+    Attributes:
+        coil_positions: (n_coils, 3) coil centers in meters
+        coil_directions: (n_coils, 3) unit radial directions (coil axes)
+        coil_rotations: scipy Rotation batch turning +z onto each coil's radial direction
+        sensor_positions: (n_sensors, 3) sensor positions in meters
+    """
+
+    def __init__(self, coil_positions, coil_rotations, sensor_positions):
+        self.coil_positions = coil_positions
+        self.coil_rotations = coil_rotations
+        self.sensor_positions = sensor_positions
+        self.coil_directions = coil_rotations.apply([0, 0, 1]).reshape(-1, 3)
+
+    @property
+    def n_coils(self):
+        return len(self.coil_positions)
+
+
+def radial_rotations(positions):
+    """
+    Batch of rotations taking the +z-axis onto the radial direction of each position.
+
+    Positions on the +z-axis get the identity rotation.
+
+    Args:
+        positions: (n, 3) array of positions
+
+    Returns:
+        scipy Rotation with n rotations
+    """
+    positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+    radial_dir = positions / np.linalg.norm(positions, axis=1, keepdims=True)
+
+    # z x radial = (-r_y, r_x, 0), orthogonal to both the z-axis and the radial direction
+    z_cross_radial = np.stack((-radial_dir[:, 1], radial_dir[:, 0], np.zeros(len(radial_dir))), axis=1)
+    norm_cross = np.linalg.norm(z_cross_radial, axis=1)
+    angle = np.arccos(np.clip(radial_dir[:, 2], -1.0, 1.0))
+
+    rotvecs = np.zeros_like(positions)
+    tilted = norm_cross > 1e-9
+    rotvecs[tilted] = z_cross_radial[tilted] / norm_cross[tilted, None] * angle[tilted, None]
+    return Rotation.from_rotvec(rotvecs)
+
+
+def unique_sites(positions, decimals=12):
+    """
+    Indices of the first of every group of coinciding positions, in their original order.
+
+    The layout grid repeats sites: every azimuth step at the pole, and the zero azimuth
+    offset is mirrored into two coils per site.
+
+    Args:
+        positions: (n, 3) array of positions
+        decimals: Positions are compared after rounding to this many decimals
+
+    Returns:
+        Sorted index array
+    """
+    positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+    _, first = np.unique(np.round(positions, decimals), axis=0, return_index=True)
+    return np.sort(first)
+
+
+def hemisphere_layout(r_m, n_phi_rad, n_theta_rad, range_offsets=(0, 0.005), angle_offsets=(0,), phi_offsets=(0,)):
+    """
+    Generate every coil and sensor on the hemisphere in one shot.
+
+    Sensors sit at every (phi, theta, range offset, azimuth offset, elevation offset)
+    combination; azimuth offsets are mirrored (+/-). A coil is placed at each sensor
+    position with all offsets equal to zero. Ordering matches the nested loops
+    phi -> theta -> range -> azimuth -> elevation.
+
+    Args:
+        r_m: Hemisphere radius in meters
+        n_phi_rad: Number of elevation steps from 0 to pi/2
+        n_theta_rad: Number of azimuth steps over the full circle
+        range_offsets: Radial sensor offsets in meters
+        angle_offsets: Azimuth sensor offsets in radians
+        phi_offsets: Elevation sensor offsets in radians
+
+    Returns:
+        HemisphereLayout
+    """
+    phi_values = np.linspace(0, np.pi/2, n_phi_rad)  # 0 to π/2 for a hemisphere
+    theta_values = np.linspace(0, 2*np.pi, n_theta_rad, endpoint=False)
+    angle_offsets = np.asarray(angle_offsets, dtype=float)
+    angle_offsets = np.concatenate((angle_offsets, -angle_offsets))
+
+    # Broadcast to shape (phi, theta, range, azimuth offset, elevation offset)
+    phi = phi_values[:, None, None, None, None]
+    theta = theta_values[None, :, None, None, None]
+    r_offset = np.asarray(range_offsets, dtype=float)[None, None, :, None, None]
+    theta_offset = angle_offsets[None, None, None, :, None]
+    phi_offset = np.asarray(phi_offsets, dtype=float)[None, None, None, None, :]
+
+    # Calculate sensor positions in cartesian
+    r = r_m + r_offset
+    x = r * np.sin(phi + phi_offset) * np.cos(theta + theta_offset)
+    y = r * np.sin(phi + phi_offset) * np.sin(theta + theta_offset)
+    z = r * np.cos(phi + phi_offset) * np.ones_like(theta + theta_offset)
+    positions = np.stack(np.broadcast_arrays(x, y, z), axis=-1)
+
+    # Coils only for the zero offset case
+    coil_mask = np.broadcast_to((r_offset == 0) & (theta_offset == 0) & (phi_offset == 0), positions.shape[:-1])
+
+    coil_positions = positions[coil_mask]
+    return HemisphereLayout(
+        coil_positions=coil_positions,
+        coil_rotations=radial_rotations(coil_positions),
+        sensor_positions=positions.reshape(-1, 3),
+    )
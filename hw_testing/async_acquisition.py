@@ -0,0 +1,348 @@
+"""
+Event driven acquisition from several magnetometer serial ports with asyncio.
+
+Every port's file descriptor is registered with loop.add_reader, so the process
+sleeps in the selector until some port has bytes; nothing polls, and idle ports
+cost nothing. (add_reader needs a selector event loop, i.e. POSIX; the Windows
+proactor loop doesn't support it.) A readable port is only marked ready and its
+reader paused; once per tick (emit_interval) every ready port is read, all text
+ports' lines are parsed in one parse_lines call, and the frames are resampled, then
+the readers are re-armed. So a port costs at most one wake up per tick, and the
+fixed per-call costs of parsing don't multiply with the number of ports. What still
+grows with the port count is the unavoidable part: reading and parsing the bytes.
+
+Each port has its own device clock (micros() on the Arduino). Device timestamps
+are unwrapped and mapped onto the host's monotonic clock with a minimum-delay
+offset estimate, then every port is linearly resampled onto one common clock and
+merged into multi-sensor frames.
+"""
+import asyncio
+import time
+from collections import namedtuple
+
+import numpy as np
+import serial as serials
+
+from hw_testing.binary_protocol import FrameDecoder
+from hw_testing.magnetometer_reader import LineDecoder, parse_lines
+from hw_testing.ring_buffer import RingBuffer
+
+
+# Device timestamps are 32 bit microsecond counters
+DEVICE_CLOCK_WRAP_S = 2**32 / 1e6
+
+# One time aligned sample of every port. values has shape (n_ports, 5) with
+# x, y, z, strength, temp per port in port order, NaN where a port had no data.
+MultiSensorFrame = namedtuple('MultiSensorFrame', ['time', 'values'])
+
+
+class PortStream(object):
+    """
+    Decoding and clock alignment for one serial port.
+
+    The offset between device and host clocks is the smallest observed
+    host_arrival - device_time (the sample that waited the least in USB and OS
+    buffers). The estimate may grow by max_drift per second so a device clock that
+    runs slow relative to the host is still followed. It only shrinks as far as keeps
+    the stored host times non-decreasing, which interpolate (np.interp) relies on.
+    """
+
+    def __init__(self, name, port, baudrate=115200, protocol="text", capacity=4096, max_drift=1e-4):
+        if protocol not in ("text", "binary"):
+            raise ValueError(f"Unsupported protocol: {protocol}")
+        self.name = name
+        self.port = port
+        self.baudrate = baudrate
+        self.decoder = FrameDecoder() if protocol == "binary" else LineDecoder()
+        self.samples = RingBuffer(capacity)  # Times on the host clock
+        self.max_drift = max_drift
+        self.ser = None
+        self.fd = None  # Registered with the event loop, cached so a failing port can still be removed
+
+        self.offset = None
+        self.last_arrival = None
+        self._wrap_base = 0.0
+        self._last_device_time = None
+
+    def open(self):
+        self.ser = serials.Serial(self.port, self.baudrate, timeout=0)  # Non-blocking reads
+        self.ser.reset_input_buffer()
+        self.fd = self.ser.fileno()
+        return self.fd
+
+    def close(self):
+        if self.ser is not None and self.ser.is_open:
+            self.ser.close()
+
+    def read_bytes(self):
+        """Whatever the port has buffered."""
+        return self.ser.read(max(self.ser.in_waiting, 1))
+
+    def read(self, host_time):
+        """Read whatever the port has buffered. Returns the number of new samples."""
+        return self.feed(self.read_bytes(), host_time)
+
+    def feed(self, data, host_time):
+        """
+        Decode bytes that arrived at host_time and store the samples on the host clock.
+
+        Returns:
+            Number of new samples
+        """
+        return self.store(self.decoder.feed(data), host_time)
+
+    def store(self, samples, host_time):
+        """
+        Store decoded (n, 6) samples that arrived at host_time on the host clock.
+
+        Returns:
+            Number of new samples
+        """
+        if len(samples) == 0:
+            return 0
+        samples[:, 0] = self._unwrap(samples[:, 0])
+
+        # Minimum delay offset; the newest sample of a batch waited the least
+        candidate = host_time - samples[-1, 0]
+        if self.offset is None:
+            self.offset = candidate
+        else:
+            allowed = self.offset + self.max_drift * (host_time - self.last_arrival)
+            self.offset = min(allowed, candidate)
+        latest = self.latest_time
+        if latest is not None:
+            # A smaller offset must not move this batch before samples already stored
+            self.offset = max(self.offset, latest - samples[0, 0])
+        self.last_arrival = host_time
+
+        samples[:, 0] += self.offset
+        # Rows of float64 are already the sample layout, store them as a structured view
+        self.samples.extend(np.ascontiguousarray(samples).view(self.samples.dtype).ravel())
+        return len(samples)
+
+    def _unwrap(self, device_times):
+        times = np.array(device_times, dtype=float)
+        previous = np.concatenate(([self._last_device_time if self._last_device_time is not None else times[0]],
+                                   times[:-1]))
+        wraps = np.cumsum(times < previous - DEVICE_CLOCK_WRAP_S / 2)
+        times += self._wrap_base + wraps * DEVICE_CLOCK_WRAP_S
+        self._wrap_base += wraps[-1] * DEVICE_CLOCK_WRAP_S
+        self._last_device_time = device_times[-1]
+        return times
+
+    def interpolate(self, times):
+        """
+        Resample the stored samples at host clock times.
+
+        Returns:
+            (len(times), 5) array of x, y, z, strength, temp, NaN outside the stored range
+        """
+        history = self.samples.view()
+        values = np.full((len(times), 5), np.nan)
+        if len(history) < 2 or len(times) == 0:
+            return values
+        # Only the samples bracketing the requested times
+        start = max(int(np.searchsorted(history['time'], times[0], side='right')) - 1, 0)
+        history = history[start:]
+        for i, name in enumerate(('x', 'y', 'z', 'strength', 'temp')):
+            values[:, i] = np.interp(times, history['time'], history[name], left=np.nan, right=np.nan)
+        return values
+
+    @property
+    def latest_time(self):
+        latest = self.samples.latest
+        return None if latest is None else float(latest['time'])
+
+
+class AsyncAcquisition(object):
+    """
+    Read N serial ports at once and yield time aligned MultiSensorFrames.
+
+    Frames are emitted on a fixed host clock grid of rate_hz once every live port has
+    data past the frame time. A port that sent nothing for max_latency seconds no
+    longer holds frames back; its values are NaN until it catches up again.
+
+    Usage:
+
+        async with AsyncAcquisition(['/dev/ttyACM0', '/dev/ttyACM1']) as acquisition:
+            async for frame in acquisition:
+                ...
+    """
+
+    def __init__(self, ports, baudrate=115200, protocol="text", rate_hz=500.0, max_latency=0.05,
+                 emit_interval=0.01, max_queued_frames=10_000, logger=None):
+        """
+        Args:
+            ports: Serial port paths; the port order is the row order of frame values
+            baudrate: Baudrate for every port
+            protocol: "text" or "binary", see magnetometer_reader.ino
+            rate_hz: Rate of the common output clock
+            max_latency: Seconds without data after which a port is considered stale
+            emit_interval: Tick length; ready ports are read, decoded and resampled
+                together at most this often
+            max_queued_frames: Frames kept for a slow consumer, older ones are dropped
+            logger: Optional logger
+        """
+        self.streams = [PortStream(port, port, baudrate, protocol) for port in ports]
+        self.protocol = protocol
+        self.period = 1.0 / rate_hz
+        self.max_latency = max_latency
+        self.emit_interval = emit_interval
+        self.logger = logger
+        self.queue = asyncio.Queue(max_queued_frames)
+        self.dropped_frames = 0
+        self._next_index = None
+        self._loop = None
+        self._tick_handle = None
+        self._ready = []          # Streams with data waiting for the next tick, readers paused
+        self._registered = set()  # Streams whose fd is registered with the loop
+
+    @property
+    def ports(self):
+        return [stream.name for stream in self.streams]
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        for stream in self.streams:
+            stream.open()
+            self._add_reader(stream)
+            if self.logger:
+                self.logger.info(f"Reading {stream.port} at {stream.baudrate} baud")
+
+    def stop(self):
+        if self._tick_handle is not None:
+            self._tick_handle.cancel()
+            self._tick_handle = None
+        for stream in self.streams:
+            self._remove_reader(stream)
+            stream.close()
+        self._ready = []
+
+    def _add_reader(self, stream):
+        self._loop.add_reader(stream.fd, self._on_readable, stream)
+        self._registered.add(stream)
+
+    def _remove_reader(self, stream):
+        if self._loop is not None and stream in self._registered:
+            self._loop.remove_reader(stream.fd)
+            self._registered.discard(stream)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.stop()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+    def _on_readable(self, stream):
+        # Only note the port; it is read with every other ready port on the next tick
+        self._remove_reader(stream)
+        self._ready.append(stream)
+        if self._tick_handle is None:
+            self._tick_handle = self._loop.call_later(self.emit_interval, self._tick)
+
+    def _tick(self):
+        """Read, decode and store every ready port in one pass, then emit frames."""
+        self._tick_handle = None
+        ready, self._ready = self._ready, []
+        host_time = time.monotonic()
+        chunks = []
+        for stream in ready:
+            try:
+                chunks.append((stream, stream.read_bytes()))
+            except (serials.SerialException, OSError) as e:
+                # Reader stays removed, the port is not read again
+                if self.logger:
+                    self.logger.error(f"Error reading {stream.port}: {e}")
+                continue
+            self._add_reader(stream)
+
+        if self.protocol == "text":
+            self._store_text(chunks, host_time)
+        else:
+            for stream, data in chunks:
+                stream.feed(data, host_time)
+        self._emit_frames()
+
+    def _store_text(self, chunks, host_time):
+        # One parse_lines call for the lines of every port; its fixed cost is paid once per tick
+        lines = [stream.decoder.split(data) for stream, data in chunks]
+        samples, bad_lines = parse_lines([line for port_lines in lines for line in port_lines])
+        if bad_lines:
+            # Which port the bad lines came from is unknown, parse port by port
+            for (stream, _), port_lines in zip(chunks, lines):
+                port_samples, port_bad = parse_lines(port_lines)
+                stream.decoder.count(len(port_samples), port_bad)
+                stream.store(port_samples, host_time)
+            return
+        start = 0
+        for (stream, _), port_lines in zip(chunks, lines):
+            end = start + len(port_lines)
+            stream.decoder.count(end - start, 0)
+            stream.store(samples[start:end], host_time)
+            start = end
+
+    def _emit_frames(self):
+        """Resample every frame time that all live ports have covered."""
+        now = time.monotonic()
+        live = [s for s in self.streams
+                if s.last_arrival is not None and now - s.last_arrival <= self.max_latency]
+        if not live:
+            return
+        ready_until = min(s.latest_time for s in live)
+        if self._next_index is None:
+            self._next_index = int(np.ceil(ready_until / self.period))
+        last_index = int(np.floor(ready_until / self.period))
+        if last_index < self._next_index:
+            return
+
+        times = np.arange(self._next_index, last_index + 1) * self.period
+        self._next_index = last_index + 1
+        # (n_frames, n_ports, 5), one np.interp per port and field for the whole batch
+        values = np.stack([stream.interpolate(times) for stream in self.streams], axis=1)
+        for t, frame_values in zip(times, values):
+            if self.queue.full():
+                self.queue.get_nowait()
+                self.dropped_frames += 1
+            self.queue.put_nowait(MultiSensorFrame(float(t), frame_values))
+
+
+if __name__ == "__main__":
+    import click
+    import logging
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    @click.command()
+    @click.argument("ports", nargs=-1, required=True)
+    @click.option("--baud", default=115200, help="Baudrate of every port")
+    @click.option("--binary", is_flag=True, help="Read the binary frame protocol (BINARY_OUTPUT in the sketch)")
+    @click.option("--rate", default=500.0, help="Output frame rate in Hz")
+    @click.option("--seconds", default=10.0, help="How long to acquire")
+    def main(ports, baud, binary, rate, seconds):
+        async def run():
+            async with AsyncAcquisition(ports, baud, "binary" if binary else "text", rate, logger=logger) as acq:
+                t_end = time.monotonic() + seconds
+                cpu0 = time.process_time()
+                n_frames = 0
+                while time.monotonic() < t_end:
+                    try:
+                        frame = await asyncio.wait_for(acq.__anext__(), timeout=t_end - time.monotonic())
+                    except asyncio.TimeoutError:
+                        break
+                    n_frames += 1
+                    if n_frames % int(rate) == 0:
+                        logger.info(f"t={frame.time:.3f} s strength per port: {np.round(frame.values[:, 3], 3)}")
+                cpu = time.process_time() - cpu0
+                logger.info(f"{n_frames} frames from {len(ports)} ports, CPU {100 * cpu / seconds:.1f}%")
+
+        asyncio.run(run())
+
+    main()
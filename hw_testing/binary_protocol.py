@@ -0,0 +1,193 @@
+"""
+Compact binary framing for the TLV493D magnetometer stream.
+
+Every sample is one fixed-size little-endian frame sent by magnetometer_reader.ino
+when BINARY_OUTPUT is enabled:
+
+    offset  type     field
+    0       uint16   sync word (0xA55A)
+    2       uint16   sequence counter (wraps at 65536)
+    4       uint32   device timestamp in microseconds
+    8       float32  x, y, z, strength (mT), temperature (°C)
+    28      uint16   CRC-16/CCITT-FALSE over bytes 0..27
+
+Frames are decoded in batches with np.frombuffer; samples come out in the same
+(timestamp_s, x, y, z, strength, temp) layout as the text protocol's parse_data.
+"""
+import numpy as np
+
+
+SYNC_WORD = 0xA55A
+FRAME_DTYPE = np.dtype([
+    ('sync', '<u2'),
+    ('seq', '<u2'),
+    ('timestamp_us', '<u4'),
+    ('x', '<f4'),
+    ('y', '<f4'),
+    ('z', '<f4'),
+    ('strength', '<f4'),
+    ('temp', '<f4'),
+    ('crc', '<u2'),
+])
+FRAME_SIZE = FRAME_DTYPE.itemsize
+_SYNC_BYTES = (SYNC_WORD & 0xFF, SYNC_WORD >> 8)
+
+
+def _make_crc_table(poly=0x1021):
+    table = np.zeros(256, dtype=np.uint16)
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) if crc & 0x8000 else (crc << 1)
+        table[byte] = crc & 0xFFFF
+    return table
+
+
+_CRC_TABLE = _make_crc_table()
+
+
+def crc16_ccitt(data):
+    """
+    CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF) of each row of a uint8 array.
+
+    The loop runs over byte positions only, so a whole batch of frames costs
+    one table lookup per byte position.
+
+    Args:
+        data: uint8 array of shape (n_frames, n_bytes) or (n_bytes,)
+
+    Returns:
+        uint16 CRC per row
+    """
+    data = np.atleast_2d(np.asarray(data, dtype=np.uint8))
+    crc = np.full(data.shape[0], 0xFFFF, dtype=np.uint16)
+    for column in data.T:
+        crc = (crc << 8) ^ _CRC_TABLE[((crc >> 8) ^ column) & 0xFF]
+    return crc
+
+
+def encode_frames(seq, timestamp_us, values):
+    """
+    Pack samples into frames, mirroring what the sketch sends.
+
+    Args:
+        seq: Sequence numbers, shape (n,)
+        timestamp_us: Device timestamps in microseconds, shape (n,)
+        values: (n, 5) array of x, y, z, strength, temperature
+
+    Returns:
+        bytes with n frames
+    """
+    values = np.asarray(values, dtype=np.float32).reshape(-1, 5)
+    frames = np.zeros(len(values), dtype=FRAME_DTYPE)
+    frames['sync'] = SYNC_WORD
+    frames['seq'] = np.asarray(seq) & 0xFFFF
+    frames['timestamp_us'] = np.asarray(timestamp_us) & 0xFFFFFFFF
+    for i, name in enumerate(('x', 'y', 'z', 'strength', 'temp')):
+        frames[name] = values[:, i]
+    raw = frames.view(np.uint8).reshape(len(frames), FRAME_SIZE)
+    frames['crc'] = crc16_ccitt(raw[:, :-2])
+    return frames.tobytes()
+
+
+def frames_to_samples(frames):
+    """Convert a structured frame array to an (n, 6) array like parse_data output."""
+    return np.column_stack((
+        frames['timestamp_us'] / 1e6,
+        frames['x'],
+        frames['y'],
+        frames['z'],
+        frames['strength'],
+        frames['temp'],
+    )).astype(float)
+
+
+class FrameDecoder(object):
+    """
+    Incremental decoder for a byte stream of frames.
+
+    Bytes can be fed in arbitrary chunks; incomplete frames are kept until the
+    rest arrives. Corrupted data is skipped by resynchronizing on the sync word.
+
+    Attributes:
+        frames: Number of valid frames decoded
+        crc_errors: Frames with a valid sync word but a bad CRC
+        resyncs: Number of times the decoder had to search for a sync word
+        dropped: Frames missing according to the sequence counter
+    """
+
+    def __init__(self):
+        self.buffer = b""
+        self.last_seq = None
+        self.frames = 0
+        self.crc_errors = 0
+        self.resyncs = 0
+        self.dropped = 0
+
+    def _find_sync(self, raw, start):
+        candidates = np.flatnonzero((raw[start:-1] == _SYNC_BYTES[0]) & (raw[start + 1:] == _SYNC_BYTES[1]))
+        return start + int(candidates[0]) if len(candidates) else None
+
+    def feed(self, data):
+        """
+        Decode every complete frame in the buffered stream.
+
+        Args:
+            data: Newly received bytes
+
+        Returns:
+            (n, 6) float array of timestamp_s, x, y, z, strength, temp
+        """
+        buffer = self.buffer + bytes(data)
+        raw = np.frombuffer(buffer, dtype=np.uint8)
+        pos = 0
+        decoded = []
+
+        # Find the first frame boundary
+        if len(raw) >= 2 and not (raw[0] == _SYNC_BYTES[0] and raw[1] == _SYNC_BYTES[1]):
+            self.resyncs += 1
+            pos = self._find_sync(raw, 0)
+            if pos is None:
+                pos = len(raw) - 1  # The last byte may still start a sync word
+
+        while len(raw) - pos >= FRAME_SIZE:
+            # Interpret everything from here as back-to-back frames in one shot
+            n = (len(raw) - pos) // FRAME_SIZE
+            frames = np.frombuffer(buffer, dtype=FRAME_DTYPE, count=n, offset=pos)
+            frame_bytes = raw[pos:pos + n * FRAME_SIZE].reshape(n, FRAME_SIZE)
+            sync_ok = frames['sync'] == SYNC_WORD
+            valid = sync_ok & (crc16_ccitt(frame_bytes[:, :-2]) == frames['crc'])
+
+            n_good = n if valid.all() else int(np.argmin(valid))
+            decoded.append(frames[:n_good])
+            pos += n_good * FRAME_SIZE
+            if n_good == n:
+                break
+
+            # Bad frame: skip past its first byte and look for the next sync word
+            if sync_ok[n_good]:
+                self.crc_errors += 1
+            self.resyncs += 1
+            next_pos = self._find_sync(raw, pos + 1)
+            if next_pos is None:
+                pos = len(raw) - 1
+                break
+            pos = next_pos
+
+        self.buffer = buffer[pos:]
+        if not decoded:
+            return np.empty((0, 6))
+        frames = np.concatenate(decoded)
+        self._count(frames['seq'])
+        return frames_to_samples(frames)
+
+    def _count(self, seq):
+        if len(seq) == 0:
+            return
+        self.frames += len(seq)
+        seq = seq.astype(np.int64)
+        if self.last_seq is not None:
+            seq = np.concatenate(([self.last_seq], seq))
+        gaps = (np.diff(seq) - 1) % 65536
+        self.dropped += int(np.sum(gaps))
+        self.last_seq = int(seq[-1])
@@ -0,0 +1,273 @@
+"""
+Single producer, multi consumer broadcast of magnetometer samples.
+
+The producer writes every batch once into a preallocated ring; each subscriber has
+its own cursor into that ring and reads whatever it hasn't seen yet as a read-only
+view of the ring (no copy). Adding a consumer costs one cursor instead of another
+queue with a locked put per sample, and the producer takes the lock once per batch.
+
+Each subscriber chooses what happens when it falls a whole ring behind:
+
+    drop_oldest  The producer never waits; the subscriber skips ahead to the oldest
+                 sample still in the ring and counts what it missed (dashboards).
+    block        The producer waits until the subscriber has room, up to the
+                 subscriber's timeout, then drops for it like drop_oldest (loggers).
+                 A subscriber that timed out is marked stalled and treated as
+                 drop_oldest until it reads again, so a stuck or dead consumer costs
+                 the producer one timeout rather than one per publish.
+
+A view returned by read() stays valid until the next read() on that subscription for
+block subscribers. For drop_oldest subscribers it stays valid as long as the producer
+doesn't lap it, so copy (or consume) views promptly and size the ring generously.
+"""
+import threading
+
+import numpy as np
+
+from hw_testing.ring_buffer import SAMPLE_DTYPE
+
+
+POLICIES = ("drop_oldest", "block")
+
+
+class Subscription(object):
+    """
+    One consumer's cursor into a Broadcast.
+
+    Attributes:
+        policy: "drop_oldest" or "block"
+        dropped: Samples this subscriber missed because it fell behind
+        stalled: A block subscriber that timed out and hasn't read since
+        stalls: Number of times the producer gave up waiting for this subscriber
+    """
+
+    def __init__(self, bus, policy, position, timeout=None, name=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unsupported policy: {policy}, expected one of {POLICIES}")
+        self.bus = bus
+        self.policy = policy
+        self.timeout = timeout
+        self.name = name
+        self.position = position  # Index of the first sample not released yet
+        self.pending = 0          # Samples handed out by the last read, released by the next
+        self.dropped = 0
+        self.stalled = False
+        self.stalls = 0
+
+    @property
+    def lag(self):
+        """Samples published but not read yet, including any the producer already overwrote."""
+        return self.bus.written - self.position - self.pending
+
+    def read(self, max_samples=None, timeout=0.0):
+        """
+        Next batch of unread samples, releasing the previous batch.
+
+        Batches end at the physical end of the ring, so a drain loop should call read
+        until it returns an empty array.
+
+        Args:
+            max_samples: Largest batch to return
+            timeout: Seconds to wait for data when there is none, None waits forever
+
+        Returns:
+            Read-only structured array view into the ring (possibly empty)
+        """
+        return self.bus._read(self, max_samples, timeout)
+
+    def unsubscribe(self):
+        self.bus.unsubscribe(self)
+
+
+class Broadcast(object):
+    """
+    Preallocated ring broadcasting sample batches to any number of subscribers.
+
+    Usage:
+
+        bus = Broadcast()
+        plot_subscription = bus.subscribe("drop_oldest")
+        log_subscription = bus.subscribe("block", timeout=1.0)
+
+        bus.publish(samples)          # Producer thread, (n, 6) array or list of tuples
+        batch = plot_subscription.read()
+    """
+
+    def __init__(self, capacity=1 << 16, dtype=SAMPLE_DTYPE):
+        """
+        Args:
+            capacity: Samples held in the ring
+            dtype: Structured sample dtype with float64 fields only
+        """
+        self.capacity = int(capacity)
+        self.dtype = np.dtype(dtype)
+        self._data = np.zeros(self.capacity, dtype=self.dtype)
+        # Same memory as rows of floats, so (n, n_fields) batches are written with one slice copy
+        self._rows = self._data.view(np.float64).reshape(self.capacity, len(self.dtype.names))
+        self.written = 0   # Samples published since creation
+        self.reserved = 0  # End of the chunk being copied in, readers never get slots before it laps
+        self.closed = False
+        self.subscriptions = []
+        self._condition = threading.Condition()
+
+    def subscribe(self, policy="drop_oldest", timeout=None, name=None):
+        """
+        Add a consumer. It receives every sample published from now on.
+
+        Args:
+            policy: "drop_oldest" or "block"
+            timeout: For "block", longest the producer waits for this subscriber
+                (None waits forever)
+            name: Optional label for logs
+
+        Returns:
+            Subscription
+        """
+        with self._condition:
+            subscription = Subscription(self, policy, self.written, timeout, name)
+            self.subscriptions.append(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._condition:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+            self._condition.notify_all()
+
+    def close(self):
+        """Wake every waiting reader and writer; reads return what is left, then empty batches."""
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def publish(self, samples):
+        """
+        Write a batch of samples once for all subscribers.
+
+        Args:
+            samples: Structured array with this bus's dtype, or an (n, n_fields)
+                array / list of tuples in field order
+        """
+        structured = isinstance(samples, np.ndarray) and samples.dtype == self.dtype
+        if not structured:
+            samples = np.asarray(samples, dtype=np.float64).reshape(-1, len(self.dtype.names))
+        # Larger batches go out in ring-sized chunks so blocking subscribers can keep up
+        for start in range(0, len(samples), self.capacity):
+            self._publish_chunk(samples[start:start + self.capacity], structured)
+
+    def _publish_chunk(self, samples, structured):
+        n = len(samples)
+        with self._condition:
+            self._wait_for_room(n)
+            first = self.written
+            self.reserved = first + n
+        # Readers are clamped to reserved - capacity and never get slots past `written`,
+        # so nobody holds a view of the slots being copied and the copy needs no lock
+        target = self._data if structured else self._rows
+        start = first % self.capacity
+        head = min(n, self.capacity - start)
+        target[start:start + head] = samples[:head]
+        target[:n - head] = samples[head:]
+        with self._condition:
+            self.written = first + n
+            self._condition.notify_all()
+
+    def _wait_for_room(self, n):
+        # Writing up to index written + n overwrites everything before written + n - capacity
+        for subscription in list(self.subscriptions):
+            if subscription.policy != "block" or subscription.stalled:
+                continue
+            fits = lambda: (self.written + n - subscription.position <= self.capacity
+                            or self.closed or subscription not in self.subscriptions)
+            if not self._condition.wait_for(fits, subscription.timeout):
+                # Give up on this subscriber, it loses the oldest samples and is dropped
+                # for like drop_oldest until it reads again
+                skip = self.written + n - self.capacity - subscription.position
+                subscription.position += skip
+                subscription.pending = max(0, subscription.pending - skip)
+                subscription.dropped += skip
+                subscription.stalled = True
+                subscription.stalls += 1
+
+    def _read(self, subscription, max_samples, timeout):
+        with self._condition:
+            # Reading again, a stalled block subscriber gets waited for again
+            subscription.stalled = False
+            # Release the previous batch, a blocked producer may now have room
+            if subscription.pending:
+                subscription.position += subscription.pending
+                subscription.pending = 0
+                self._condition.notify_all()
+
+            if self.written == subscription.position and not self.closed and timeout != 0:
+                self._condition.wait_for(lambda: self.written > subscription.position or self.closed, timeout)
+
+            # Slots before reserved - capacity are being (or have been) overwritten
+            oldest = self.reserved - self.capacity
+            if subscription.position < oldest:
+                subscription.dropped += oldest - subscription.position
+                subscription.position = oldest
+
+            available = self.written - subscription.position
+            start = subscription.position % self.capacity
+            # Contiguous views only, a batch stops at the end of the ring
+            n = min(available, self.capacity - start)
+            if max_samples is not None:
+                n = min(n, int(max_samples))
+            subscription.pending = n
+
+        view = self._data[start:start + n]
+        view.flags.writeable = False
+        return view
+
+
+if __name__ == "__main__":
+    import time
+    from queue import Queue, Empty
+
+    # Fan out 200k samples in batches of 20 (a 1 kHz reader wakes every ~20 ms)
+    # to 3 consumers, versus one queue per consumer with a put per sample
+    n_samples, batch_size, n_consumers = 200_000, 20, 3
+    samples = np.random.default_rng(0).normal(size=(n_samples, len(SAMPLE_DTYPE.names)))
+    batches = [samples[i:i + batch_size] for i in range(0, n_samples, batch_size)]
+
+    queues = [Queue() for _ in range(n_consumers)]
+    t0 = time.perf_counter()
+    for batch in batches:
+        for sample in map(tuple, batch.tolist()):
+            for queue in queues:
+                queue.put(sample)
+    t_put = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for queue in queues:
+        drained = []
+        while True:
+            try:
+                drained.append(queue.get_nowait())
+            except Empty:
+                break
+        np.asarray(drained)
+    t_get = time.perf_counter() - t0
+    print(f"Queues:    publish {t_put:.3f} s, consume {t_get:.3f} s")
+
+    bus = Broadcast(capacity=1 << 18)
+    subscriptions = [bus.subscribe("block") for _ in range(n_consumers)]
+    t0 = time.perf_counter()
+    for batch in batches:
+        bus.publish(batch)
+    t_put = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    received = 0
+    for subscription in subscriptions:
+        while len(view := subscription.read()):
+            received += len(view)
+    t_get = time.perf_counter() - t0
+    print(f"Broadcast: publish {t_put:.3f} s, consume {t_get:.3f} s ({received} samples read)")
+
+    # A consumer that can't keep up: drop_oldest never stalls the producer, block does
+    bus = Broadcast(capacity=1000)
+    slow = bus.subscribe("drop_oldest")
+    for batch in batches[:200]:
+        bus.publish(batch)
+    print(f"drop_oldest subscriber behind by 4000 samples in a 1000 ring: read {len(slow.read())}, "
+          f"dropped {slow.dropped}")
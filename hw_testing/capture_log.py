@@ -0,0 +1,357 @@
+"""
+Chunked columnar capture log for magnetometer samples.
+
+A capture is a directory of fixed-size segments plus an index:
+
+    index.csv          one line per segment: file, n_samples, t_start, t_end
+    seg_000000.npz     one array per SAMPLE_DTYPE field, deflate compressed
+    seg_000001.npz     ...
+
+Samples are buffered in a preallocated segment in memory and a segment file is
+written only once it is full (or on stop), so appends are O(1) and the disk sees one
+sequential write per segment. Before compression every column is byte shuffled
+(byte 0 of all samples, then byte 1, ...), like the HDF5 shuffle filter: sensor
+values and timestamps change slowly, so their high bytes repeat and deflate well.
+
+Reads by time range only open the segments whose [t_start, t_end] overlaps the
+range, found from the index.
+"""
+import os
+import time
+from logging import Logger
+from queue import Empty, Queue
+from threading import Thread
+from typing import Union
+
+import numpy as np
+from numpy.lib.recfunctions import unstructured_to_structured
+
+from hw_testing.broadcast import Subscription
+from hw_testing.ring_buffer import SAMPLE_DTYPE
+
+
+INDEX_FILE = 'index.csv'
+INDEX_HEADER = 'file,n_samples,t_start,t_end\n'
+
+
+def _shuffle(column):
+    """Byte shuffle a 1D array: (n,) of itemsize k -> (k, n) uint8."""
+    column = np.ascontiguousarray(column)  # Fields of a structured array are strided
+    return np.ascontiguousarray(column.view(np.uint8).reshape(-1, column.itemsize).T)
+
+
+def _unshuffle(shuffled, dtype):
+    return np.ascontiguousarray(shuffled.T).view(dtype).ravel()
+
+
+def write_segment(path, samples, compress=True):
+    """
+    Write one segment file atomically (temporary file, then rename).
+
+    Args:
+        path: Segment file path (.npz)
+        samples: Structured array with SAMPLE_DTYPE
+        compress: Deflate the shuffled columns
+    """
+    save = np.savez_compressed if compress else np.savez
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        save(f, **{name: _shuffle(samples[name]) for name in samples.dtype.names})
+    os.replace(tmp_path, path)
+
+
+def read_segment(path, dtype=SAMPLE_DTYPE):
+    """Read a segment written by write_segment into a structured array."""
+    with np.load(path) as data:
+        columns = {name: _unshuffle(data[name], dtype[name]) for name in dtype.names}
+    samples = np.empty(len(columns[dtype.names[0]]), dtype=dtype)
+    for name, column in columns.items():
+        samples[name] = column
+    return samples
+
+
+class CaptureWriter(object):
+    """
+    Append samples to a capture directory.
+
+    Usage:
+
+        writer = CaptureWriter('logs/captures/run1')
+        writer.extend(batch)   # (n, 6) array / list of parse_data tuples
+        writer.close()         # Writes the last, partial segment
+    """
+
+    def __init__(self, directory, segment_samples=60_000, compress=True, dtype=SAMPLE_DTYPE):
+        """
+        Args:
+            directory: Capture directory, created if missing; appends to an existing capture
+            segment_samples: Samples per segment, one minute at 1 kHz by default
+            compress: Deflate segments
+            dtype: Structured sample dtype
+        """
+        self.directory = directory
+        self.segment_samples = int(segment_samples)
+        self.compress = compress
+        self.dtype = np.dtype(dtype)
+        os.makedirs(directory, exist_ok=True)
+
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        if not os.path.exists(self.index_path):
+            with open(self.index_path, 'w') as f:
+                f.write(INDEX_HEADER)
+        self.n_segments = len(read_index(directory))
+
+        self._segment = np.empty(self.segment_samples, dtype=self.dtype)
+        self._fill = 0
+        self.total = 0           # Samples appended since creation
+        self.bytes_written = 0   # Segment bytes on disk since creation
+
+    def extend(self, samples):
+        """
+        Append a batch of samples.
+
+        Args:
+            samples: Structured array with this writer's dtype, or an (n, n_fields)
+                array / list of tuples in field order
+        """
+        if not (isinstance(samples, np.ndarray) and samples.dtype == self.dtype):
+            samples = unstructured_to_structured(
+                np.asarray(samples, dtype=float).reshape(-1, len(self.dtype.names)), dtype=self.dtype
+            )
+        while len(samples):
+            n = min(len(samples), self.segment_samples - self._fill)
+            self._segment[self._fill:self._fill + n] = samples[:n]
+            self._fill += n
+            self.total += n
+            samples = samples[n:]
+            if self._fill == self.segment_samples:
+                self.flush()
+
+    def flush(self):
+        """Write the buffered samples as a segment, even if it isn't full."""
+        if self._fill == 0:
+            return
+        samples = self._segment[:self._fill]
+        name = f"seg_{self.n_segments:06d}.npz"
+        path = os.path.join(self.directory, name)
+        write_segment(path, samples, self.compress)
+        self.bytes_written += os.path.getsize(path)
+
+        # The index line goes in after the segment exists, so readers never see a missing file
+        times = samples['time']
+        with open(self.index_path, 'a') as f:
+            f.write(f"{name},{len(samples)},{float(times.min())!r},{float(times.max())!r}\n")
+        self.n_segments += 1
+        self._fill = 0
+
+    def close(self):
+        self.flush()
+
+
+def read_index(directory):
+    """
+    Read a capture index.
+
+    Returns:
+        Structured array with fields file, n_samples, t_start, t_end, one row per segment
+    """
+    dtype = [('file', 'U32'), ('n_samples', 'i8'), ('t_start', 'f8'), ('t_end', 'f8')]
+    rows = []
+    with open(os.path.join(directory, INDEX_FILE)) as f:
+        next(f)  # Header
+        for line in f:
+            name, n_samples, t_start, t_end = line.strip().split(',')
+            rows.append((name, int(n_samples), float(t_start), float(t_end)))
+    return np.array(rows, dtype=dtype)
+
+
+class CaptureReader(object):
+    """
+    Random access reads from a capture directory by time range.
+
+    The index is re-read on every query, so a capture that is still being written
+    can be read; only completed segments are visible.
+    """
+
+    def __init__(self, directory, dtype=SAMPLE_DTYPE):
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def index(self):
+        return read_index(self.directory)
+
+    def __len__(self):
+        return int(self.index['n_samples'].sum())
+
+    @property
+    def time_range(self):
+        """(first, last) sample time, or None for an empty capture."""
+        index = self.index
+        if len(index) == 0:
+            return None
+        return float(index['t_start'].min()), float(index['t_end'].max())
+
+    def iter_segments(self, t_start=None, t_end=None):
+        """
+        Yield the samples of every segment overlapping [t_start, t_end], one segment
+        at a time, trimmed to the range. Keeps memory bounded for long captures.
+
+        Args:
+            t_start, t_end: Time range in seconds (device clock); None for open ends
+
+        Yields:
+            Structured arrays with SAMPLE_DTYPE fields
+        """
+        t_start = -np.inf if t_start is None else t_start
+        t_end = np.inf if t_end is None else t_end
+        index = self.index
+        overlapping = index[(index['t_end'] >= t_start) & (index['t_start'] <= t_end)]
+
+        for name in overlapping['file']:
+            samples = read_segment(os.path.join(self.directory, name), self.dtype)
+            times = samples['time']
+            if times[0] >= t_start and times[-1] <= t_end:
+                yield samples
+            else:
+                yield samples[(times >= t_start) & (times <= t_end)]
+
+    def read(self, t_start=None, t_end=None):
+        """
+        Samples with t_start <= time <= t_end, in capture order.
+
+        Args:
+            t_start, t_end: Time range in seconds (device clock); None for open ends
+
+        Returns:
+            Structured array with SAMPLE_DTYPE fields
+        """
+        parts = list(self.iter_segments(t_start, t_end))
+        if not parts:
+            return np.empty(0, dtype=self.dtype)
+        return np.concatenate(parts)
+
+
+class LogHandler(Thread):
+    """
+    Thread draining log_data_queue (or a broadcast Subscription) into a CaptureWriter.
+
+    The thread sleeps, then takes everything that has queued up in one batch, so it
+    wakes at most every poll_interval and costs almost nothing between segment writes.
+    Batches read from a Subscription go straight from the bus into the segment buffer.
+    """
+
+    def __init__(self, logger: Logger, log_data_queue: Union[Queue, Subscription], directory=None, segment_samples=60_000,
+                 compress=True, poll_interval=0.1, max_batch=100_000):
+        """
+        Args:
+            logger: Logger
+            log_data_queue: Queue of parse_data tuples, see MagnetometerReader, or a
+                Subscription to the reader's Broadcast (use the "block" policy)
+            directory: Capture directory, defaults to logs/captures/<start time>
+            segment_samples: Samples per segment file
+            compress: Deflate segments
+            poll_interval: Seconds between queue drains
+            max_batch: Maximum samples taken from the queue per drain
+        """
+        super().__init__(daemon=True)
+        if directory is None:
+            directory = os.path.join('logs', 'captures', time.strftime('%Y%m%d_%H%M%S'))
+        self.logger = logger
+        self.log_data_queue = log_data_queue
+        self.writer = CaptureWriter(directory, segment_samples, compress)
+        self.poll_interval = poll_interval
+        self.max_batch = max_batch
+        self.running = True
+        self._dropped = 0
+        logger.info(f"Logging captures to {directory}")
+
+    def run(self):
+        """Main thread loop"""
+        while self.running:
+            time.sleep(self.poll_interval)
+            try:
+                self._drain()
+            except Exception as e:
+                # Stop logging rather than leave a dead subscription the reader keeps waiting for
+                self.logger.error(f"Capture logging failed, no more samples will be logged: {e}")
+                self.running = False
+                self._unsubscribe()
+
+    def _unsubscribe(self):
+        if isinstance(self.log_data_queue, Subscription):
+            self.log_data_queue.unsubscribe()
+
+    def _drain(self):
+        if isinstance(self.log_data_queue, Subscription):
+            taken = 0
+            while taken < self.max_batch:
+                samples = self.log_data_queue.read(self.max_batch - taken)
+                if not len(samples):
+                    break
+                self.writer.extend(samples)
+                taken += len(samples)
+            dropped = self.log_data_queue.dropped
+            if dropped != self._dropped:
+                self.logger.warning(f"Capture is missing {dropped - self._dropped} samples, "
+                                    f"the logger fell behind ({dropped} so far)")
+                self._dropped = dropped
+            return
+
+        batch = []
+        while len(batch) < self.max_batch:
+            try:
+                sample = self.log_data_queue.get_nowait()
+            except Empty:
+                break
+            if sample is not None:
+                batch.append(sample)
+        if batch:
+            self.writer.extend(batch)
+
+    def stop(self):
+        """Stop the thread, write whatever is still queued and the partial segment"""
+        self.logger.info("Stopping capture logger...")
+        self.running = False
+        # No timeout: the loop exits within poll_interval plus one drain, and draining or
+        # closing while the thread is still writing would have two threads on one segment
+        self.join()
+        try:
+            self._drain()
+        finally:
+            self._unsubscribe()
+            self.writer.close()
+        self.logger.info(
+            f"Logged {self.writer.total} samples in {self.writer.n_segments} segments "
+            f"({self.writer.bytes_written / 1e6:.2f} MB) to {self.writer.directory}"
+        )
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    # One minute of a 1 kHz capture at TLV493D resolution (0.098 mT LSB)
+    n = 60_000
+    rng = np.random.default_rng(0)
+    t = np.arange(n) * 1e-3
+    lsb = 0.098
+    x, y, z = (np.round((5 * np.sin(2 * np.pi * f * t) + rng.normal(scale=0.1, size=n)) / lsb) * lsb
+               for f in (0.5, 0.7, 1.1))
+    samples = np.column_stack((t, x, y, z, np.sqrt(x**2 + y**2 + z**2), np.full(n, 24.5)))
+
+    directory = tempfile.mkdtemp()
+    t0 = time.perf_counter()
+    cpu0 = time.process_time()
+    writer = CaptureWriter(directory, segment_samples=10_000)
+    for batch in np.array_split(samples, n // 100):  # 100 samples per drain, as at 1 kHz
+        writer.extend(batch)
+    writer.close()
+    print(f"Wrote {n} samples in {(time.perf_counter()-t0)*1e3:.0f} ms "
+          f"({time.process_time()-cpu0:.3f} s CPU): {writer.bytes_written / 1e6:.2f} MB "
+          f"vs {n * SAMPLE_DTYPE.itemsize / 1e6:.2f} MB raw")
+
+    reader = CaptureReader(directory)
+    t0 = time.perf_counter()
+    window = reader.read(30.0, 30.5)
+    print(f"Read {len(window)} samples from {reader.time_range} in {(time.perf_counter()-t0)*1e3:.1f} ms")
+    assert np.array_equal(window['x'], samples[30_000:30_501, 1])
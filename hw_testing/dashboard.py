@@ -0,0 +1,216 @@
+"""
+Blitted live dashboard for the TLV493D magnetometer.
+
+All artists are created once and only their data changes per frame, so with
+FuncAnimation(blit=True) a frame redraws just the lines instead of the whole
+figure. Axis limits grow only when data leaves the current bounds; only then is a
+full redraw requested with draw_idle, so the frame callback never waits for it, and
+the blit backgrounds are grabbed again after that draw. Time series are drawn
+relative to the newest sample so scrolling never rescales.
+"""
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.animation import FuncAnimation
+
+
+def _expand_limits(get_lim, set_lim, lo, hi, margin_lo=0.25, margin_hi=0.25):
+    """
+    Grow an axis range if [lo, hi] no longer fits. Returns True if limits changed.
+
+    The margins (as a fraction of the data span) leave headroom so slowly growing
+    data doesn't trigger a full redraw every frame.
+    """
+    if not (np.isfinite(lo) and np.isfinite(hi)):
+        return False
+    cur_lo, cur_hi = get_lim()
+    if lo >= cur_lo and hi <= cur_hi:
+        return False
+    # Keep a sensible range for (nearly) constant signals
+    span = max(hi - lo, 0.05 * max(abs(lo), abs(hi)), 1e-6)
+    set_lim(lo - margin_lo * span, hi + margin_hi * span)
+    return True
+
+
+class MagnetometerDashboard(object):
+    """
+    Four panel dashboard: field vector (3D), field strength, XYZ components and
+    either the spectrum of the components ("fft") or the temperature ("temperature").
+    """
+
+    def __init__(self, fourth_panel="fft"):
+        if fourth_panel not in ("fft", "temperature"):
+            raise ValueError(f"Unsupported panel: {fourth_panel}")
+        self.fourth_panel = fourth_panel
+        self.fig, self.axes = setup_plot(fourth_panel)
+        ax1, ax2, ax3, ax4 = self.axes
+
+        # Field vector as a line from the origin plus a marker at the tip
+        (self.vector_line,) = ax1.plot([0, 0], [0, 0], [0, 0], "r-", linewidth=2)
+        (self.vector_tip,) = ax1.plot([0], [0], [0], "ro")
+        self.vector_limit = 0.1
+        for set_lim in (ax1.set_xlim, ax1.set_ylim, ax1.set_zlim):
+            set_lim([-self.vector_limit, self.vector_limit])
+
+        (self.strength_line,) = ax2.plot([], [], "g-")
+
+        (self.x_line,) = ax3.plot([], [], "r-", label="X")
+        (self.y_line,) = ax3.plot([], [], "g-", label="Y")
+        (self.z_line,) = ax3.plot([], [], "b-", label="Z")
+        ax3.legend(loc="upper left")
+
+        if fourth_panel == "fft":
+            (self.fft_x_line,) = ax4.plot([], [], "r-", label="X")
+            (self.fft_y_line,) = ax4.plot([], [], "g-", label="Y")
+            (self.fft_z_line,) = ax4.plot([], [], "b-", label="Z")
+            ax4.legend(loc="upper right")
+            ax4.grid(True)
+            # Sampling rate lives inside the axes so it is covered by the blit region
+            self.fs_text = ax4.text(0.02, 0.95, "", transform=ax4.transAxes, va="top")
+        else:
+            (self.temp_line,) = ax4.plot([], [], "m-")
+
+        for ax in (ax2, ax3, ax4):
+            ax.set_xlim(-0.1, 0)
+            ax.set_ylim(-0.1, 0.1)
+
+        plt.tight_layout()
+        self.animation = None
+        # Every full draw (rescale, resize) makes the animation's blit backgrounds stale
+        self.fig.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _on_draw(self, event):
+        if self.animation is not None:
+            # FuncAnimation grabs a fresh background for every axes on its next frame
+            self.animation._blit_cache.clear()
+
+    @property
+    def artists(self):
+        artists = [self.vector_line, self.vector_tip, self.strength_line, self.x_line, self.y_line, self.z_line]
+        if self.fourth_panel == "fft":
+            artists += [self.fft_x_line, self.fft_y_line, self.fft_z_line, self.fs_text]
+        else:
+            artists.append(self.temp_line)
+        return artists
+
+    def update(self, time_s, x, y, z, strength, temp):
+        """
+        Push the current plot window into the artists.
+
+        Args:
+            time_s, x, y, z, strength, temp: 1D arrays for the samples to display
+
+        Returns:
+            List of artists that changed, for FuncAnimation(blit=True)
+        """
+        if len(time_s) == 0:
+            return self.artists
+        ax1, ax2, ax3, ax4 = self.axes
+        rescaled = False
+
+        # Field vector
+        self.vector_line.set_data_3d([0, x[-1]], [0, y[-1]], [0, z[-1]])
+        self.vector_tip.set_data_3d([x[-1]], [y[-1]], [z[-1]])
+        max_val = max(abs(x[-1]), abs(y[-1]), abs(z[-1]))
+        if max_val > self.vector_limit:
+            self.vector_limit = 1.5 * max_val
+            for set_lim in (ax1.set_xlim, ax1.set_ylim, ax1.set_zlim):
+                set_lim([-self.vector_limit, self.vector_limit])
+            rescaled = True
+
+        # Time series are plotted relative to the newest sample, so the time axis
+        # stays put while the window scrolls
+        rel_time = time_s - time_s[-1]
+        t_lo = rel_time[0]
+        self.strength_line.set_data(rel_time, strength)
+        self.x_line.set_data(rel_time, x)
+        self.y_line.set_data(rel_time, y)
+        self.z_line.set_data(rel_time, z)
+        for ax, values in ((ax2, (strength,)), (ax3, (x, y, z))):
+            rescaled |= _expand_limits(ax.get_xlim, ax.set_xlim, t_lo, 0, 0.5, 0.0)
+            rescaled |= _expand_limits(ax.get_ylim, ax.set_ylim,
+                                       min(np.min(v) for v in values), max(np.max(v) for v in values))
+
+        if self.fourth_panel == "fft":
+            n = len(time_s)
+            if n > 1:
+                dt = np.mean(np.diff(time_s))
+                fs = 1 / dt  # Sampling frequency
+                freq = np.fft.rfftfreq(n, dt)
+                # Magnitude of the spectrum for each component, one FFT call for all three
+                spectra = np.abs(np.fft.rfft(np.vstack((x, y, z)), axis=1))
+                self.fft_x_line.set_data(freq, spectra[0])
+                self.fft_y_line.set_data(freq, spectra[1])
+                self.fft_z_line.set_data(freq, spectra[2])
+                self.fs_text.set_text(f"fs={fs:.2f} Hz")
+                rescaled |= _expand_limits(ax4.get_xlim, ax4.set_xlim, 0, freq[-1], 0.0, 0.05)
+                rescaled |= _expand_limits(ax4.get_ylim, ax4.set_ylim, 0, np.max(spectra), 0.0, 0.5)
+        else:
+            self.temp_line.set_data(rel_time, temp)
+            rescaled |= _expand_limits(ax4.get_xlim, ax4.set_xlim, t_lo, 0, 0.5, 0.0)
+            rescaled |= _expand_limits(ax4.get_ylim, ax4.set_ylim, np.min(temp), np.max(temp))
+
+        if rescaled:
+            # New limits: redraw everything (ticks) once the GUI is idle instead of from
+            # inside this frame, _on_draw then has the backgrounds grabbed again
+            self.fig.canvas.draw_idle()
+        return self.artists
+
+    def animate(self, frame_func, interval=20):
+        """
+        Start a blitted FuncAnimation.
+
+        Args:
+            frame_func: Called every frame without arguments, returns the artists to redraw
+            interval: Delay between frames in ms
+
+        Returns:
+            The FuncAnimation, keep a reference to it while the figure is shown
+        """
+        self.animation = FuncAnimation(
+            self.fig,
+            lambda frame: frame_func(),
+            init_func=lambda: self.artists,
+            interval=interval,
+            blit=True,
+            cache_frame_data=False,
+        )
+        return self.animation
+
+
+def setup_plot(fourth_panel="fft"):
+    fig = plt.figure(figsize=(15, 10))
+    fig.suptitle("TLV493D Magnetometer Visualization", fontsize=16)
+
+    # 3D vector plot
+    ax1 = fig.add_subplot(2, 2, 1, projection="3d")
+    ax1.set_title("Magnetic Field Vector")
+    ax1.set_xlabel("X (mT)")
+    ax1.set_ylabel("Y (mT)")
+    ax1.set_zlabel("Z (mT)")
+    ax1.set_box_aspect([1, 1, 1])
+
+    # Field strength over time
+    ax2 = fig.add_subplot(2, 2, 2)
+    ax2.set_title("Field Strength Over Time")
+    ax2.set_xlabel("Time relative to latest sample (s)")
+    ax2.set_ylabel("Field Strength (mT)")
+
+    # XYZ field strength
+    ax3 = fig.add_subplot(2, 2, 3)
+    ax3.set_title("Field Components Over Time")
+    ax3.set_xlabel("Time relative to latest sample (s)")
+    ax3.set_ylabel("Field (mT)")
+
+    ax4 = fig.add_subplot(2, 2, 4)
+    if fourth_panel == "fft":
+        # Frequency domain
+        ax4.set_title("Freq Domain")
+        ax4.set_xlabel("Frequency (Hz)")
+        ax4.set_ylabel("Magnitude")
+    else:
+        # Temperature
+        ax4.set_title("Temperature Over Time")
+        ax4.set_xlabel("Time relative to latest sample (s)")
+        ax4.set_ylabel("Temperature (°C)")
+
+    return fig, (ax1, ax2, ax3, ax4)
@@ -1,19 +1,35 @@
+import re
 import serial as serials
 from logging import Logger
 from threading import Thread
 import time
+import warnings
 from queue import Queue
 import numpy as np
 
+from hw_testing.binary_protocol import FrameDecoder
+from hw_testing.broadcast import Broadcast
+
 
 class MagnetometerReader(Thread):
-    def __init__(self, port, baudrate, logger: Logger, plot_data_queue: Queue, log_data_queue: Queue):
+    def __init__(self, port, baudrate, logger: Logger, plot_data_queue: Queue = None, log_data_queue: Queue = None,
+                 protocol="text", bus: Broadcast = None):
+        """
+        Samples go to `bus` when given (every consumer subscribes to it), otherwise to
+        plot_data_queue and log_data_queue as parse_data tuples.
+        """
         super().__init__()
+        if protocol not in ("text", "binary"):
+            raise ValueError(f"Unsupported protocol: {protocol}")
+        if bus is None and plot_data_queue is None:
+            raise ValueError("Either bus or plot_data_queue is required")
         self.port = port
         self.baudrate = baudrate
+        self.protocol = protocol
         self.logger = logger
         self.plot_data_queue = plot_data_queue
         self.log_data_queue = log_data_queue
+        self.bus = bus
 
         self.logger.info(f"Attempting to connect to {port} at {baudrate} baud...")
         self.ser = serials.Serial(port, baudrate, timeout=0)  # Non-blocking reads
@@ -23,33 +39,64 @@ class MagnetometerReader(Thread):
         self.ser.reset_input_buffer()
         logger.info(f"Initialized MagnetometerReader on {port} with baudrate {baudrate}")
 
+        self._line_decoder = LineDecoder()  # Keeps the partial line between reads
         self.running = True
 
     def run(self):
         """Main thread loop"""
-        buffer = ""
+        if self.protocol == "binary":
+            self._run_binary()
+        else:
+            self._run_text()
+
+    def _run_text(self):
+        """Read the CSV text protocol, one line per sample"""
         while self.running:
             if self.ser.in_waiting:
                 # Read all available bytes
-                data = self.ser.read(self.ser.in_waiting).decode('utf-8')
-                buffer += data
-                
-                # Process complete lines
-                while '\n' in buffer:
-                    line, buffer = buffer.split('\n', 1)
-                    line = line.strip()
-                    
-                    # Skip header lines
-                    if any(line.startswith(x) for x in ["TLV493D", "Format:", "---"]):
-                        continue
-                    
-                    try:
-                        parsed_data = parse_data(line)
-                        if not any(np.isnan(x) for x in parsed_data):
-                            self.plot_data_queue.put(parsed_data)
-                            self.log_data_queue.put(parsed_data)
-                    except Exception as e:
-                        self.logger.error(f"Error processing line: {e}")
+                self._process_text(self.ser.read(self.ser.in_waiting))
+            else:
+                # Small sleep to prevent CPU spinning
+                time.sleep(0.001)  # 1ms sleep when no data
+
+    def _process_text(self, data):
+        """Parse every complete line received so far in one go and publish the samples as a batch"""
+        bad_lines = self._line_decoder.bad_lines
+        samples = self._line_decoder.feed(data)
+        if len(samples):
+            self._publish(samples)
+        if self._line_decoder.bad_lines != bad_lines:
+            self.logger.warning(
+                f"Skipped {self._line_decoder.bad_lines - bad_lines} unparseable lines "
+                f"({self._line_decoder.bad_lines} so far)"
+            )
+
+    def _publish(self, samples):
+        """Hand one read's (n, 6) samples to the consumers, as a single batch when there is a bus"""
+        if self.bus is not None:
+            self.bus.publish(samples)
+            return
+        for parsed_data in map(tuple, samples.tolist()):
+            self.plot_data_queue.put(parsed_data)
+            if self.log_data_queue is not None:
+                self.log_data_queue.put(parsed_data)
+
+    def _run_binary(self):
+        """Read the binary frame protocol, decoding whole batches of frames at once"""
+        decoder = FrameDecoder()
+        dropped = 0
+        while self.running:
+            if self.ser.in_waiting:
+                samples = decoder.feed(self.ser.read(self.ser.in_waiting))
+                if len(samples):
+                    self._publish(samples)
+
+                if decoder.dropped != dropped:
+                    self.logger.warning(
+                        f"Dropped {decoder.dropped - dropped} frames "
+                        f"({decoder.crc_errors} CRC errors, {decoder.resyncs} resyncs so far)"
+                    )
+                    dropped = decoder.dropped
             else:
                 # Small sleep to prevent CPU spinning
                 time.sleep(0.001)  # 1ms sleep when no data
@@ -64,6 +111,146 @@ class MagnetometerReader(Thread):
             self.logger.info("Closed serial connection")
 
 
+class LineDecoder(object):
+    """
+    Incremental decoder for the CSV text protocol, the text counterpart of FrameDecoder.
+
+    Bytes can be fed in arbitrary chunks; a partial last line is kept until the rest
+    arrives. Header lines and lines that fail to parse are skipped. All complete lines
+    of a chunk are parsed together by parse_lines, so a backlog of thousands of lines
+    after a USB stall costs one NumPy call rather than a Python loop per line.
+
+    Attributes:
+        lines: Number of samples decoded
+        bad_lines: Lines that could not be parsed
+    """
+
+    HEADER_PREFIXES = ("TLV493D", "Format:", "---")
+
+    def __init__(self):
+        self.buffer = ""
+        self.lines = 0
+        self.bad_lines = 0
+
+    def feed(self, data):
+        """
+        Decode every complete line in the buffered stream.
+
+        Args:
+            data: Newly received bytes
+
+        Returns:
+            (n, 6) float array of timestamp_s, x, y, z, strength, temp
+        """
+        samples, bad_lines = parse_lines(self.split(data))
+        self.count(len(samples), bad_lines)
+        return samples
+
+    def split(self, data):
+        """
+        Buffer newly received bytes and take the complete data lines, without parsing.
+
+        Lets a caller parse the lines of several decoders in one parse_lines call, see
+        async_acquisition; report the outcome back with count().
+
+        Returns:
+            List of lines, header and blank lines removed
+        """
+        self.buffer += bytes(data).decode('utf-8', errors='replace')
+        if '\n' not in self.buffer:
+            return []
+        *lines, self.buffer = self.buffer.split('\n')
+        return [line for line in lines if line.strip() and not line.startswith(self.HEADER_PREFIXES)]
+
+    def count(self, lines, bad_lines):
+        """Add the outcome of parsing lines taken with split() to the counters."""
+        self.lines += lines
+        self.bad_lines += bad_lines
+
+
+# Blocks up to this many lines are parsed line by line: loadtxt has a fixed cost of
+# ~30 us per call, which only pays off for longer blocks
+PER_LINE_MAX_LINES = 16
+# Malformed blocks are bisected down to this size, then parsed line by line
+BISECT_MIN_LINES = 256
+# Six comma separated fields of number characters. Loose on purpose (a stricter number
+# pattern costs 3x as much), it only screens out corrupted bytes before loadtxt
+VALID_LINE = re.compile(r"[-+0-9.eE ]+(?:,[-+0-9.eE ]+){5}\r?")
+
+
+def _parse_line(line):
+    """parse_data without the printing, None for a malformed line"""
+    parts = line.split(",")
+    if len(parts) != 6:
+        return None
+    try:
+        return [float(part) for part in parts]
+    except ValueError:
+        return None
+
+
+def _parse_per_line(lines):
+    rows = [_parse_line(line) for line in lines if line.strip()]
+    parsed = [row for row in rows if row is not None]
+    return np.array(parsed, dtype=float).reshape(-1, 6), len(rows) - len(parsed)
+
+
+def _parse_whole(lines):
+    # All lines in one loadtxt call, ValueError if any of them is malformed.
+    # Returns the rows with the raw microsecond timestamps and the number of malformed lines
+    if len(lines) <= PER_LINE_MAX_LINES:
+        return _parse_per_line(lines)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # loadtxt warns about blocks of blank lines
+        samples = np.loadtxt(lines, delimiter=",", comments=None, ndmin=2)
+    if samples.shape[1] != 6 and len(samples):
+        raise ValueError(f"Expected 6 columns, got {samples.shape[1]}")
+    return samples.reshape(-1, 6), 0
+
+
+def _parse_bisect(lines):
+    # A corrupted line somewhere: bisect so the clean parts still go through loadtxt
+    try:
+        return _parse_whole(lines)
+    except ValueError:
+        if len(lines) <= BISECT_MIN_LINES:
+            return _parse_per_line(lines)
+        middle = len(lines) // 2
+        head, head_bad = _parse_bisect(lines[:middle])
+        tail, tail_bad = _parse_bisect(lines[middle:])
+        return np.concatenate((head, tail)), head_bad + tail_bad
+
+
+def parse_lines(lines):
+    """
+    Parse many CSV lines from the Arduino at once, the batch version of parse_data.
+
+    Args:
+        lines: Data lines (header lines already removed), with or without line endings
+
+    Returns:
+        samples: (n, 6) float array of timestamp_s, x, y, z, strength, temp
+        bad_lines: Number of malformed or NaN lines that were dropped (blank lines are ignored)
+    """
+    if not lines:
+        return np.empty((0, 6)), 0
+    try:
+        samples, bad_lines = _parse_whole(lines)
+    except ValueError:
+        # Drop the corrupted lines with one regex match per line, so loadtxt can take the
+        # rest in one go; bisect in case something odd still gets through the screen
+        screened = [line for line in lines if VALID_LINE.fullmatch(line)]
+        bad_lines = sum(1 for line in lines if line.strip()) - len(screened)
+        samples, still_bad = _parse_bisect(screened)
+        bad_lines += still_bad
+    valid = ~np.isnan(samples).any(axis=1)
+    if not valid.all():
+        bad_lines += int(np.count_nonzero(~valid))
+        samples = samples[valid]
+    samples[:, 0] /= 1e6  # micros() to seconds
+    return samples, bad_lines
+
+
 def parse_data(line):
     """Parse a line of CSV data from the Arduino."""
     try:
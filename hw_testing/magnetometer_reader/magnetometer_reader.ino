@@ -10,6 +10,11 @@
  * - Connect GND to Arduino GND
  * - Connect SCL to Arduino SCL
  * - Connect SDA to Arduino SDA
+ *
+ * Output:
+ * - Text mode (default): one CSV line per sample, timestamp,x,y,z,strength,temperature
+ * - Binary mode (BINARY_OUTPUT = true): one 30 byte little-endian frame per sample,
+ *   see hw_testing/binary_protocol.py for the layout
  */
 
 #include "TLx493D_inc.hpp"
@@ -19,6 +24,32 @@ using namespace ifx::tlx493d;
 // Create sensor object - using default I2C address
 TLx493D_A1B6 sensor(Wire, TLx493D_IIC_ADDR_A0_e);
 
+// Set to true to send compact binary frames instead of CSV text
+const bool BINARY_OUTPUT = false;
+const uint16_t SYNC_WORD = 0xA55A;
+
+struct __attribute__((packed)) MagFrame {
+  uint16_t sync;
+  uint16_t seq;
+  uint32_t timestampUs;
+  float x, y, z, strength, temperature;
+  uint16_t crc;  // CRC-16/CCITT-FALSE over all preceding bytes
+};
+
+MagFrame frame;
+uint16_t frameSeq = 0;
+
+uint16_t crc16Ccitt(const uint8_t *data, size_t len) {
+  uint16_t crc = 0xFFFF;
+  for (size_t i = 0; i < len; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : (crc << 1);
+    }
+  }
+  return crc;
+}
+
 // Variables to store sensor readings
 double temperature, x, y, z;
 double fieldStrength;
@@ -35,9 +66,12 @@ void setup() {
   // sensor.setAccessMode(TLx493D_AccessMode_e::FAST_MODE);  // Set to fast mode
   sensor.setUpdateRate(TLx493D_UpdateRateType_t::TLx493D_UPDATE_RATE_1000_HZ_e);
   
-  Serial.println("TLV493D Magnetometer Test");
-  Serial.println("-------------------------");
-  Serial.println("Format: x,y,z,strength,temperature");
+  // The host resyncs on the sync word, but keep the binary stream clean anyway
+  if (!BINARY_OUTPUT) {
+    Serial.println("TLV493D Magnetometer Test");
+    Serial.println("-------------------------");
+    Serial.println("Format: x,y,z,strength,temperature");
+  }
 }
 
 unsigned long lastReadTime = 0;
@@ -65,6 +99,21 @@ void loop() {
     // Serial.print(", Temp=");
     // Serial.println(temperature);
     
+    if (BINARY_OUTPUT) {
+      // Little-endian on AVR/ARM, so the struct can go out as-is
+      frame.sync = SYNC_WORD;
+      frame.seq = frameSeq++;
+      frame.timestampUs = currentTime;
+      frame.x = x;
+      frame.y = y;
+      frame.z = z;
+      frame.strength = fieldStrength;
+      frame.temperature = temperature;
+      frame.crc = crc16Ccitt((const uint8_t *)&frame, sizeof(MagFrame) - sizeof(frame.crc));
+      Serial.write((const uint8_t *)&frame, sizeof(MagFrame));
+      return;
+    }
+
     // Send data in CSV format for easy parsing by visualization script
     Serial.print(currentTime);
     Serial.print(",");
@@ -0,0 +1,192 @@
+"""
+Replay recorded captures into the same bus or queues MagnetometerReader fills.
+
+ReplaySource is a drop-in for MagnetometerReader in main_dispatcher: it is a thread
+with start/stop that publishes batches to a Broadcast, or puts parse_data style
+tuples on plot_data_queue and log_data_queue. Sources are capture directories written by capture_log, or raw
+dumps of the sketch's text output (e.g. `cat /dev/cu.usbmodem* > run.txt`).
+
+speed=1 replays in real time using the device timestamps, speed=10 ten times
+faster, and speed=None as fast as the consumers accept samples, which measures the
+throughput of whatever consumes them.
+"""
+import os
+import time
+from logging import Logger
+from queue import Queue
+from threading import Event, Thread
+
+import numpy as np
+
+from hw_testing.broadcast import Broadcast
+from hw_testing.capture_log import INDEX_FILE, CaptureReader
+from hw_testing.magnetometer_reader import LineDecoder
+
+
+def iter_capture(path, t_start=None, t_end=None, chunk_bytes=1 << 20):
+    """
+    Yield (n, 6) sample batches from a capture directory or a text dump.
+
+    Args:
+        path: Capture directory (with index.csv) or text file of raw serial output
+        t_start, t_end: Time range in seconds (device clock); None for open ends
+        chunk_bytes: Read size for text dumps
+
+    Yields:
+        (n, 6) float arrays of timestamp_s, x, y, z, strength, temp
+    """
+    if os.path.isdir(path):
+        if not os.path.exists(os.path.join(path, INDEX_FILE)):
+            raise FileNotFoundError(f"{path} is not a capture directory (no {INDEX_FILE})")
+        for samples in CaptureReader(path).iter_segments(t_start, t_end):
+            yield np.column_stack([samples[name] for name in samples.dtype.names])
+        return
+
+    decoder = LineDecoder()
+    lo = -np.inf if t_start is None else t_start
+    hi = np.inf if t_end is None else t_end
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(chunk_bytes), b''):
+            samples = decoder.feed(data)
+            yield samples[(samples[:, 0] >= lo) & (samples[:, 0] <= hi)]
+
+
+class ReplaySource(Thread):
+    """
+    Thread replaying a capture into a Broadcast, or plot_data_queue and log_data_queue.
+
+    In timed mode samples are released in small chunks at their device time divided
+    by speed. Gaps longer than max_gap_s (a device reset, the 71 minute micros()
+    wrap, or separate recordings appended to one capture) are skipped.
+
+    Attributes:
+        samples: Samples published so far
+        finished: Event set once the capture has been fully replayed
+    """
+
+    def __init__(self, path, logger: Logger, plot_data_queue: Queue = None, log_data_queue: Queue = None, speed=1.0,
+                 loop=False, t_start=None, t_end=None, chunk_s=0.005, max_gap_s=1.0, bus: Broadcast = None):
+        """
+        Args:
+            path: Capture directory or text dump, see iter_capture
+            logger: Logger
+            plot_data_queue: Queue for the dashboard
+            log_data_queue: Optional queue for LogHandler
+            speed: Replay speed relative to real time, None or 0 for as fast as possible
+            loop: Start over at the end of the capture
+            t_start, t_end: Replay only this time range (device clock, seconds)
+            chunk_s: Device time released per wake up in timed mode
+            max_gap_s: Longer gaps between samples are skipped
+            bus: Broadcast to publish to instead of the queues
+        """
+        super().__init__(daemon=True)
+        if bus is None and plot_data_queue is None:
+            raise ValueError("Either bus or plot_data_queue is required")
+        self.path = path
+        self.logger = logger
+        self.plot_data_queue = plot_data_queue
+        self.log_data_queue = log_data_queue
+        self.bus = bus
+        self.speed = speed or None
+        self.loop = loop
+        self.t_start = t_start
+        self.t_end = t_end
+        self.chunk_s = chunk_s
+        self.max_gap_s = max_gap_s
+
+        self.samples = 0
+        self.elapsed = 0.0
+        self.finished = Event()
+        self.running = True
+        logger.info(f"Initialized ReplaySource from {path} at "
+                    f"{'max' if self.speed is None else f'{self.speed:g}x'} speed")
+
+    def run(self):
+        """Main thread loop"""
+        t0 = time.perf_counter()
+        while self.running:
+            self._replay_once()
+            if not self.loop:
+                break
+        self.elapsed = time.perf_counter() - t0
+        self.finished.set()
+        self.logger.info(f"Replayed {self.samples} samples in {self.elapsed:.3f} s "
+                         f"({self.samples / max(self.elapsed, 1e-9):.0f} samples/s)")
+
+    def _replay_once(self):
+        # Device time -> wall clock mapping, reset after every skipped gap
+        wall_start = device_start = previous = None
+        for batch in iter_capture(self.path, self.t_start, self.t_end):
+            if len(batch) == 0:
+                continue
+            if self.speed is None:
+                if not self._publish(batch):
+                    return
+                continue
+
+            times = batch[:, 0]
+            if device_start is None:
+                wall_start, device_start, previous = time.perf_counter(), times[0], times[0]
+            # Split at gaps, then into chunks of chunk_s device time
+            gaps = np.flatnonzero(np.abs(np.diff(np.concatenate(([previous], times)))) > self.max_gap_s)
+            previous = times[-1]
+            for part_index, part in enumerate(np.split(batch, gaps)):
+                if len(part) == 0:
+                    continue
+                if part_index > 0:  # Every part after the first starts after a gap
+                    wall_start, device_start = time.perf_counter(), part[0, 0]
+                chunk_ids = np.floor((part[:, 0] - device_start) / self.chunk_s).astype(np.int64)
+                bounds = np.flatnonzero(np.diff(chunk_ids)) + 1
+                for chunk in np.split(part, bounds):
+                    due = wall_start + (chunk[-1, 0] - device_start) / self.speed
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    if not self._publish(chunk):
+                        return
+
+    def _publish(self, samples):
+        if not self.running:
+            return False
+        if self.bus is not None:
+            self.bus.publish(samples)
+            self.samples += len(samples)
+            return True
+        for parsed_data in map(tuple, samples.tolist()):
+            self.plot_data_queue.put(parsed_data)
+            if self.log_data_queue is not None:
+                self.log_data_queue.put(parsed_data)
+        self.samples += len(samples)
+        return True
+
+    def stop(self):
+        """Stop the replay thread"""
+        self.logger.info("Stopping replay...")
+        self.running = False
+        self.join(timeout=1.0)
+
+
+if __name__ == "__main__":
+    import click
+    import logging
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger(__name__)
+
+    @click.command()
+    @click.argument("path")
+    @click.option("--speed", default=0.0, help="Replay speed, 0 for as fast as possible")
+    @click.option("--batch", default=10_000, help="Samples read from the bus per consumer iteration")
+    def main(path, speed, batch):
+        """Measure pipeline throughput: replay PATH into a bus read like the dashboard does."""
+        bus = Broadcast(capacity=1 << 18)
+        subscription = bus.subscribe("block")
+        source = ReplaySource(path, logger, speed=speed, bus=bus)
+        consumed = 0
+        t0 = time.perf_counter()
+        source.start()
+        while not (source.finished.is_set() and subscription.lag == 0):
+            consumed += len(subscription.read(batch, timeout=0.01))
+        elapsed = time.perf_counter() - t0
+        logger.info(f"Consumed {consumed} samples in {elapsed:.3f} s ({consumed / elapsed:.0f} samples/s)")
+
+    main()
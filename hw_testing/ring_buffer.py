@@ -0,0 +1,94 @@
+import numpy as np
+from numpy.lib.recfunctions import unstructured_to_structured
+
+
+# One magnetometer sample, same order as parse_data output
+SAMPLE_DTYPE = np.dtype([
+    ('time', 'f8'),
+    ('x', 'f8'),
+    ('y', 'f8'),
+    ('z', 'f8'),
+    ('strength', 'f8'),
+    ('temp', 'f8'),
+])
+
+
+class RingBuffer(object):
+    """
+    Fixed-capacity history of samples backed by one preallocated structured array.
+
+    Every sample is written twice, at its slot and at slot + capacity, so the most
+    recent n samples are always one contiguous slice of the storage. Appends are O(1)
+    and reading the ordered history is a zero-copy view.
+    """
+
+    def __init__(self, capacity, dtype=SAMPLE_DTYPE):
+        self.capacity = int(capacity)
+        self.dtype = np.dtype(dtype)
+        self._data = np.zeros(2 * self.capacity, dtype=self.dtype)
+        self._index = 0  # Next slot to write, in [0, capacity)
+        self.total = 0   # Samples written since creation
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, sample):
+        """Append one sample (tuple in field order or structured scalar)."""
+        i = self._index
+        self._data[i] = sample
+        self._data[i + self.capacity] = sample
+        self._index = (i + 1) % self.capacity
+        self.total += 1
+
+    def extend(self, samples):
+        """
+        Append a batch of samples.
+
+        Args:
+            samples: Structured array with this buffer's dtype, or an (n, n_fields)
+                array / list of tuples in field order
+        """
+        if not (isinstance(samples, np.ndarray) and samples.dtype == self.dtype):
+            samples = unstructured_to_structured(
+                np.asarray(samples, dtype=float).reshape(-1, len(self.dtype.names)), dtype=self.dtype
+            )
+        n = len(samples)
+        if n == 0:
+            return
+        # Only the newest `capacity` samples can survive
+        if n > self.capacity:
+            self._index = (self._index + n - self.capacity) % self.capacity
+            self.total += n - self.capacity
+            samples = samples[-self.capacity:]
+            n = self.capacity
+
+        slots = (self._index + np.arange(n)) % self.capacity
+        self._data[slots] = samples
+        self._data[slots + self.capacity] = samples
+        self._index = (self._index + n) % self.capacity
+        self.total += n
+
+    def view(self, n=None):
+        """
+        Ordered (oldest to newest) view of the last n samples without copying.
+
+        Args:
+            n: Number of samples, defaults to everything stored
+
+        Returns:
+            Structured array view; index fields by name, e.g. view()['x']
+        """
+        n = len(self) if n is None else min(int(n), len(self))
+        end = self._index + self.capacity
+        return self._data[end - n:end]
+
+    @property
+    def latest(self):
+        """Most recent sample, or None if empty."""
+        if self.total == 0:
+            return None
+        return self._data[self._index + self.capacity - 1]
+
+    def clear(self):
+        self._index = 0
+        self.total = 0
@@ -0,0 +1,301 @@
+"""
+Virtual TLV493D board on a Linux pseudo terminal.
+
+VirtualMagnetometer opens a pty pair and writes the same stream the sketch in
+magnetometer_reader.ino sends, so MagnetometerReader (or anything else that opens a
+serial port) can be run against `sim.port` without hardware:
+
+    with VirtualMagnetometer(rate_hz=2000) as sim:
+        reader = MagnetometerReader(sim.port, 115200, logger, bus=bus)
+
+The stream can be made worse on purpose: sensor noise, bursts (the device holds
+data back and then sends it at once, like a stalled USB host), lines split across
+writes, and corrupted bytes.
+
+Run this module to find the highest sample rate the reader sustains.
+"""
+import os
+import time
+import tty
+from threading import Thread
+
+import numpy as np
+
+from hw_testing.binary_protocol import FRAME_SIZE, encode_frames
+
+
+# TLV493D field resolution in mT
+TLV493D_LSB_MT = 0.098
+HEADER_LINES = (
+    b"TLV493D Magnetometer Test\r\n"
+    b"-------------------------\r\n"
+    b"Format: x,y,z,strength,temperature\r\n"
+)
+
+
+class VirtualMagnetometer(Thread):
+    """
+    Thread emitting magnetometer samples on the master side of a pty pair.
+
+    Samples are generated on an exact rate_hz schedule (every wake up writes all the
+    samples that came due since the last one), so sleep jitter changes the write
+    sizes but never the sample rate.
+
+    Attributes:
+        port: Path of the slave side, open it like a serial port
+        sent: Samples generated so far
+        corrupted: Samples that had a byte corrupted
+        overflowed_bytes: Bytes discarded because the reader fell too far behind
+        wall_start: time.perf_counter() at device time 0
+    """
+
+    def __init__(self, rate_hz=909.0, protocol="text", noise_mt=0.05, burst_every_s=None, burst_len_s=0.05,
+                 partial_lines=False, corrupt_rate=0.0, header=True, write_interval=0.001,
+                 max_pending_bytes=4 << 20, seed=None):
+        """
+        Args:
+            rate_hz: Sample rate, the sketch's READ_INTERVAL of 1100 us is ~909 Hz
+            protocol: "text" (CSV lines as Serial.print writes them) or "binary" frames
+            noise_mt: Standard deviation of the sensor noise before quantization
+            burst_every_s: Hold samples back for burst_len_s once every this many seconds
+            burst_len_s: Length of each hold
+            partial_lines: End writes at random byte offsets instead of sample boundaries
+            corrupt_rate: Probability per sample that one of its bytes is replaced
+                with a random byte (which may not be valid UTF-8)
+            header: Send the sketch's text header first (text protocol only)
+            write_interval: Sleep between writes
+            max_pending_bytes: Unread bytes kept before output is dropped
+            seed: Random seed
+        """
+        super().__init__(daemon=True)
+        if protocol not in ("text", "binary"):
+            raise ValueError(f"Unsupported protocol: {protocol}")
+        self.rate_hz = float(rate_hz)
+        self.protocol = protocol
+        self.noise_mt = noise_mt
+        self.burst_every_s = burst_every_s
+        self.burst_len_s = burst_len_s
+        self.partial_lines = partial_lines
+        self.corrupt_rate = corrupt_rate
+        self.write_interval = write_interval
+        self.max_pending_bytes = max_pending_bytes
+        self.rng = np.random.default_rng(seed)
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)  # No echo or line editing, like a USB CDC port
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+
+        self.sent = 0
+        self.corrupted = 0
+        self.overflowed_bytes = 0
+        self.wall_start = None
+        self._pending = bytearray(HEADER_LINES if header and protocol == "text" else b"")
+        self.running = True
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def samples(self, indices):
+        """
+        Device samples for sample indices, as the sketch would compute them.
+
+        Returns:
+            timestamp_us: (n,) uint32 micros() values
+            values: (n, 5) x, y, z, strength, temperature in mT and deg C
+        """
+        t = indices / self.rate_hz
+        timestamp_us = (np.round(t * 1e6).astype(np.int64) & 0xFFFFFFFF).astype(np.uint32)
+        # Slowly rotating field of a few mT plus noise, quantized to the sensor LSB
+        phases = np.array([0.0, 2 * np.pi / 3, 4 * np.pi / 3])
+        xyz = 5.0 * np.sin(2 * np.pi * 0.5 * t[:, None] + phases) + self.rng.normal(
+            scale=self.noise_mt, size=(len(t), 3)
+        )
+        xyz = np.round(xyz / TLV493D_LSB_MT) * TLV493D_LSB_MT
+        strength = np.linalg.norm(xyz, axis=1)
+        temp = 25.0 + 0.5 * np.sin(2 * np.pi * 0.01 * t)
+        return timestamp_us, np.column_stack((xyz, strength, temp))
+
+    def encode(self, indices):
+        """Bytes the sketch sends for the given sample indices, before any corruption."""
+        timestamp_us, values = self.samples(indices)
+        if self.protocol == "binary":
+            return [encode_frames(indices, timestamp_us, values)], FRAME_SIZE
+        # Serial.print(double) prints two decimals, println ends with \r\n
+        lines = [
+            f"{ts},{x:.2f},{y:.2f},{z:.2f},{s:.2f},{temp:.2f}\r\n".encode()
+            for ts, (x, y, z, s, temp) in zip(timestamp_us.tolist(), values.tolist())
+        ]
+        return lines, None
+
+    def _corrupt(self, chunks, frame_size):
+        n = len(chunks) if frame_size is None else len(chunks[0]) // frame_size
+        hit = np.flatnonzero(self.rng.random(n) < self.corrupt_rate)
+        if len(hit) == 0:
+            return b"".join(chunks)
+        self.corrupted += len(hit)
+        if frame_size is None:
+            for i in hit:
+                line = bytearray(chunks[i])
+                line[self.rng.integers(len(line) - 2)] = self.rng.integers(256)
+                chunks[i] = bytes(line)
+            return b"".join(chunks)
+        data = np.frombuffer(chunks[0], dtype=np.uint8).copy()
+        offsets = hit * frame_size + self.rng.integers(frame_size, size=len(hit))
+        data[offsets] = self.rng.integers(256, size=len(hit))
+        return data.tobytes()
+
+    def _holding(self, t):
+        if not self.burst_every_s:
+            return False
+        return t % self.burst_every_s < self.burst_len_s
+
+    def run(self):
+        """Main thread loop"""
+        self.wall_start = time.perf_counter()
+        next_index = 0
+        while self.running:
+            t = time.perf_counter() - self.wall_start
+            due = int(t * self.rate_hz) + 1
+            if due > next_index and not self._holding(t):
+                chunks, frame_size = self.encode(np.arange(next_index, due))
+                self._pending += self._corrupt(chunks, frame_size)
+                self.sent += due - next_index
+                next_index = due
+            self._write()
+            time.sleep(self.write_interval)
+
+    def _write(self):
+        if not self._pending:
+            return
+        end = len(self._pending)
+        if self.partial_lines:
+            end = int(self.rng.integers(1, end + 1))
+        try:
+            written = os.write(self.master, self._pending[:end])
+        except BlockingIOError:
+            written = 0  # The pty buffer is full, the reader is behind
+        except OSError:
+            return  # Slave closed
+        del self._pending[:written]
+        if len(self._pending) > self.max_pending_bytes:
+            self.overflowed_bytes += len(self._pending)
+            self._pending.clear()
+
+    def device_time_to_wall(self, device_time_s):
+        """perf_counter() time at which a sample with this device time was generated."""
+        return self.wall_start + device_time_s
+
+    def stop(self):
+        """Stop emitting and close the pty"""
+        self.running = False
+        if self.is_alive():
+            self.join(timeout=1.0)
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+def benchmark_reader(rate_hz, duration_s=3.0, protocol="text", logger=None, **impairments):
+    """
+    Run MagnetometerReader against a VirtualMagnetometer and measure what arrives.
+
+    The device runs as a thread in this process and competes with the reader for the
+    GIL, so the rates found are a lower bound on what a real board would allow.
+
+    Args:
+        rate_hz: Sample rate of the virtual device
+        duration_s: Seconds to emit
+        protocol: "text" or "binary"
+        logger: Logger for the reader, defaults to a quiet one
+        **impairments: Passed to VirtualMagnetometer (noise_mt, burst_every_s, ...)
+
+    Returns:
+        Dictionary with samples sent and received, the loss fraction and the
+        latency percentiles from generation to consumer in seconds
+    """
+    import logging
+    from hw_testing.broadcast import Broadcast
+    from hw_testing.magnetometer_reader import MagnetometerReader
+
+    if logger is None:
+        logger = logging.getLogger("virtual_magnetometer.benchmark")
+        logger.setLevel(logging.CRITICAL)  # Corrupted input makes the reader log per sample
+
+    bus = Broadcast(capacity=1 << 18)
+    subscription = bus.subscribe("block")
+    latencies = []
+    sim = VirtualMagnetometer(rate_hz, protocol, **impairments)
+    # The reader flushes the input when it opens the port, so start the device afterwards
+    reader = MagnetometerReader(sim.port, 115200, logger, protocol=protocol, bus=bus)
+    with sim:
+        reader.start()
+        t_end = time.perf_counter() + duration_s
+        # Keep draining for a moment after the device stops, to collect late samples
+        while time.perf_counter() < t_end + 0.2:
+            if sim.running and time.perf_counter() >= t_end:
+                sim.running = False
+            batch = subscription.read(timeout=0.01)
+            if not len(batch):
+                continue
+            now = time.perf_counter()
+            latencies.append(now - sim.device_time_to_wall(batch['time']))
+        reader.stop()
+        sent, corrupted, overflowed = sim.sent, sim.corrupted, sim.overflowed_bytes
+
+    latencies = np.concatenate(latencies) if latencies else np.array([np.nan])
+    received = int(np.sum(np.isfinite(latencies)))
+    expected = sent - corrupted
+    return {
+        'rate_hz': rate_hz,
+        'sent': sent,
+        'received': received,
+        'loss': max(0.0, 1 - received / max(expected, 1)),
+        'overflowed_bytes': overflowed,
+        'latency_p50_s': float(np.nanpercentile(latencies, 50)),
+        'latency_p99_s': float(np.nanpercentile(latencies, 99)),
+    }
+
+
+if __name__ == "__main__":
+    import click
+
+    @click.command()
+    @click.option("--binary", is_flag=True, help="Benchmark the binary frame protocol")
+    @click.option("--start-rate", default=1000.0, help="First sample rate in Hz")
+    @click.option("--max-rate", default=256_000.0, help="Stop doubling at this rate")
+    @click.option("--seconds", default=3.0, help="Duration of each run")
+    @click.option("--max-loss", default=0.001, help="Largest sustainable loss fraction")
+    @click.option("--max-latency", default=0.05, help="Largest sustainable p99 latency in seconds")
+    @click.option("--corrupt-rate", default=0.0, help="Probability of a corrupted sample")
+    @click.option("--partial-lines", is_flag=True, help="Split writes mid line")
+    @click.option("--bursts", is_flag=True, help="Hold data back for 50 ms every second")
+    def main(binary, start_rate, max_rate, seconds, max_loss, max_latency, corrupt_rate, partial_lines, bursts):
+        """Double the sample rate until the reader drops or delays data."""
+        protocol = "binary" if binary else "text"
+        impairments = dict(corrupt_rate=corrupt_rate, partial_lines=partial_lines,
+                           burst_every_s=1.0 if bursts else None)
+        # A burst delays its samples by design, allow for it
+        latency_limit = max_latency + (0.05 if bursts else 0.0)
+        # A corrupted sync word or newline can take a neighbouring sample with it
+        loss_limit = max_loss + corrupt_rate
+        rate, sustained = start_rate, None
+        while rate <= max_rate:
+            result = benchmark_reader(rate, seconds, protocol, **impairments)
+            ok = result['loss'] <= loss_limit and result['latency_p99_s'] <= latency_limit
+            print(f"{protocol} {rate:>9.0f} Hz: received {result['received']}/{result['sent']} "
+                  f"loss {result['loss']:.2%}, latency p50 {result['latency_p50_s']*1e3:.1f} ms "
+                  f"p99 {result['latency_p99_s']*1e3:.1f} ms {'ok' if ok else 'FAIL'}")
+            if not ok:
+                break
+            sustained = rate
+            rate *= 2
+        print(f"Highest sustained rate: {sustained:.0f} Hz" if sustained else "No sustained rate")
+
+    main()
@@ -1,14 +1,24 @@
 """
 Basic Matplotlib Live Plotter for TLV493D Magnetometer Data
 - needs 10 seconds of buffer time to get proper plot
+
+Run with python hw_testing/visualize_magnetometer.py or python -m hw_testing.visualize_magnetometer
 """
 
+import os
+import sys
 import serial as serials
 import time
 import argparse
 import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
+
+if __package__ in (None, ''):
+    # Run as a script: make the repo root importable for the hw_testing package
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hw_testing.dashboard import MagnetometerDashboard
+from hw_testing.ring_buffer import RingBuffer
 
 # Default serial port settings
 DEFAULT_PORT = "/dev/cu.usbmodem1301"
@@ -16,12 +26,7 @@ DEFAULT_BAUD = 115200
 
 # Data buffer for plotting history
 MAX_HISTORY = 100
-x_history = np.zeros(MAX_HISTORY)
-y_history = np.zeros(MAX_HISTORY)
-z_history = np.zeros(MAX_HISTORY)
-strength_history = np.zeros(MAX_HISTORY)
-temp_history = np.zeros(MAX_HISTORY)
-time_history = np.zeros(MAX_HISTORY)
+history = RingBuffer(MAX_HISTORY)
 
 
 def parse_data(line):
@@ -40,43 +45,8 @@ def parse_data(line):
     return None
 
 
-def setup_plot():
-    fig = plt.figure(figsize=(15, 10))
-    fig.suptitle("TLV493D Magnetometer Visualization", fontsize=16)
-
-    # 3D vector plot
-    ax1 = fig.add_subplot(2, 2, 1, projection="3d")
-    ax1.set_title("Magnetic Field Vector")
-    ax1.set_xlabel("X (mT)")
-    ax1.set_ylabel("Y (mT)")
-    ax1.set_zlabel("Z (mT)")
-    ax1.set_box_aspect([1, 1, 1])
-
-    # Field strength over time
-    ax2 = fig.add_subplot(2, 2, 2)
-    ax2.set_title("Field Strength Over Time")
-    ax2.set_xlabel("Time (s)")
-    ax2.set_ylabel("Field Strength (mT)")
-
-    # XYZ field strength
-    ax3 = fig.add_subplot(2, 2, 3)
-    ax3.set_title("Field Components Over Time")
-    ax3.set_xlabel("Time (s)")
-    ax3.set_ylabel("Field (mT)")
-
-    # Temperature
-    ax4 = fig.add_subplot(2, 2, 4)
-    ax4.set_title("Temperature Over Time")
-    ax4.set_xlabel("Time (s)")
-    ax4.set_ylabel("Temperature (°C)")
-
-    return fig, (ax1, ax2, ax3, ax4)
-
-
-def update_plot(frame, ser, fig, axes):
+def update_plot(ser, dashboard):
     """Update function for animation."""
-    global x_history, y_history, z_history, strength_history, temp_history, time_history
-
     # Clear buffer if too much data is waiting
     if ser.in_waiting > 100:  # If more than ~5 lines are waiting
         ser.reset_input_buffer()
@@ -103,22 +73,7 @@ def update_plot(frame, ser, fig, axes):
 
             if data:
                 x, y, z, strength, temp = data
-
-                # Update histories (shift left and add new value at the end)
-                x_history = np.roll(x_history, -1)
-                y_history = np.roll(y_history, -1)
-                z_history = np.roll(z_history, -1)
-                strength_history = np.roll(strength_history, -1)
-                temp_history = np.roll(temp_history, -1)
-                time_history = np.roll(time_history, -1)
-
-                x_history[-1] = x
-                y_history[-1] = y
-                z_history[-1] = z
-                strength_history[-1] = strength
-                temp_history[-1] = temp
-                time_history[-1] = time.time()
-
+                history.append((time.time(), x, y, z, strength, temp))
                 lines_read += 1
 
         except Exception as e:
@@ -127,69 +82,14 @@ def update_plot(frame, ser, fig, axes):
 
     # Only update the plots if we actually got new data
     if lines_read > 0:
+        window = history.view()
         # Normalize time to start at 0
-        if time_history[0] != 0:
-            rel_time = time_history - time_history[0]
-        else:
-            rel_time = np.zeros_like(time_history)
-
-        # Update 3D vector plot
-        ax1 = axes[0]
-        ax1.clear()
-        ax1.set_title("Magnetic Field Vector")
-        ax1.set_xlabel("X (mT)")
-        ax1.set_ylabel("Y (mT)")
-        ax1.set_zlabel("Z (mT)")
-
-        # Plot the current vector
-        ax1.quiver(
-            0,
-            0,
-            0,
-            x_history[-1],
-            y_history[-1],
-            z_history[-1],
-            color="r",
-            arrow_length_ratio=0.1,
+        rel_time = window["time"] - window["time"][0]
+        return dashboard.update(
+            rel_time, window["x"], window["y"], window["z"], window["strength"], window["temp"]
         )
 
-        # Set equal aspect ratio and reasonable limits
-        max_val = max(abs(x_history[-1]), abs(y_history[-1]), abs(z_history[-1]), 0.1)
-        ax1.set_xlim([-max_val, max_val])
-        ax1.set_ylim([-max_val, max_val])
-        ax1.set_zlim([-max_val, max_val])
-
-        # Update field strength plot
-        ax2 = axes[1]
-        ax2.clear()
-        ax2.set_title("Field Strength Over Time")
-        ax2.set_xlabel("Time (s)")
-        ax2.set_ylabel("Field Strength (mT)")
-        ax2.plot(rel_time, strength_history, "g-")
-
-        # Update XYZ components plot
-        ax3 = axes[2]
-        ax3.clear()
-        ax3.set_title("Field Components Over Time")
-        ax3.set_xlabel("Time (s)")
-        ax3.set_ylabel("Field (mT)")
-        ax3.plot(rel_time, x_history, "r-", label="X")
-        ax3.plot(rel_time, y_history, "g-", label="Y")
-        ax3.plot(rel_time, z_history, "b-", label="Z")
-        ax3.legend()
-
-        # Update temperature plot
-        ax4 = axes[3]
-        ax4.clear()
-        ax4.set_title("Temperature Over Time")
-        ax4.set_xlabel("Time (s)")
-        ax4.set_ylabel("Temperature (°C)")
-        ax4.plot(rel_time, temp_history, "m-")
-
-        # Adjust layout
-        plt.tight_layout()
-
-    return axes
+    return dashboard.artists
 
 
 def main():
@@ -229,19 +129,12 @@ def main():
         time.sleep(2)
 
         # Set up the plot
-        fig, axes = setup_plot()
+        dashboard = MagnetometerDashboard(fourth_panel="temperature")
 
-        # Create animation
-        ani = FuncAnimation(
-            fig,
-            update_plot,
-            fargs=(serial_connection, fig, axes),
-            interval=50,
-            save_count=100,
-        )  # 50ms interval, 100 frames cache
+        # Create blitted animation
+        ani = dashboard.animate(lambda: update_plot(serial_connection, dashboard), interval=20)
 
         # Show the plot
-        plt.tight_layout()
         plt.show()
 
     except serials.SerialException as e:
@@ -1,8 +1,22 @@
+import os
+import argparse
 import numpy as np
 import magpylib as magpy
-from time import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import matplotlib.pyplot as plt
 from magnet_designer import CoilCylinder, SimpleCoil
+from coil_equation import calculate_magnetic_field
+from field_basis import FieldBasis
+from hemisphere_layout import hemisphere_layout
+import profiling
+from result_cache import ResultCache, result_key
+
+# Composite score weights, cached sweeps can be re-ranked by changing these without re-simulating
+SCORE_WEIGHTS = {'force_strength': 0.5, 'energy_contrast': 0.5}
+
+# Successive halving stages for the adaptive sweep: (grid samples per axis, top view only).
+# The last stage must match the full sweep so finalists get the same scores as a full run.
+ADAPTIVE_STAGES = [(15, True), (30, False), (60, False)]
 
 
 def create_hemisphere_magnetic_system(magnet_class, params, system_params):
@@ -16,7 +30,7 @@ def create_hemisphere_magnetic_system(magnet_class, params, system_params):
         
     Returns:
         collection: magpylib Collection containing the entire system
-        sensor_positions: List of sensor positions
+        sensor_positions: (n_sensors, 3) array of sensor positions
     """
     # Extract system parameters
     r_m = system_params['r_m']
@@ -26,63 +40,33 @@ def create_hemisphere_magnetic_system(magnet_class, params, system_params):
     ferro_polarization = system_params.get('ferro_polarization', (.1, .2, .3))
     ferro_dimension = system_params.get('ferro_dimension', (.01, .01))
     
-    # Generate coils on hemisphere
+    if magnet_class not in (SimpleCoil, CoilCylinder):
+        raise ValueError(f"Unsupported magnet class: {magnet_class}")
+    
+    # Generate coil and sensor placement on the hemisphere as arrays
+    layout = hemisphere_layout(
+        r_m, n_phi_rad, n_theta_rad,
+        range_offsets=system_params.get('sensor_range_offsets', (0, 0.005)),
+        angle_offsets=system_params.get('sensor_angle_offsets', (0,)),
+        phi_offsets=system_params.get('sensor_phi_offsets', (0,)),
+    )
+    sensor_positions = layout.sensor_positions
+    
     coils = []
-    sensor_positions = []
-    phi_values = np.linspace(0, np.pi/2, n_phi_rad)  # 0 to π/2 for a hemisphere
-    theta_values = np.linspace(0, 2*np.pi, n_theta_rad, endpoint=False)
-    
-    # Sensor Offsets
-    range_offsets = [0, 0.005]
-    angle_offsets = [0]
-    angle_offsets.extend([a*-1 for a in angle_offsets])
-    phi_offsets = [0]
-    
-    for phi in phi_values:  # elevation
-        for theta in theta_values:  # azimuth
-            for r_offset in range_offsets:  # range for sensor
-                for theta_offset in angle_offsets:  # az for sensor
-                    for phi_offset in phi_offsets:  # el for sensor
-                        # Calculate sensor position in cartesian
-                        x = (r_m + r_offset) * np.sin(phi+phi_offset) * np.cos(theta + theta_offset)
-                        y = (r_m + r_offset) * np.sin(phi+phi_offset) * np.sin(theta + theta_offset)
-                        z = (r_m + r_offset) * np.cos(phi+phi_offset)
-                        pos = np.array([x, y, z])
-                        sensor_positions.append(pos)
-                        
-                        # Add coil only for the 0 offset case
-                        if r_offset == 0 and theta_offset == 0 and phi_offset == 0:
-                            # Create magnet based on the provided class and parameters
-                            if magnet_class == SimpleCoil:
-                                magnet_instance = SimpleCoil(**params)
-                            elif magnet_class == CoilCylinder:
-                                magnet_instance = CoilCylinder(**params)
-                            else:
-                                raise ValueError(f"Unsupported magnet class: {magnet_class}")
-                                
-                            coil = magnet_instance.get_magnet()
-                            
-                            # Rotate coil from +z-axis to the local radial direction
-                            radial_dir = pos / np.linalg.norm(pos)  # Unit Vector for radial direction
-                            z_axis = np.array([0, 0, 1])
-                            z_cross_radial = np.cross(z_axis, radial_dir)  # Orthogonal vector to z_axis and radial_dir
-                            norm_cross = np.linalg.norm(z_cross_radial)  # Magnitude
-                            
-                            if norm_cross > 1e-9:
-                                z_cross_radial /= norm_cross
-                                angle = np.arccos(np.dot(z_axis, radial_dir))
-                                coil.rotate_from_angax(angle=angle, axis=z_cross_radial, degrees=False)
-                            
-                            # Add ferro center if enabled
-                            if include_ferro_center:
-                                ferro = magpy.magnet.Cylinder(position=pos, polarization=ferro_polarization, dimension=ferro_dimension)
-                                if norm_cross > 1e-9:
-                                    ferro.rotate_from_angax(angle=angle, axis=z_cross_radial, degrees=False)
-                                coils.append(ferro)
-                                
-                            # Move coil out to the hemisphere surface
-                            coil.move(pos)
-                            coils.append(coil)
+    for pos, rotation in zip(layout.coil_positions, layout.coil_rotations):
+        # Rotate coil from +z-axis to the local radial direction
+        coil = magnet_class(**params).get_magnet()
+        coil.rotate(rotation)
+        
+        # Add ferro center if enabled
+        if include_ferro_center:
+            ferro = magpy.magnet.Cylinder(position=pos, polarization=ferro_polarization, dimension=ferro_dimension)
+            ferro.rotate(rotation)
+            coils.append(ferro)
+            
+        # Move coil out to the hemisphere surface
+        coil.move(pos)
+        coils.append(coil)
     
     # Combine all coils into a single Collection
     collection = magpy.Collection(coils)
@@ -92,56 +76,142 @@ def create_hemisphere_magnetic_system(magnet_class, params, system_params):
     return collection, sensor_positions
 
 
-def compute_energy_and_force(collection, grid_length_m):
+def make_view_grids(grid_length_m, n_top=60, n_side=60):
     """
-    Compute magnetic energy and force fields for top and side views.
+    Build the top-down (x-y) and side (x-z) observer grids used for the energy maps.
     
     Args:
-        collection: magpylib Collection containing the entire system
-        grid_length_m: Length of the grid for visualization
+        grid_length_m: Half length of the square grids
+        n_top: Number of samples per axis for the top view
+        n_side: Number of samples per axis for the side view
         
     Returns:
-        Dictionary containing grids, energies, and forces for both views
+        Dictionary with the grid axes, meshgrids and (n, n, 3) observer arrays
     """
     # Define grid for the top-down (x-y) view
-    nx_top, ny_top = 60, 60
-    xs_top = np.linspace(-grid_length_m, grid_length_m, nx_top)
-    ys_top = np.linspace(-grid_length_m, grid_length_m, ny_top)
+    xs_top = np.linspace(-grid_length_m, grid_length_m, n_top)
+    ys_top = np.linspace(-grid_length_m, grid_length_m, n_top)
     X_top, Y_top = np.meshgrid(xs_top, ys_top)
     # Create a grid of points in the z=0 plane
     grid_top = np.stack((X_top, Y_top, np.zeros_like(X_top)), axis=2)
     
-    # Compute the B-field on the top view grid and scale it
-    t0 = time()
-    B_top = magpy.getB(collection, grid_top) * 1E-3
-    print(f"Time to compute B_top: {time()-t0:.3f}")
-    
-    # Calculate the magnetic energy density: Energy = 0.5 * |B|^2
-    Energy_top = 0.5 * np.sum(np.square(B_top), axis=2)
-    
-    # Compute the force field (i.e. the gradient of the energy)
-    force_top = np.gradient(Energy_top, ys_top, xs_top)
-    
     # Define grid for the side view: here we take an x-z slice at y=0
-    nx_side, nz_side = 60, 60
-    xs_side = np.linspace(-grid_length_m, grid_length_m, nx_side)
-    zs_side = np.linspace(-grid_length_m, grid_length_m, nz_side)
+    xs_side = np.linspace(-grid_length_m, grid_length_m, n_side)
+    zs_side = np.linspace(-grid_length_m, grid_length_m, n_side)
     X_side, Z_side = np.meshgrid(xs_side, zs_side)
     # Create a grid of points in the y=0 plane (side view)
     grid_side = np.stack((X_side, np.zeros_like(X_side), Z_side), axis=2)
     
-    t0 = time()
-    B_side = magpy.getB(collection, grid_side) * 1E-3
-    print(f"Time to compute B_side: {time()-t0:.3f}")
+    return {
+        'xs_top': xs_top, 'ys_top': ys_top, 'X_top': X_top, 'Y_top': Y_top, 'grid_top': grid_top,
+        'xs_side': xs_side, 'zs_side': zs_side, 'X_side': X_side, 'Z_side': Z_side, 'grid_side': grid_side
+    }
+
+
+def energy_and_force_from_fields(B_top, B_side, grids):
+    """
+    Compute magnetic energy and force maps from precomputed (scaled) B-fields.
+    
+    Args:
+        B_top: B-field on grids['grid_top']
+        B_side: B-field on grids['grid_side']
+        grids: Dictionary returned by make_view_grids
+        
+    Returns:
+        Dictionary containing grids, energies, and forces for both views
+    """
+    energy_data = top_view_energy_and_force(B_top, grids)
     
     Energy_side = 0.5 * np.sum(np.square(B_side), axis=2)
     # For the side view, the first axis corresponds to z and the second to x
-    force_side = np.gradient(Energy_side, zs_side, xs_side)
+    force_side = np.gradient(Energy_side, grids['zs_side'], grids['xs_side'])
     
-    return {
-        'X_top': X_top, 'Y_top': Y_top, 'Energy_top': Energy_top, 'force_top': force_top,
-        'X_side': X_side, 'Z_side': Z_side, 'Energy_side': Energy_side, 'force_side': force_side
-    }
+    energy_data.update({
+        'X_side': grids['X_side'], 'Z_side': grids['Z_side'], 'Energy_side': Energy_side, 'force_side': force_side
+    })
+    return energy_data
+
+
+def top_view_energy_and_force(B_top, grids):
+    """
+    Top view half of energy_and_force_from_fields, used on its own for cheap screening.
+    
+    Returns:
+        Dictionary with the top view grids, energy and force
+    """
+    # Calculate the magnetic energy density: Energy = 0.5 * |B|^2
+    Energy_top = 0.5 * np.sum(np.square(B_top), axis=2)
+    
+    # Compute the force field (i.e. the gradient of the energy)
+    force_top = np.gradient(Energy_top, grids['ys_top'], grids['xs_top'])
+    
+    return {'X_top': grids['X_top'], 'Y_top': grids['Y_top'], 'Energy_top': Energy_top, 'force_top': force_top}
+
+
+def compute_energy_and_force(collection, grid_length_m):
+    """
+    Compute magnetic energy and force fields for top and side views.
+    
+    Args:
+        collection: magpylib Collection containing the entire system
+        grid_length_m: Length of the grid for visualization
+        
+    Returns:
+        Dictionary containing grids, energies, and forces for both views
+    """
+    grids = make_view_grids(grid_length_m)
+    
+    # Compute the B-field on the top view grid and scale it
+    with profiling.span("field_top"):
+        B_top = magpy.getB(collection, grids['grid_top']) * 1E-3
+        profiling.count("observer_points", grids['X_top'].size)
+    
+    with profiling.span("field_side"):
+        B_side = magpy.getB(collection, grids['grid_side']) * 1E-3
+        profiling.count("observer_points", grids['X_side'].size)
+    
+    with profiling.span("gradient"):
+        return energy_and_force_from_fields(B_top, B_side, grids)
+
+
+def build_view_basis(collection, grids):
+    """
+    Precompute the unit-current field basis of a collection on both view grids.
+    
+    Args:
+        collection: magpylib Collection containing the entire system
+        grids: Dictionary returned by make_view_grids
+        
+    Returns:
+        FieldBasis over the stacked top and side grid points
+    """
+    points = np.concatenate((grids['grid_top'].reshape(-1, 3), grids['grid_side'].reshape(-1, 3)))
+    with profiling.span("field_basis"):
+        basis = FieldBasis(collection, points)
+        profiling.count("observer_points", len(points))
+    return basis
+
+
+def compute_energy_and_force_from_basis(basis, grids, currents=None):
+    """
+    Compute magnetic energy and force fields for a coil current vector using a
+    precomputed field basis instead of re-evaluating magpylib.
+    
+    Args:
+        basis: FieldBasis returned by build_view_basis
+        grids: Dictionary returned by make_view_grids
+        currents: Coil currents of shape (n_coils,), defaults to the nominal currents
+        
+    Returns:
+        Dictionary containing grids, energies, and forces for both views
+    """
+    with profiling.span("field"):
+        B = basis.field(currents) * 1E-3
+    n_top = grids['X_top'].size
+    B_top = B[:n_top].reshape(grids['grid_top'].shape)
+    B_side = B[n_top:].reshape(grids['grid_side'].shape)
+    with profiling.span("gradient"):
+        return energy_and_force_from_fields(B_top, B_side, grids)
 
 
 def calculate_metrics(energy_data):
@@ -184,6 +254,36 @@ def calculate_metrics(energy_data):
     }
 
 
+def calculate_top_view_metrics(energy_data):
+    """
+    Top view only counterpart of calculate_metrics, with the same composite metric
+    names so SCORE_WEIGHTS applies. Scores are only comparable with other top view scores.
+    
+    Args:
+        energy_data: Dictionary with top view energy and force data
+        
+    Returns:
+        Dictionary of performance metrics
+    """
+    top_force_magnitude = np.sqrt(energy_data['force_top'][0]**2 + energy_data['force_top'][1]**2)
+    energy_peak_top = np.max(energy_data['Energy_top'])
+    energy_contrast_top = energy_peak_top / (np.min(energy_data['Energy_top']) + 1e-10)
+    
+    return {
+        'avg_force_top': np.mean(top_force_magnitude),
+        'energy_peak_top': energy_peak_top,
+        'energy_contrast_top': energy_contrast_top,
+        'force_strength': np.mean(top_force_magnitude),
+        'energy_peak': energy_peak_top,
+        'energy_contrast': energy_contrast_top
+    }
+
+
+def score_metrics(metrics):
+    """Composite score prioritizing force strength and energy contrast, see SCORE_WEIGHTS."""
+    return sum(metrics[name] * weight for name, weight in SCORE_WEIGHTS.items())
+
+
 def plot_energy_field(energy_data, title):
     """
     Plot energy and force fields.
@@ -222,9 +322,298 @@ def plot_energy_field(energy_data, title):
     return fig
 
 
-def sweep_magnet_designs():
+def make_magnet_params(magnet_class, coil_diameter, current, n_turns, height=None, magnetization=None):
     """
-    Sweep through different magnet designs and parameters, evaluating performance.
+    Build the magnet class parameters and configuration name for one sweep point.
+    
+    Args:
+        magnet_class: Class of magnet to use (SimpleCoil or CoilCylinder)
+        coil_diameter: Coil diameter in meters
+        current: Drive current per turn in amperes
+        n_turns: Number of turns
+        height: Cylinder height in meters (CoilCylinder only)
+        magnetization: Cylinder magnetization (CoilCylinder only)
+        
+    Returns:
+        config_name: Name used for plots and reports
+        params: Dictionary with parameters for the magnet class
+    """
+    if magnet_class == SimpleCoil:
+        params = {
+            'n_turns': n_turns,
+            'current_a_base': current,
+            'diameter_m': coil_diameter
+        }
+        config_name = f"SimpleCoil_d{coil_diameter}_c{current}_t{n_turns}"
+    elif magnet_class == CoilCylinder:
+        params = {
+            'n_turns': n_turns,
+            'current_a': current * n_turns,  # Effective current
+            'coil_diameter': coil_diameter,
+            'coil_height': height,
+            'magnetization': magnetization
+        }
+        mag_str = f"m{magnetization[2]}"
+        config_name = f"CoilCyl_d{coil_diameter}_c{current}_t{n_turns}_h{height}_{mag_str}"
+    else:
+        raise ValueError(f"Unsupported magnet class: {magnet_class}")
+    return config_name, params
+
+
+def make_geometry_name(magnet_class, coil_diameter, n_turns, height=None, magnetization=None):
+    """
+    Name of a coil geometry, i.e. the configuration name of make_magnet_params without the current.
+    
+    Args:
+        magnet_class: Class of magnet to use (SimpleCoil or CoilCylinder)
+        coil_diameter, n_turns, height, magnetization: As for make_magnet_params
+        
+    Returns:
+        Name used to label the geometry (e.g. its profiling configuration)
+    """
+    if magnet_class == SimpleCoil:
+        return f"SimpleCoil_d{coil_diameter}_t{n_turns}"
+    elif magnet_class == CoilCylinder:
+        return f"CoilCyl_d{coil_diameter}_t{n_turns}_h{height}_m{magnetization[2]}"
+    raise ValueError(f"Unsupported magnet class: {magnet_class}")
+
+
+def coil_current(magnet_class, params):
+    """
+    Current carried by the current loop of a single magnet instance, i.e. the
+    per-coil current the hemisphere Collection is built with.
+    """
+    magnet = magnet_class(**params).get_magnet()
+    sources = magnet.sources_all if isinstance(magnet, magpy.Collection) else [magnet]
+    return next(s.current for s in sources if isinstance(s, magpy.current.Circle))
+
+
+def analytic_coil_estimate(magnet_class, params, distance_m, mu_0=4 * np.pi * 1e-7):
+    """
+    Cheap single coil estimate with the analytic on-axis model from coil_equation.
+    
+    The turns are co-located like in the magpylib model. The CoilCylinder core is
+    ignored; its magnetization is negligible next to the coil field.
+    
+    Args:
+        magnet_class: Class of magnet to use (SimpleCoil or CoilCylinder)
+        params: Dictionary with parameters for the magnet class
+        distance_m: Distance from the coil face along its axis
+        
+    Returns:
+        field_t: On-axis flux density in Tesla
+        force_n: Pull on a part at that distance, F = B^2 * A / (2 * mu_0) with A the coil face
+    """
+    if magnet_class == SimpleCoil:
+        loop_diameter = params['diameter_m']
+        turn_current = params['current_a_base']
+    elif magnet_class == CoilCylinder:
+        # Same loop as CoilCylinder._get_coils
+        loop_diameter = params['coil_diameter'] * 1.1
+        turn_current = params['current_a']
+    else:
+        raise ValueError(f"Unsupported magnet class: {magnet_class}")
+    
+    radii = np.full(params['n_turns'], loop_diameter / 2)
+    field_t = abs(calculate_magnetic_field(radii, turn_current, distance_m, mu_0=mu_0))
+    area = np.pi * (loop_diameter / 2) ** 2
+    force_n = field_t ** 2 * area / (2 * mu_0)
+    return field_t, force_n
+
+
+def screen_candidates(candidates, system_params, min_field_t=None, min_force_n=None, distance_m=None):
+    """
+    Pre-filter sweep candidates with analytic_coil_estimate before any magpylib work.
+    
+    Args:
+        candidates: List of (magnet_class, params) to screen
+        system_params: Dictionary with parameters for the hemisphere system
+        min_field_t: Minimum on-axis field in Tesla, None to skip the check
+        min_force_n: Minimum pull in newtons, None to skip the check
+        distance_m: Distance to evaluate at, defaults to the hemisphere radius
+            (i.e. from each coil to the center of the ball)
+        
+    Returns:
+        List with a rejection reason per candidate, None for candidates that pass
+    """
+    distance_m = system_params['r_m'] if distance_m is None else distance_m
+    reasons = []
+    for magnet_class, params in candidates:
+        field_t, force_n = analytic_coil_estimate(magnet_class, params, distance_m)
+        reason = None
+        if min_field_t is not None and field_t < min_field_t:
+            reason = f"field {field_t:.3e} T < {min_field_t:.3e} T"
+        elif min_force_n is not None and force_n < min_force_n:
+            reason = f"force {force_n:.3e} N < {min_force_n:.3e} N"
+        reasons.append(reason)
+    return reasons
+
+
+def evaluate_current_sweep(magnet_class, design, current_values, system_params, save_plots=True,
+                           return_energy_data=False, n_grid=60, top_only=False):
+    """
+    Evaluate one coil geometry at several drive currents.
+    
+    The Collection is built and evaluated with magpylib only once (as a unit-current
+    field basis); every current value is then a tensordot over that basis.
+    
+    Args:
+        magnet_class: Class of magnet to use (SimpleCoil or CoilCylinder)
+        design: Keyword arguments of make_magnet_params other than current
+        current_values: Drive currents to evaluate
+        system_params: Dictionary with parameters for the hemisphere system
+        save_plots: Save an energy plot per configuration (ignored for top_only)
+        return_energy_data: Include the raw energy/force grids under 'energy_data'
+        n_grid: Samples per axis of the view grids
+        top_only: Only evaluate the top view and score it with calculate_top_view_metrics
+        
+    Returns:
+        List of result dictionaries, one per current value
+    """
+    _, base_params = make_magnet_params(magnet_class, current=current_values[0], **design)
+    # Profiling label of the geometry, shared by every current
+    geometry_name = make_geometry_name(magnet_class, **design)
+    
+    with profiling.configuration(geometry_name):
+        # Create the hemisphere system once for this geometry
+        with profiling.span("geometry"):
+            collection, sensor_positions = create_hemisphere_magnetic_system(
+                magnet_class, base_params, system_params
+            )
+        grid_length_m = system_params['r_m'] * 1.25
+        grids = make_view_grids(grid_length_m, n_grid, n_grid)
+        if top_only:
+            with profiling.span("field_basis"):
+                basis = FieldBasis(collection, grids['grid_top'])
+                profiling.count("observer_points", grids['grid_top'].shape[0] * grids['grid_top'].shape[1])
+        else:
+            basis = build_view_basis(collection, grids)
+    
+    results = []
+    for current in current_values:
+        config_name, params = make_magnet_params(magnet_class, current=current, **design)
+        print(f"Testing configuration: {config_name}")
+        
+        # Every coil in the hemisphere carries the same current
+        currents = np.full(basis.n_coils, coil_current(magnet_class, params))
+        
+        with profiling.configuration(config_name):
+            # Compute energy and force fields and the performance metrics
+            if top_only:
+                with profiling.span("field"):
+                    B_top = basis.field(currents) * 1E-3
+                with profiling.span("gradient"):
+                    energy_data = top_view_energy_and_force(B_top, grids)
+                with profiling.span("metrics"):
+                    metrics = calculate_top_view_metrics(energy_data)
+            else:
+                energy_data = compute_energy_and_force_from_basis(basis, grids, currents)
+                with profiling.span("metrics"):
+                    metrics = calculate_metrics(energy_data)
+            
+            # Generate plot
+            if save_plots and not top_only:
+                with profiling.span("plot"):
+                    fig = plot_energy_field(energy_data, config_name)
+                    plt.savefig(f"magnet_sweep_{config_name}.png")
+                    plt.close(fig)
+        
+        # Store results
+        result = {
+            'config_name': config_name,
+            'magnet_class': magnet_class.__name__,
+            'params': params,
+            'metrics': metrics
+        }
+        if return_energy_data:
+            result['energy_data'] = energy_data
+        results.append(result)
+    return results
+
+
+def load_cached_result(cache, magnet_class, params, system_params):
+    """
+    Look up a configuration in the result cache.
+    
+    If the raw grids were cached the metrics are recomputed from them, so changes
+    to calculate_metrics apply without re-simulating.
+    
+    Returns:
+        Result dictionary, or None on a cache miss
+    """
+    key = result_key(magnet_class, params, system_params)
+    result = cache.get(key)
+    if result is None:
+        return None
+    energy_data = cache.get_energy_data(key)
+    if energy_data is not None:
+        result['metrics'] = calculate_metrics(energy_data)
+    result['params'] = params
+    return result
+
+
+def store_results(cache, magnet_class, results, system_params):
+    """Write finished results to the cache, including their grids if present."""
+    for result in results:
+        energy_data = result.pop('energy_data', None)
+        key = result_key(magnet_class, result['params'], system_params)
+        cache.put(key, result, system_params, energy_data=energy_data)
+
+
+def _init_sweep_worker(profile=False):
+    # Workers only save figures to disk, never show them
+    plt.switch_backend('Agg')
+    profiling.enable(profile)
+
+
+def _profiled_current_sweep(*args, **kwargs):
+    """evaluate_current_sweep in a worker, also returning the spans it recorded."""
+    profiling.reset()
+    results = evaluate_current_sweep(*args, **kwargs)
+    return results, profiling.snapshot()
+
+
+def run_current_sweeps(calls, jobs=1):
+    """
+    Run evaluate_current_sweep for several geometries, in worker processes if jobs > 1.
+    
+    Args:
+        calls: List of (key, args, kwargs) for evaluate_current_sweep
+        jobs: Number of worker processes
+        
+    Yields:
+        (key, results) in completion order
+    """
+    if jobs > 1:
+        # Each worker builds its own Collection and only sends back the metrics
+        profile = profiling.is_enabled()
+        worker = _profiled_current_sweep if profile else evaluate_current_sweep
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_sweep_worker, initargs=(profile,)) as executor:
+            futures = {executor.submit(worker, *args, **kwargs): key for key, args, kwargs in calls}
+            try:
+                for future in as_completed(futures):
+                    results = future.result()
+                    if profile:
+                        # Worker spans are merged here so the profile covers the whole sweep
+                        results, recorded = results
+                        profiling.merge(recorded)
+                    yield futures[future], results
+            except KeyboardInterrupt:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+    else:
+        for key, args, kwargs in calls:
+            yield key, evaluate_current_sweep(*args, **kwargs)
+
+
+def sweep_space():
+    """
+    The design space swept by sweep_magnet_designs.
+    
+    Returns:
+        system_params: Dictionary with parameters for the hemisphere system
+        tasks: List of (magnet_class, design) geometries
+        current_values: Drive currents evaluated for every geometry
     """
     # Base system parameters
     system_params = {
@@ -246,104 +635,300 @@ def sweep_magnet_designs():
     coil_heights = [0.01, 0.02]
     magnetization_values = [(0, 0, 1), (0, 0, 1.5)]
     
-    results = []
-    
-    # Iterate through all parameter combinations
+    # Every geometry is one task; the current sweep reuses one field basis per geometry
+    tasks = []
     for magnet_class in magnet_classes:
         for coil_diameter in coil_diameters:
-            for current in current_values:
-                for n_turns in turn_values:
-                    
-                    # Set up parameters based on magnet class
-                    if magnet_class == SimpleCoil:
-                        params = {
-                            'n_turns': n_turns,
-                            'current_a_base': current,
-                            'diameter_m': coil_diameter
-                        }
-                        config_name = f"SimpleCoil_d{coil_diameter}_c{current}_t{n_turns}"
-                        
-                        # Create system and compute metrics for SimpleCoil
-                        print(f"Testing configuration: {config_name}")
-                        
-                        # Create the hemisphere system with current parameters
-                        collection, sensor_positions = create_hemisphere_magnetic_system(
-                            magnet_class, params, system_params
-                        )
-                        
-                        # Compute energy and force fields
-                        grid_length_m = system_params['r_m'] * 1.25
-                        energy_data = compute_energy_and_force(collection, grid_length_m)
-                        
-                        # Calculate performance metrics
-                        metrics = calculate_metrics(energy_data)
-                        
-                        # Generate plot
-                        fig = plot_energy_field(energy_data, config_name)
-                        plt.savefig(f"magnet_sweep_{config_name}.png")
-                        plt.close(fig)
-                        
-                        # Store results
-                        result = {
-                            'config_name': config_name,
-                            'magnet_class': magnet_class.__name__,
-                            'params': params,
-                            'metrics': metrics
-                        }
-                        results.append(result)
-                    
-                    elif magnet_class == CoilCylinder:
-                        # For CoilCylinder, we'll also sweep through heights and magnetization
-                        for height in coil_heights:
-                            for magnetization in magnetization_values:
-                                params = {
-                                    'n_turns': n_turns,
-                                    'current_a': current * n_turns,  # Effective current
-                                    'coil_diameter': coil_diameter,
-                                    'coil_height': height,
-                                    'magnetization': magnetization
-                                }
-                                mag_str = f"m{magnetization[2]}"
-                                config_name = f"CoilCyl_d{coil_diameter}_c{current}_t{n_turns}_h{height}_{mag_str}"
-                                
-                                # Create system and compute metrics
-                                print(f"Testing configuration: {config_name}")
-                                
-                                # Create the hemisphere system with current parameters
-                                collection, sensor_positions = create_hemisphere_magnetic_system(
-                                    magnet_class, params, system_params
-                                )
-                                
-                                # Compute energy and force fields
-                                grid_length_m = system_params['r_m'] * 1.25
-                                energy_data = compute_energy_and_force(collection, grid_length_m)
-                                
-                                # Calculate performance metrics
-                                metrics = calculate_metrics(energy_data)
-                                
-                                # Generate plot
-                                fig = plot_energy_field(energy_data, config_name)
-                                plt.savefig(f"magnet_sweep_{config_name}.png")
-                                plt.close(fig)
-                                
-                                # Store results
-                                result = {
-                                    'config_name': config_name,
-                                    'magnet_class': magnet_class.__name__,
-                                    'params': params,
-                                    'metrics': metrics
-                                }
-                                results.append(result)
+            for n_turns in turn_values:
+                if magnet_class == SimpleCoil:
+                    designs = [{'coil_diameter': coil_diameter, 'n_turns': n_turns}]
+                elif magnet_class == CoilCylinder:
+                    # For CoilCylinder, we'll also sweep through heights and magnetization
+                    designs = [
+                        {'coil_diameter': coil_diameter, 'n_turns': n_turns,
+                         'height': height, 'magnetization': magnetization}
+                        for height in coil_heights
+                        for magnetization in magnetization_values
+                    ]
+                
+                for design in designs:
+                    tasks.append((magnet_class, design))
+    
+    return system_params, tasks, current_values
+
+
+def screen_sweep_space(tasks, current_values, system_params, **thresholds):
+    """
+    Run screen_candidates over every (geometry, current) of a sweep and report rejections.
+    
+    Args:
+        tasks: List of (magnet_class, design) geometries
+        current_values: Drive currents evaluated for every geometry
+        system_params: Dictionary with parameters for the hemisphere system
+        **thresholds: min_field_t, min_force_n and distance_m for screen_candidates
+        
+    Returns:
+        Set of rejected (task index, current) candidates
+    """
+    keys, candidates, names = [], [], []
+    for index, (magnet_class, design) in enumerate(tasks):
+        for current in current_values:
+            config_name, params = make_magnet_params(magnet_class, current=current, **design)
+            keys.append((index, current))
+            candidates.append((magnet_class, params))
+            names.append(config_name)
+    reasons = screen_candidates(candidates, system_params, **thresholds)
+    
+    rejected = set()
+    print("\n===== Analytic Screening =====")
+    for key, config_name, reason in zip(keys, names, reasons):
+        if reason is not None:
+            rejected.add(key)
+            print(f"Screened out {config_name}: {reason}")
+    print(f"{len(rejected)}/{len(keys)} configurations screened out")
+    return rejected
+
+
+def sweep_magnet_designs(jobs=1, cache=None, cache_grids=False, min_field_t=None, min_force_n=None,
+                         screen_distance_m=None):
+    """
+    Sweep through different magnet designs and parameters, evaluating performance.
+    
+    Args:
+        jobs: Number of worker processes to evaluate geometries in parallel
+        cache: Optional ResultCache; cached configurations are skipped and new results
+            are written as soon as each geometry finishes
+        cache_grids: Also cache the raw energy/force grids of new results
+        min_field_t, min_force_n: Optional analytic screening thresholds, candidates that
+            can't reach them are dropped before simulation (see screen_candidates)
+        screen_distance_m: Distance for the screening estimate, defaults to the hemisphere radius
+    """
+    system_params, tasks, current_values = sweep_space()
+    
+    rejected = set()
+    if min_field_t is not None or min_force_n is not None:
+        with profiling.span("screening"):
+            rejected = screen_sweep_space(
+                tasks, current_values, system_params,
+                min_field_t=min_field_t, min_force_n=min_force_n, distance_m=screen_distance_m
+            )
+    
+    # Pull finished configurations from the cache; only the missing currents get simulated
+    task_results = []
+    pending = []
+    for index, (magnet_class, design) in enumerate(tasks):
+        cached = {}
+        missing = []
+        for current in current_values:
+            if (index, current) in rejected:
+                continue
+            _, params = make_magnet_params(magnet_class, current=current, **design)
+            result = None
+            if cache is not None:
+                result = load_cached_result(cache, magnet_class, params, system_params)
+            if result is None:
+                missing.append(current)
+            else:
+                cached[current] = result
+        task_results.append(cached)
+        if missing:
+            pending.append((index, magnet_class, design, missing))
+    
+    n_configs = len(tasks) * len(current_values) - len(rejected)
+    n_pending = sum(len(missing) for _, _, _, missing in pending)
+    print(f"{n_configs - n_pending}/{n_configs} configurations loaded from cache")
+    
+    def finish(index, magnet_class, missing, new_results):
+        # Persist every geometry as soon as it's done so an interrupted sweep can resume
+        if cache is not None:
+            store_results(cache, magnet_class, new_results, system_params)
+        for current, result in zip(missing, new_results):
+            result.pop('energy_data', None)
+            task_results[index][current] = result
+    
+    return_energy_data = cache is not None and cache_grids
+    calls = [
+        ((index, magnet_class, missing), (magnet_class, design, missing, system_params),
+         {'return_energy_data': return_energy_data})
+        for index, magnet_class, design, missing in pending
+    ]
+    with profiling.span("simulation"):
+        for (index, magnet_class, missing), new_results in run_current_sweeps(calls, jobs):
+            finish(index, magnet_class, missing, new_results)
+    
+    if rejected:
+        # Each geometry costs one field basis; screening saves it when all its currents are dropped
+        n_skipped = sum(all((index, current) in rejected for current in current_values)
+                        for index in range(len(tasks)))
+        simulation_s = profiling.total("simulation")
+        if calls and simulation_s is not None:
+            time_per_geometry = simulation_s / len(calls)
+            print(f"Screening skipped {n_skipped} geometries, an estimated "
+                  f"{n_skipped * time_per_geometry:.1f} s of simulation")
+        else:
+            print(f"Screening skipped {n_skipped} geometries")
+    
+    # Results are ordered by task and current regardless of completion order
+    results = [cached[current] for cached in task_results for current in current_values if current in cached]
+    if not results:
+        print("No candidates passed screening")
+        return results
     
     # Sort results by a composite score and display the best configurations
     for result in results:
-        metrics = result['metrics']
-        # Create a composite score prioritizing force strength and energy contrast
-        result['score'] = metrics['force_strength'] * 0.5 + metrics['energy_contrast'] * 0.5
+        result['score'] = score_metrics(result['metrics'])
     
     # Sort by score (descending)
     results.sort(key=lambda x: x['score'], reverse=True)
     
+    report_results(results)
+    return results
+
+
+def sweep_magnet_designs_adaptive(jobs=1, stages=ADAPTIVE_STAGES, keep_fraction=1/3, min_survivors=4,
+                                  validate=False, cache=None, cache_grids=False, min_field_t=None,
+                                  min_force_n=None, screen_distance_m=None):
+    """
+    Successive halving over the same design space as sweep_magnet_designs.
+    
+    Every geometry is scored on the cheapest stage by the best of its currents, only
+    the best keep_fraction of geometries move on to the next, finer stage, and so on
+    until the finalists are scored at full resolution. Pruning is per geometry because
+    the field basis is the expensive part; extra currents of a surviving geometry are
+    nearly free.
+    
+    Args:
+        jobs: Number of worker processes to evaluate geometries in parallel
+        stages: List of (grid samples per axis, top view only), coarse to fine
+        keep_fraction: Fraction of geometries kept after each stage
+        min_survivors: Never keep fewer geometries than this
+        validate: Also score every candidate at the final stage to measure how well
+            the coarse rankings agree with the full resolution ranking (costs a full sweep)
+        cache: Optional ResultCache for the final stage, which matches the full sweep
+        cache_grids: Also cache the raw energy/force grids of new final stage results
+        min_field_t, min_force_n, screen_distance_m: Analytic screening before the
+            first stage, as in sweep_magnet_designs
+        
+    Returns:
+        List of finalist result dictionaries sorted by score
+    """
+    from scipy.stats import spearmanr
+    
+    system_params, tasks, current_values = sweep_space()
+    
+    rejected = set()
+    if min_field_t is not None or min_force_n is not None:
+        with profiling.span("screening"):
+            rejected = screen_sweep_space(
+                tasks, current_values, system_params,
+                min_field_t=min_field_t, min_force_n=min_force_n, distance_m=screen_distance_m
+            )
+    
+    def run_stage(candidates, n_grid, top_only, save_plots, use_cache=False):
+        # Group candidates by geometry so each geometry builds one basis per stage
+        currents_by_task = {}
+        for index, current in candidates:
+            currents_by_task.setdefault(index, []).append(current)
+        stage_results = {}
+        if use_cache:
+            for index, currents in currents_by_task.items():
+                magnet_class, design = tasks[index]
+                missing = []
+                for current in currents:
+                    _, params = make_magnet_params(magnet_class, current=current, **design)
+                    result = load_cached_result(cache, magnet_class, params, system_params)
+                    if result is None:
+                        missing.append(current)
+                    else:
+                        result['score'] = score_metrics(result['metrics'])
+                        stage_results[(index, current)] = result
+                currents_by_task[index] = missing
+            currents_by_task = {index: currents for index, currents in currents_by_task.items() if currents}
+        return_energy_data = use_cache and cache_grids
+        calls = [
+            (index, (tasks[index][0], tasks[index][1], currents, system_params),
+             {'save_plots': save_plots, 'n_grid': n_grid, 'top_only': top_only,
+              'return_energy_data': return_energy_data})
+            for index, currents in currents_by_task.items()
+        ]
+        for index, results in run_current_sweeps(calls, jobs):
+            if use_cache:
+                store_results(cache, tasks[index][0], results, system_params)
+            for current, result in zip(currents_by_task[index], results):
+                result.pop('energy_data', None)
+                result['score'] = score_metrics(result['metrics'])
+                stage_results[(index, current)] = result
+        # Observer points evaluated, summed over geometries (every geometry has the same sources)
+        n_points = len(calls) * n_grid**2 * (1 if top_only else 2)
+        return stage_results, n_points
+    
+    candidates = [(index, current) for index in range(len(tasks)) for current in current_values
+                  if (index, current) not in rejected]
+    if not candidates:
+        print("No candidates passed screening")
+        return []
+    n_geometries = len({index for index, _ in candidates})
+    n_grid_full, top_only_full = stages[-1]
+    full_points = n_geometries * n_grid_full**2 * (1 if top_only_full else 2)
+    
+    stage_scores = []
+    total_points = 0
+    survivors = candidates
+    for stage, (n_grid, top_only) in enumerate(stages):
+        final = stage == len(stages) - 1
+        with profiling.span(f"stage{stage+1}"):
+            stage_results, n_points = run_stage(survivors, n_grid, top_only, save_plots=final,
+                                                use_cache=final and cache is not None)
+        total_points += n_points
+        stage_scores.append({candidate: result['score'] for candidate, result in stage_results.items()})
+        view = "top view" if top_only else "top and side views"
+        n_stage_geometries = len({index for index, _ in survivors})
+        stage_s = profiling.total(f"stage{stage+1}")
+        timing = "" if stage_s is None else f", {stage_s:.3f} s"
+        print(f"Stage {stage+1}: {n_stage_geometries} geometries ({len(survivors)} candidates) at "
+              f"{n_grid}x{n_grid} ({view}), {n_points} observer points{timing}")
+        if not final:
+            # A geometry is as good as its best current
+            geometry_scores = {}
+            for (index, _), score in stage_scores[-1].items():
+                geometry_scores[index] = max(score, geometry_scores.get(index, -np.inf))
+            n_keep = max(min_survivors, int(np.ceil(len(geometry_scores) * keep_fraction)))
+            kept = set(sorted(geometry_scores, key=geometry_scores.get, reverse=True)[:n_keep])
+            survivors = [candidate for candidate in survivors if candidate[0] in kept]
+    
+    results = sorted(stage_results.values(), key=lambda x: x['score'], reverse=True)
+    if total_points:
+        print(f"\nField basis observer points: {total_points} vs {full_points} for the full sweep "
+              f"({full_points / total_points:.1f}x fewer)")
+    
+    # Rank agreement of each coarse stage with the final stage, over the finalists
+    final_scores = stage_scores[-1]
+    finalists = list(final_scores)
+    for stage, scores in enumerate(stage_scores[:-1]):
+        if len(finalists) > 1:
+            rho = spearmanr([scores[c] for c in finalists], [final_scores[c] for c in finalists])[0]
+            print(f"Stage {stage+1} vs final ranking of the {len(finalists)} finalists: Spearman {rho:.3f}")
+    
+    if validate:
+        # Score everything at full resolution to check what the coarse stages got right
+        with profiling.span("validation"):
+            full_results, _ = run_stage(candidates, n_grid_full, top_only_full, save_plots=False)
+        full_scores = {candidate: result['score'] for candidate, result in full_results.items()}
+        for stage, scores in enumerate(stage_scores[:-1]):
+            scored = list(scores)
+            rho = spearmanr([scores[c] for c in scored], [full_scores[c] for c in scored])[0]
+            print(f"Stage {stage+1} vs full ranking of its {len(scored)} candidates: Spearman {rho:.3f}")
+        n_top = min(min_survivors, len(finalists))
+        true_top = set(sorted(full_scores, key=full_scores.get, reverse=True)[:n_top])
+        found = len(true_top & set(finalists))
+        print(f"Finalists contain {found}/{n_top} of the full sweep's top {n_top}")
+    
+    report_results(results)
+    return results
+
+
+def report_results(results):
+    """Print and plot the top configurations of a sweep sorted by score."""
     # Print top results
     print("\n===== Top Performing Configurations =====")
     for i, result in enumerate(results[:10]):
@@ -398,12 +983,68 @@ def sweep_magnet_designs():
     plt.tight_layout()
     plt.savefig("magnet_sweep_comparison_log.png")
     plt.show()
-    
-    return results
 
 
 if __name__ == "__main__":
-    results = sweep_magnet_designs()
+    parser = argparse.ArgumentParser(description="Sweep hemisphere magnet designs")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1, help="Number of worker processes (0 = all cores)"
+    )
+    parser.add_argument(
+        "--cache", default="magnet_sweep_cache.sqlite", help="Result cache used to resume sweeps"
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Recompute every configuration")
+    parser.add_argument(
+        "--cache-grids", action="store_true", help="Also cache raw energy/force grids"
+    )
+    parser.add_argument(
+        "--adaptive", action="store_true", help="Successive halving from coarse to full resolution grids"
+    )
+    parser.add_argument(
+        "--keep-fraction", type=float, default=1/3, help="Fraction of geometries kept per adaptive stage"
+    )
+    parser.add_argument(
+        "--validate", action="store_true", help="Compare adaptive rankings with a full resolution sweep"
+    )
+    parser.add_argument(
+        "--min-field", type=float, default=None, help="Screen out coils below this analytic on-axis field (T)"
+    )
+    parser.add_argument(
+        "--min-force", type=float, default=None, help="Screen out coils below this analytic pull (N)"
+    )
+    parser.add_argument(
+        "--screen-distance", type=float, default=None,
+        help="Distance from the coil for screening (m), defaults to the hemisphere radius"
+    )
+    parser.add_argument(
+        "--profile", default=None,
+        help="Record per-configuration timing spans and write them to this .json or .csv file"
+    )
+    args = parser.parse_args()
+    jobs = args.jobs or os.cpu_count()
+    profiling.enable(args.profile is not None)
+    
+    cache = None if args.no_cache else ResultCache(args.cache)
+    try:
+        if args.adaptive:
+            results = sweep_magnet_designs_adaptive(
+                jobs=jobs, keep_fraction=args.keep_fraction, validate=args.validate, cache=cache,
+                cache_grids=args.cache_grids, min_field_t=args.min_field, min_force_n=args.min_force,
+                screen_distance_m=args.screen_distance
+            )
+        else:
+            results = sweep_magnet_designs(
+                jobs=jobs, cache=cache, cache_grids=args.cache_grids, min_field_t=args.min_field,
+                min_force_n=args.min_force, screen_distance_m=args.screen_distance
+            )
+    finally:
+        if cache is not None:
+            cache.close()
+    
+    if args.profile:
+        profiling.report()
+        profiling.export(args.profile)
+        print(f"Profile written to {args.profile}")
     
     # Optionally save results to a file
     import json
@@ -0,0 +1,211 @@
+import numpy as np
+import magpylib as magpy
+from scipy.spatial.transform import Rotation
+
+from field_basis import FieldBasis
+from hemisphere_layout import hemisphere_layout, unique_sites
+
+
+class PMShell(object):
+    """
+    Outer hemisphere carrying permanent magnets, modeled as point dipoles.
+
+    The shell is a rigid body pivoting about the sphere center (the origin). For a
+    batch of orientations the coil field B and its gradient are evaluated at every
+    magnet in one FieldBasis call (central difference stencil, as in InfluenceMatrix),
+    and the net wrench about the center is
+
+        F = sum_m (m . grad) B          (F_i = sum_j m_j dB_j/dx_i)
+        tau = sum_m r_m x F_m + m x B
+
+    Everything is linear in the coil currents, so the wrench is returned per coil at
+    unit current and any current pattern is a tensordot. Forces between the shell
+    magnets themselves are internal and cancel.
+    """
+
+    def __init__(self, positions, moments):
+        """
+        Args:
+            positions: (n_magnets, 3) magnet centers in the shell frame, meters
+            moments: (n_magnets, 3) dipole moments in the shell frame, A*m^2
+        """
+        self.positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        self.moments = np.asarray(moments, dtype=float).reshape(-1, 3)
+
+    @property
+    def n_magnets(self):
+        return len(self.positions)
+
+    @classmethod
+    def from_hemisphere(cls, radius_m, n_phi_rad, n_theta_rad, moment_am2=0.45, alternating=True):
+        """
+        Radially magnetized magnets on the same (phi, theta) grid as the coils.
+
+        The default moment is roughly an N52 10 x 5 mm disc (Br 1.44 T, 0.39 cm^3).
+
+        Args:
+            radius_m: Shell radius, larger than the coil hemisphere
+            n_phi_rad: Number of elevation steps from 0 to pi/2
+            n_theta_rad: Number of azimuth steps over the full circle
+            moment_am2: Dipole moment of each magnet
+            alternating: Alternate the polarity between neighbouring azimuth steps
+
+        Returns:
+            PMShell
+        """
+        layout = hemisphere_layout(radius_m, n_phi_rad, n_theta_rad)
+        # The grid repeats positions (pole, mirrored offsets); keep one magnet per site
+        keep = unique_sites(layout.coil_positions)
+        positions = layout.coil_positions[keep]
+        directions = layout.coil_directions[keep]
+
+        polarity = np.ones(len(positions))
+        if alternating:
+            theta = np.arctan2(positions[:, 1], positions[:, 0])
+            step = np.round(theta / (2 * np.pi / n_theta_rad)).astype(int)
+            polarity = np.where(step % 2 == 0, 1.0, -1.0)
+        return cls(positions, directions * (moment_am2 * polarity)[:, None])
+
+    def posed(self, rotations):
+        """
+        Magnet positions and moments for a batch of shell orientations.
+
+        Args:
+            rotations: scipy Rotation with n_poses rotations about the center
+
+        Returns:
+            positions, moments: (n_poses, n_magnets, 3) arrays in the world frame
+        """
+        R = rotations.as_matrix().reshape(-1, 3, 3)
+        positions = np.einsum('pij,mj->pmi', R, self.positions)
+        moments = np.einsum('pij,mj->pmi', R, self.moments)
+        return positions, moments
+
+    def wrench_basis(self, collection, rotations, step_m=1e-4, chunk_points=50000):
+        """
+        Force and torque on the shell per coil at unit current, for a batch of poses.
+
+        Args:
+            collection: Coil Collection from create_hemisphere_magnetic_system
+            rotations: scipy Rotation with n_poses rotations
+            step_m: Finite difference step for the field gradient
+            chunk_points: Approximate observer points per magpylib call, bounds memory
+
+        Returns:
+            force: (n_poses, n_coils, 3) force per ampere of coil loop current, N/A
+            torque: (n_poses, n_coils, 3) torque about the center per ampere, N*m/A
+            static_force: (n_poses, 3) force from the non-current sources, N
+            static_torque: (n_poses, 3) torque from the non-current sources, N*m
+        """
+        positions, moments = self.posed(rotations)
+        n_poses = len(positions)
+
+        # Stencil: the magnet itself, then +/- step along x, y and z
+        offsets = np.vstack((np.zeros(3), np.repeat(np.eye(3), 2, axis=0) * np.tile([1, -1], 3)[:, None] * step_m))
+        chunk = max(1, chunk_points // (self.n_magnets * len(offsets)))
+
+        outputs = []
+        for p0 in range(0, n_poses, chunk):
+            r, m = positions[p0:p0 + chunk], moments[p0:p0 + chunk]
+            basis = FieldBasis(collection, r[:, :, None, :] + offsets)
+            coil_fields = basis.basis.reshape((basis.n_coils,) + r.shape[:2] + offsets.shape)
+            static_fields = basis.static.reshape(r.shape[:2] + offsets.shape)
+            force, torque = _dipole_wrench(coil_fields, r, m, step_m)
+            static_force, static_torque = _dipole_wrench(static_fields, r, m, step_m)
+            outputs.append((np.moveaxis(force, 0, 1), np.moveaxis(torque, 0, 1), static_force, static_torque))
+        return tuple(np.concatenate(parts) for parts in zip(*outputs))
+
+    def wrench(self, collection, rotations, currents=None, **kwargs):
+        """
+        Net force and torque on the shell for one coil current pattern.
+
+        Args:
+            collection: Coil Collection from create_hemisphere_magnetic_system
+            rotations: scipy Rotation with n_poses rotations
+            currents: (n_coils,) coil loop currents in amperes, defaults to the
+                currents the collection was built with
+            **kwargs: Passed to wrench_basis
+
+        Returns:
+            force, torque: (n_poses, 3) arrays in N and N*m
+        """
+        if currents is None:
+            # Same coil order as FieldBasis
+            currents = np.array([s.current for s in collection.sources_all if isinstance(s, magpy.current.Circle)])
+        force, torque, static_force, static_torque = self.wrench_basis(collection, rotations, **kwargs)
+        return force.transpose(0, 2, 1) @ currents + static_force, torque.transpose(0, 2, 1) @ currents + static_torque
+
+    def torque_map(self, collection, tilts, azimuths, currents=None, **kwargs):
+        """
+        Torque over a grid of shell tilts.
+
+        The shell is tilted by each angle about a horizontal axis at each azimuth,
+        which covers the reachable orientations of the joint (up to spin about z).
+
+        Args:
+            collection: Coil Collection from create_hemisphere_magnetic_system
+            tilts: (n_tilt,) tilt angles in radians
+            azimuths: (n_az,) directions of the tilt axis in the x-y plane, radians
+            currents: Coil loop currents, see wrench
+            **kwargs: Passed to wrench_basis
+
+        Returns:
+            torque: (n_tilt, n_az, 3) torque about the center in N*m
+        """
+        rotations = tilt_rotations(tilts, azimuths)
+        _, torque = self.wrench(collection, rotations, currents, **kwargs)
+        return torque.reshape(len(tilts), len(azimuths), 3)
+
+
+def tilt_rotations(tilts, azimuths):
+    """
+    Rotations tilting the +z axis by each angle about a horizontal axis at each azimuth.
+
+    Returns:
+        scipy Rotation with n_tilt * n_az rotations, tilt-major order
+    """
+    tilt, azimuth = np.meshgrid(np.asarray(tilts, dtype=float), np.asarray(azimuths, dtype=float), indexing='ij')
+    axes = np.stack((np.cos(azimuth), np.sin(azimuth), np.zeros_like(azimuth)), axis=-1)
+    return Rotation.from_rotvec((axes * tilt[..., None]).reshape(-1, 3))
+
+
+def _dipole_wrench(fields, positions, moments, step_m):
+    """
+    Net dipole force and torque about the origin from stencil fields.
+
+    Args:
+        fields: (..., n_poses, n_magnets, 7, 3) B on the stencil of every magnet
+        positions, moments: (n_poses, n_magnets, 3)
+
+    Returns:
+        force, torque: (..., n_poses, 3) summed over the magnets
+    """
+    B = fields[..., 0, :]
+    # gradient[..., i, j] = dB_j/dx_i
+    gradient = (fields[..., 1::2, :] - fields[..., 2::2, :]) / (2 * step_m)
+    force = np.einsum('...pmij,pmj->...pmi', gradient, moments)
+    torque = np.cross(positions, force) + np.cross(moments, B)
+    return force.sum(axis=-2), torque.sum(axis=-2)
+
+
+if __name__ == "__main__":
+    from time import time
+    from magnet_designer import SimpleCoil
+    from magnet_sweep import create_hemisphere_magnetic_system, make_magnet_params
+
+    system_params = {'r_m': 0.1, 'n_phi_rad': 4, 'n_theta_rad': 8}
+    _, params = make_magnet_params(SimpleCoil, coil_diameter=0.05, current=0.5, n_turns=250)
+    collection, _ = create_hemisphere_magnetic_system(SimpleCoil, params, system_params)
+
+    shell = PMShell.from_hemisphere(0.12, 4, 8)
+    tilts = np.radians(np.linspace(0, 30, 31))
+    azimuths = np.radians(np.linspace(0, 360, 72, endpoint=False))
+
+    t0 = time()
+    torque = shell.torque_map(collection, tilts, azimuths)
+    elapsed = time() - t0
+    magnitude = np.linalg.norm(torque, axis=-1)
+    print(f"{shell.n_magnets} magnets, {torque.shape[0] * torque.shape[1]} poses in {elapsed:.3f} s")
+    print(f"Torque: max {magnitude.max() * 1e3:.3f} mN*m, mean {magnitude.mean() * 1e3:.3f} mN*m")
+    best = np.unravel_index(np.argmax(magnitude), magnitude.shape)
+    print(f"Peak at tilt {np.degrees(tilts[best[0]]):.1f} deg, azimuth {np.degrees(azimuths[best[1]]):.1f} deg")
@@ -0,0 +1,138 @@
+import io
+import json
+import sqlite3
+import hashlib
+from time import time
+
+import numpy as np
+
+
+# Bump when the simulation model changes in a way that invalidates stored results
+CACHE_VERSION = 1
+
+
+def to_jsonable(value):
+    """Convert tuples and numpy values so they serialize the same way every time."""
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [to_jsonable(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def result_key(magnet_class, params, system_params):
+    """
+    Stable content hash of a sweep configuration.
+
+    Args:
+        magnet_class: Magnet class or its name
+        params: Dictionary with parameters for the magnet class
+        system_params: Dictionary with parameters for the hemisphere system
+
+    Returns:
+        Hex digest identifying the configuration
+    """
+    name = magnet_class if isinstance(magnet_class, str) else magnet_class.__name__
+    payload = json.dumps(
+        {
+            'version': CACHE_VERSION,
+            'magnet_class': name,
+            'params': to_jsonable(params),
+            'system_params': to_jsonable(system_params),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache(object):
+    """
+    Append-only SQLite store of sweep results keyed by result_key.
+
+    Every put is committed immediately, so an interrupted sweep keeps everything
+    finished so far. The raw energy/force grids can optionally be stored alongside
+    the metrics, so metrics and scores can be recomputed without re-simulating.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                config_name TEXT,
+                magnet_class TEXT,
+                params TEXT,
+                system_params TEXT,
+                metrics TEXT,
+                grids BLOB,
+                created REAL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def __contains__(self, key):
+        return self.conn.execute("SELECT 1 FROM results WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def get(self, key):
+        """Return the cached result dictionary for key, or None on a miss."""
+        row = self.conn.execute(
+            "SELECT config_name, magnet_class, params, metrics FROM results WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        config_name, magnet_class, params, metrics = row
+        return {
+            'config_name': config_name,
+            'magnet_class': magnet_class,
+            'params': json.loads(params),
+            'metrics': json.loads(metrics),
+        }
+
+    def get_energy_data(self, key):
+        """Return the cached energy/force grids for key, or None if they weren't stored."""
+        row = self.conn.execute("SELECT grids FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        with np.load(io.BytesIO(row[0])) as data:
+            return {name: data[name] for name in data.files}
+
+    def put(self, key, result, system_params, energy_data=None):
+        """
+        Store a result and commit it right away.
+
+        Args:
+            key: Key from result_key
+            result: Result dictionary with config_name, magnet_class, params and metrics
+            system_params: Dictionary with parameters for the hemisphere system
+            energy_data: Optional energy/force grids from compute_energy_and_force
+        """
+        grids = None
+        if energy_data is not None:
+            buffer = io.BytesIO()
+            np.savez_compressed(buffer, **{k: np.asarray(v) for k, v in energy_data.items()})
+            grids = buffer.getvalue()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                result['config_name'],
+                result['magnet_class'],
+                json.dumps(to_jsonable(result['params'])),
+                json.dumps(to_jsonable(system_params)),
+                json.dumps(to_jsonable(result['metrics'])),
+                grids,
+                time(),
+            ),
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
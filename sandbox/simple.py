@@ -2,6 +2,38 @@ import numpy as np
 from scipy.constants import mu_0
 import matplotlib.pyplot as plt
 
+
+def grid_forces(positions, electromagnet_positions, electromagnet_states, strength=1.0):
+    """
+    Force on a batch of permanent magnets from all active electromagnets.
+
+    Uses the same simplified inverse cube law as MagneticGridSimulator, evaluated
+    for every (magnet, electromagnet) pair in one broadcasted expression.
+
+    positions: (B, 3) permanent magnet positions
+    electromagnet_positions: (..., 3) electromagnet positions, e.g. (rows, cols, 3)
+    electromagnet_states: (...) shared states, or (B, ...) per-magnet states; nonzero = on
+    strength: scalar or (B,) force scale per magnet
+    returns: (B, 3) total force on each magnet
+    """
+    positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+    n_magnets = len(positions)
+    em_positions = np.asarray(electromagnet_positions, dtype=float).reshape(-1, 3)
+    states = np.asarray(electromagnet_states).reshape(-1, len(em_positions))
+    strength = np.broadcast_to(np.asarray(strength, dtype=float), (n_magnets,))
+
+    # Pairwise offsets, shape (B, n_electromagnets, 3)
+    r = positions[:, None, :] - em_positions[None, :, :]
+    r_mag = np.linalg.norm(r, axis=2)
+    active = (states != 0) & (r_mag >= 1e-10)  # Avoid division by zero
+
+    # Simplified magnetic force calculation (inverse cube law)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        force_mag = strength[:, None] * mu_0 / (4 * np.pi * r_mag**3)
+        coeff = np.where(active, force_mag / r_mag, 0.0)
+    return np.einsum('bn,bnk->bk', coeff, r)
+
+
 class MagneticGridSimulator:
     def __init__(self, grid_size=(3,3), grid_spacing=0.1):
         """
@@ -13,10 +45,7 @@ class MagneticGridSimulator:
         self.spacing = grid_spacing
         
         # Create grid of electromagnet positions
-        self.electromagnet_positions = np.zeros((grid_size[0], grid_size[1], 3))
-        for i in range(grid_size[0]):
-            for j in range(grid_size[1]):
-                self.electromagnet_positions[i,j] = [i*grid_spacing, j*grid_spacing, 0]
+        self.electromagnet_positions = electromagnet_grid(grid_size, grid_spacing)
         
         # Initialize electromagnet states (on/off)
         self.electromagnet_states = np.zeros(grid_size)
@@ -29,25 +58,8 @@ class MagneticGridSimulator:
         
     def magnetic_force(self, position, strength=1.0):
         """Calculate magnetic force at a point from all active electromagnets"""
-        total_force = np.zeros(3)
-        
-        for i in range(self.grid_size[0]):
-            for j in range(self.grid_size[1]):
-                if self.electromagnet_states[i,j] == 0:
-                    continue
-                    
-                r = position - self.electromagnet_positions[i,j]
-                r_mag = np.linalg.norm(r)
-                if r_mag < 1e-10:  # Avoid division by zero
-                    continue
-                
-                # Simplified magnetic force calculation (inverse cube law)
-                # In reality, this would be more complex
-                force_mag = strength * mu_0 / (4 * np.pi * r_mag**3)
-                force = force_mag * r / r_mag
-                total_force += force
-                
-        return total_force
+        # In reality, this would be more complex, see grid_forces
+        return grid_forces(position, self.electromagnet_positions, self.electromagnet_states, strength)[0]
     
     def step(self, dt=0.01):
         """Step the simulation forward by dt seconds"""
@@ -69,6 +81,64 @@ class MagneticGridSimulator:
         """Get current position of permanent magnet"""
         return self.pm_position.copy()
 
+class BatchedMagneticGridSimulator:
+    def __init__(self, n_magnets, grid_size=(3,3), grid_spacing=0.1, strength=1.0, damping=0.95):
+        """
+        Simulate B independent permanent magnets over the same electromagnet grid
+        n_magnets: number of independent permanent magnet states (B)
+        grid_size: tuple of (rows, cols) for electromagnet grid
+        grid_spacing: distance between electromagnets in meters
+        strength: scalar or (B,) force scale, e.g. to sweep gains
+        damping: velocity damping factor per step
+        """
+        self.n_magnets = n_magnets
+        self.grid_size = grid_size
+        self.spacing = grid_spacing
+        self.damping = damping
+        self.strength = np.broadcast_to(np.asarray(strength, dtype=float), (n_magnets,)).copy()
+        
+        self.electromagnet_positions = electromagnet_grid(grid_size, grid_spacing)
+        
+        # Electromagnet states (on/off) per magnet, so every magnet can run its own pattern
+        self.electromagnet_states = np.zeros((n_magnets,) + tuple(grid_size))
+        
+        # Permanent magnet states, all starting 5cm above the grid center
+        self.pm_positions = np.tile([grid_size[0]*grid_spacing/2,
+                                     grid_size[1]*grid_spacing/2,
+                                     0.05], (n_magnets, 1))
+        self.pm_velocities = np.zeros((n_magnets, 3))
+        
+    def magnetic_force(self, positions=None):
+        """Calculate magnetic force on every permanent magnet, shape (B, 3)"""
+        positions = self.pm_positions if positions is None else positions
+        return grid_forces(positions, self.electromagnet_positions, self.electromagnet_states, self.strength)
+    
+    def step(self, dt=0.01):
+        """Step all magnets forward by dt seconds"""
+        force = self.magnetic_force()
+        
+        # Simple Euler integration
+        self.pm_velocities += force * dt
+        self.pm_positions += self.pm_velocities * dt
+        
+        # Add damping
+        self.pm_velocities *= self.damping
+        
+    def set_electromagnet(self, row, col, state, magnets=slice(None)):
+        """Turn electromagnet on (1) or off (0) for the selected magnets (default all)"""
+        self.electromagnet_states[magnets, row, col] = state
+        
+    def get_pm_positions(self):
+        """Get current positions of all permanent magnets, shape (B, 3)"""
+        return self.pm_positions.copy()
+
+
+def electromagnet_grid(grid_size, grid_spacing):
+    """Electromagnet positions on a regular grid in the z=0 plane, shape (rows, cols, 3)"""
+    rows, cols = np.meshgrid(np.arange(grid_size[0]), np.arange(grid_size[1]), indexing='ij')
+    return np.stack((rows*grid_spacing, cols*grid_spacing, np.zeros(grid_size)), axis=-1)
+
+
 # Example usage
 if __name__ == "__main__":
     sim = MagneticGridSimulator()
@@ -83,6 +153,15 @@ if __name__ == "__main__":
         sim.step()
         positions.append(sim.get_pm_position())
     
+    # Same pattern for a batch of random initial conditions in one vectorized step
+    batch = BatchedMagneticGridSimulator(n_magnets=1000)
+    batch.set_electromagnet(0, 0, 1)
+    batch.set_electromagnet(2, 2, 1)
+    batch.pm_positions += np.random.default_rng(0).normal(scale=0.02, size=batch.pm_positions.shape)
+    for _ in range(100):
+        batch.step()
+    print(f"Batched final position spread (m): {batch.get_pm_positions().std(axis=0)}")
+    
     # Plot trajectory
     positions = np.array(positions)
     plt.plot(positions[:,0], positions[:,1])
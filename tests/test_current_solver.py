@@ -0,0 +1,29 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("magpylib")
+
+from current_solver import InfluenceMatrix
+from hemisphere_layout import hemisphere_layout, unique_sites
+from magnet_designer import CoilCylinder, SimpleCoil
+
+SYSTEM_PARAMS = {'r_m': 0.1, 'n_phi_rad': 4, 'n_theta_rad': 8}
+DESIGNS = {
+    SimpleCoil: {'coil_diameter': 0.05, 'n_turns': 250},
+    CoilCylinder: {'coil_diameter': 0.05, 'n_turns': 250, 'height': 0.01, 'magnetization': (0, 0, 1)},
+}
+TARGET_POINTS = np.array([[0, 0, 0.11], [0.05, 0, 0.1]])
+
+
+@pytest.mark.parametrize("magnet_class", [SimpleCoil, CoilCylinder])
+def test_influence_matrix_has_one_coil_per_site(magnet_class):
+    influence = InfluenceMatrix(magnet_class, DESIGNS[magnet_class], SYSTEM_PARAMS, TARGET_POINTS)
+
+    layout = hemisphere_layout(SYSTEM_PARAMS['r_m'], SYSTEM_PARAMS['n_phi_rad'], SYSTEM_PARAMS['n_theta_rad'])
+    n_sites = len(unique_sites(layout.coil_positions))
+    assert influence.n_coils == n_sites
+    assert len(unique_sites(influence.coil_positions)) == n_sites
+
+    A, offset = influence.field_map()
+    assert A.shape == (3 * len(TARGET_POINTS), n_sites)
+    assert offset.shape == (3 * len(TARGET_POINTS),)